@@ -40,12 +40,12 @@ from alephnull.finance.commission import PerShare, PerTrade
 from alephnull.finance.blotter import Blotter
 from alephnull.finance.constants import ANNUALIZER
 import alephnull.finance.trading as trading
-import alephnull.protocol
-from alephnull.protocol import Event
 from alephnull.gens.composites import (
     date_sorted_sources,
+    inject_benchmarks,
     sequential_transforms,
-    alias_dt
+    alias_dt,
+    group_by_dt
 )
 from alephnull.gens.tradesimulation import AlgorithmSimulator
 
@@ -197,16 +197,8 @@ class TradingAlgorithm(object):
                    recorded_vars=repr(self.recorded_vars))
 
     def _init_positions(self):
-        for sid, pos in self._portfolio.positions.iteritems():
-            for perf_period in self.perf_tracker.perf_periods:
-                perf_period.update_position(
-                    sid=sid,
-                    contract=pos.contract if hasattr(pos, 'contract') else None,
-                    amount=pos.amount,
-                    last_sale_price=pos.last_sale_price,
-                    last_sale_date=None,
-                    cost_basis=pos.cost_basis)
-
+        for perf_period in self.perf_tracker.perf_periods:
+            perf_period.update_positions(self._portfolio.positions)
 
     def _create_data_generator(self, source_filter, sim_params):
         """
@@ -219,15 +211,10 @@ class TradingAlgorithm(object):
         skipped.
         """
         if self.benchmark_return_source is None:
-            benchmark_return_source = [
-                Event({'dt': dt,
-                       'returns': ret,
-                       'type': alephnull.protocol.DATASOURCE_TYPE.BENCHMARK,
-                       'source_id': 'benchmarks'})
-                for dt, ret in trading.environment.benchmark_returns.iterkv()
-                if dt.date() >= sim_params.period_start.date()
-                and dt.date() <= sim_params.period_end.date()
-            ]
+            benchmark_return_source = trading.environment.benchmark_source(
+                sim_params.period_start,
+                sim_params.period_end
+            )
         else:
             benchmark_return_source = self.benchmark_return_source
 
@@ -240,11 +227,15 @@ class TradingAlgorithm(object):
                                            *self.transforms)
         with_alias_dt = alias_dt(with_tnfms)
 
-        with_benchmarks = date_sorted_sources(benchmark_return_source,
-                                              with_alias_dt)
+        with_benchmarks = inject_benchmarks(benchmark_return_source,
+                                            with_alias_dt)
 
         # Group together events with the same dt field. This depends on the
         # events already being sorted.
+        if any(getattr(source, 'streaming', False)
+               for source in self.sources):
+            # hand over streamed bars as soon as they are complete
+            return group_by_dt(with_benchmarks)
         return groupby(with_benchmarks, attrgetter('dt'))
 
     def _create_generator(self, sim_params, source_filter=None):
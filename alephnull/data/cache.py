@@ -0,0 +1,161 @@
+#
+# Copyright 2013 Quantopian, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Columnar cache of daily frames, one compressed .npz file per symbol.
+
+A file holds the index of the frame as int64 nanoseconds, its column
+names, its values as one float64 block, and the span of dates that was
+fetched, which may run past the first and last rows, e.g. for dates
+before a stock was listed.
+
+Reading a range only fetches the dates missing on either side of that
+span, and any range inside it is served by slicing, without parsing.
+"""
+
+import datetime
+import os
+import tempfile
+import zipfile
+
+import numpy as np
+import pandas as pd
+from logbook import Logger
+
+log = Logger('Cache')
+
+NANOS_IN_DAY = 24 * 60 * 60 * 10 ** 9
+
+
+class CachedFrame(object):
+
+    def __init__(self, frame, start, end):
+        self.frame = frame
+        # nanos of the first and last date fetched, inclusive
+        self.start = start
+        self.end = end
+
+
+def to_nanos(dt):
+    """
+    Nanoseconds since the epoch of the UTC date of @dt.
+    """
+    nanos = pd.Timestamp(dt).value
+    return nanos - nanos % NANOS_IN_DAY
+
+
+def read_frame(path):
+    """
+    The CachedFrame stored at @path, or None if there is none.
+    """
+    if not os.path.exists(path):
+        return None
+    try:
+        stored = np.load(path)
+        try:
+            index = pd.DatetimeIndex(stored['index'])
+            frame = pd.DataFrame(stored['values'], index=index,
+                                 columns=[str(c) for c in stored['columns']])
+            span = stored['span']
+        finally:
+            stored.close()
+    except (IOError, KeyError, ValueError, zipfile.BadZipfile) as exc:
+        log.warn("Ignoring unreadable cache {0}: {1!r}".format(path, exc))
+        return None
+    return CachedFrame(frame, int(span[0]), int(span[1]))
+
+
+def write_frame(path, cached):
+    """
+    Store the CachedFrame @cached at @path, replacing any file there only
+    once the new one is complete.
+    """
+    frame = cached.frame
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+    with os.fdopen(fd, 'wb') as f:
+        np.savez_compressed(
+            f,
+            index=pd.DatetimeIndex(frame.index).asi8,
+            columns=np.array([str(c) for c in frame.columns]),
+            values=frame.values.astype(np.float64),
+            span=np.array([cached.start, cached.end], dtype=np.int64))
+    os.rename(tmp_path, path)
+
+
+def _has_weekdays(start, end):
+    return start <= end and \
+        len(pd.bdate_range(pd.Timestamp(start), pd.Timestamp(end))) > 0
+
+
+def _slice(frame, start, end):
+    # rows from the nanos @start to the end of the day at @end
+    index = frame.index.asi8
+    lo = index.searchsorted(start)
+    hi = index.searchsorted(end + NANOS_IN_DAY)
+    return frame.iloc[lo:hi]
+
+
+def load_range(path, start, end, fetch, now=None):
+    """
+    The rows of the frame cached at @path from @start to @end, inclusive.
+
+    @fetch(start, end) returns the frame of the dates from start to end,
+    and is only called for those missing from the cache, which is then
+    extended with its rows. The bars from the date of @now, by default
+    the current time, on are returned but not cached.
+    """
+    start = to_nanos(start)
+    end = to_nanos(end)
+
+    cached = read_frame(path)
+    if cached is None:
+        missing = [(start, end)]
+        frames = []
+        span = (start, end)
+    else:
+        missing = [(start, cached.start - NANOS_IN_DAY),
+                   (cached.end + NANOS_IN_DAY, end)]
+        # rows past the span, e.g. of a day that wasn't over, are fetched
+        # again
+        frames = [_slice(cached.frame, cached.start, cached.end)]
+        span = (min(start, cached.start), max(end, cached.end))
+
+    fetched = False
+    for gap_start, gap_end in missing:
+        if not _has_weekdays(gap_start, gap_end):
+            continue
+        gap = fetch(pd.Timestamp(gap_start), pd.Timestamp(gap_end))
+        if len(gap):
+            # keep the gaps disjoint from the cached rows
+            frames.append(_slice(gap, gap_start, gap_end))
+        fetched = True
+
+    if fetched:
+        frame = pd.concat(frames).sort_index() if frames \
+            else pd.DataFrame()
+        # the bar of today may not be final yet, so it is fetched again
+        if now is None:
+            now = datetime.datetime.utcnow()
+        span_end = min(span[1], to_nanos(now) - NANOS_IN_DAY)
+        stored = _slice(frame, span[0], span_end) if len(frame) else frame
+        write_frame(path, CachedFrame(stored, span[0], span_end))
+    elif cached is not None:
+        frame = cached.frame
+    else:
+        frame = pd.DataFrame()
+
+    if not len(frame):
+        return pd.DataFrame()
+    return _slice(frame, start, end)
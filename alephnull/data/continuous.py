@@ -0,0 +1,213 @@
+#
+# Copyright 2013 Quantopian, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+
+Continuous Contracts
+====================
+
+Stitches the contracts of each root of a futures DataFrame, with columns
+(root, contract, metric) as taken by FuturesDataFrameSource, into one
+continuous series per root.
+
+The contract followed on each row is picked by a roll rule from
+alephnull.roll_method, for all rows at once. Where the followed contract
+changes, the history before the roll is adjusted so the series has no gap:
+
+    * 'back': by adding the price difference between the new and the old
+      contract at the roll.
+    * 'ratio': by multiplying by the ratio of the new to the old price.
+    * None: not at all.
+
+Series are built once per set of arguments, and the contract dates of
+their roots, and cached to disk.
+
+"""
+
+from hashlib import md5
+
+import logbook
+import numpy as np
+import pandas as pd
+
+from alephnull.data.cache import CachedFrame, read_frame, write_frame
+from alephnull.data.loader import get_cache_filepath
+from alephnull.finance.contracts import get_contract_specs
+from alephnull.roll_method import ContractChain, get_roll_rule
+
+log = logbook.Logger('Continuous')
+
+ADJUSTMENTS = ('back', 'ratio', None)
+
+
+def _roots(data):
+    roots = []
+    for column in data.columns:
+        if column[0] not in roots:
+            roots.append(column[0])
+    return roots
+
+
+def _field_values(data, root, contracts, field):
+    """
+    rows x contracts array of @field, forward filled.
+    """
+    columns = set(data.columns)
+    values = np.empty((len(data.index), len(contracts)))
+    for i, contract in enumerate(contracts):
+        column = (root, contract, field)
+        values[:, i] = data[column].values if column in columns else np.nan
+    return pd.DataFrame(values).fillna(method='ffill').values
+
+
+def roll_schedule(data, root, rule='open_interest', contract_specs=None):
+    """
+    The contract chain of @root, and the index in the chain of the contract
+    followed on each row of @data.
+    """
+    rule = get_roll_rule(rule)
+    chain = ContractChain(root, rule.fields, contract_specs)
+    for column in data.columns:
+        if column[0] == root and column[1] not in chain.index:
+            chain.add(column[1])
+
+    values = [_field_values(data, root, chain.contracts, field)
+              for field in rule.fields]
+    return chain, rule.schedule(chain, data.index.asi8, *values)
+
+
+def adjust(prices, front, adjustment='back'):
+    """
+    Continuous series from the rows x contracts @prices, following the
+    contract at index @front on each row.
+    """
+    if adjustment not in ADJUSTMENTS:
+        raise ValueError("adjustment must be one of {0}, not {1!r}".format(
+            ADJUSTMENTS, adjustment))
+
+    rows = np.arange(len(front))
+    series = prices[rows, front]
+    if adjustment is None or len(front) < 2:
+        return series
+
+    rolls = np.nonzero(front[1:] != front[:-1])[0] + 1
+    new = prices[rolls, front[rolls]]
+    old = prices[rolls, front[rolls - 1]]
+
+    # each roll adjusts the rows before it, so accumulate from the end.
+    if adjustment == 'back':
+        gaps = np.zeros(len(front))
+        gaps[rolls - 1] = np.where(np.isnan(new - old), 0.0, new - old)
+        return series + gaps[::-1].cumsum()[::-1]
+    else:
+        ratios = np.ones(len(front))
+        ratio = new / old
+        ratios[rolls - 1] = np.where(np.isfinite(ratio), ratio, 1.0)
+        return series * ratios[::-1].cumprod()[::-1]
+
+
+def build_continuous(data, rule='open_interest', adjustment='back',
+                     field='price', contract_specs=None):
+    """
+    DataFrame of the continuous @field of each root in @data, indexed like
+    @data.
+    """
+    series = {}
+    for root in _roots(data):
+        chain, front = roll_schedule(data, root, rule, contract_specs)
+        prices = _field_values(data, root, chain.contracts, field)
+        series[root] = adjust(prices, front, adjustment)
+    return pd.DataFrame(series, index=data.index)
+
+
+def _cache_key(data, rule, adjustment, field, contract_specs):
+    hasher = md5()
+    hasher.update(data.index.asi8.tostring())
+    hasher.update(str(list(data.columns)))
+    hasher.update(np.ascontiguousarray(data.values, dtype=float).tostring())
+    hasher.update(':'.join([repr(rule), repr(adjustment), field]))
+    # the rolls depend on the first notice and expiration of each contract
+    sids = sorted(set((column[0], column[1]) for column in data.columns))
+    hasher.update(repr([(sid, contract_specs.first_notice(sid),
+                         contract_specs.expiration(sid)) for sid in sids]))
+    return hasher.hexdigest()
+
+
+def load_continuous(data, rule='open_interest', adjustment='back',
+                    field='price', contract_specs=None):
+    """
+    build_continuous, read from the cache when the same series was built
+    before.
+    """
+    rule = get_roll_rule(rule)
+    if contract_specs is None:
+        contract_specs = get_contract_specs()
+
+    key = _cache_key(data, rule, adjustment, field, contract_specs)
+    cache_filepath = get_cache_filepath('continuous-{0}.npz'.format(key))
+
+    cached = read_frame(cache_filepath)
+    if cached is not None:
+        if len(cached.frame.index) == len(data.index):
+            continuous = cached.frame
+            continuous.index = data.index
+            return continuous
+        log.warn("Ignoring stale continuous cache {0}".format(
+            cache_filepath))
+
+    continuous = build_continuous(data, rule, adjustment, field,
+                                  contract_specs)
+    span = data.index.asi8
+    write_frame(cache_filepath, CachedFrame(
+        continuous, span[0] if len(span) else 0,
+        span[-1] if len(span) else 0))
+    return continuous
+
+
+class ContinuousHistory(object):
+    """
+    Trailing windows of a continuous series, so batch transforms over long
+    lookbacks can slice the series built once up front instead of
+    stitching it from their window of bars::
+
+        history = ContinuousHistory(load_continuous(data))
+        window = history.window(dt, 250)
+
+    BatchTransform takes the series as its @continuous argument and fills
+    the 'continuous' field of each window from it.
+    """
+
+    def __init__(self, continuous):
+        self.continuous = continuous
+        self._dts = continuous.index.asi8
+
+    def window(self, dt, length):
+        """
+        The last @length rows of the series up to and including @dt.
+        """
+        end = np.searchsorted(self._dts, pd.Timestamp(dt).value,
+                              side='right')
+        return self.continuous.iloc[max(end - length, 0):end]
+
+    def asof(self, dts):
+        """
+        The rows of the series as of each of @dts, NaN before its start.
+        """
+        dts = pd.DatetimeIndex(dts)
+        rows = np.searchsorted(self._dts, dts.asi8, side='right') - 1
+        values = self.continuous.values.take(np.maximum(rows, 0), axis=0)
+        values[rows < 0] = np.nan
+        return pd.DataFrame(values, index=dts,
+                            columns=self.continuous.columns)
@@ -23,16 +23,16 @@ from datetime import timedelta
 import logbook
 
 import pandas as pd
-from pandas.io.data import DataReader
 import pytz
 
 from . import benchmarks
+from . import cache
+from . import store
 from . benchmarks import get_benchmark_returns
+from . providers import YahooProvider
 
-from alephnull.utils.tradingcalendar import (
-    trading_day,
-    trading_days
-)
+from alephnull.utils import calendars
+from alephnull.utils.concurrency import concurrent_map
 
 logger = logbook.Logger('Loader')
 
@@ -49,62 +49,73 @@ CACHE_PATH = os.path.join(
     'cache'
 )
 
+# symbols fetched at once by the price loaders
+MAX_WORKERS = 8
+
 #Mapping from index symbol to appropriate bond data
 INDEX_MAPPING = {
     '^GSPC':
-    ('treasuries', 'treasury_curves.csv', 'data.treasury.gov'),
+    ('treasuries', 'treasury_curves.dat', 'data.treasury.gov'),
     '^GSPTSE':
-    ('treasuries_can', 'treasury_curves_can.csv', 'bankofcanada.ca'),
+    ('treasuries_can', 'treasury_curves_can.dat', 'bankofcanada.ca'),
     '^FTSE':  # use US treasuries until UK bonds implemented
-    ('treasuries', 'treasury_curves.csv', 'data.treasury.gov'),
+    ('treasuries', 'treasury_curves.dat', 'data.treasury.gov'),
 }
 
 
-def get_datafile(name, mode='r'):
-    """
-    Returns a handle to data file.
+def get_cache_filepath(name):
+    if not os.path.exists(CACHE_PATH):
+        os.makedirs(CACHE_PATH)
+
+    return os.path.join(CACHE_PATH, name)
 
-    Creates containing directory, if needed.
-    """
 
+def get_data_filepath(name):
     if not os.path.exists(DATA_PATH):
         os.makedirs(DATA_PATH)
 
-    return open(os.path.join(DATA_PATH, name), mode)
+    return os.path.join(DATA_PATH, name)
 
 
-def get_cache_filepath(name):
-    if not os.path.exists(CACHE_PATH):
-        os.makedirs(CACHE_PATH)
-
-    return os.path.join(CACHE_PATH, name)
+def _treasury_module(module):
+    try:
+        return importlib.import_module("." + module, package='alephnull.data')
+    except ImportError:
+        raise NotImplementedError(
+            'Treasury curve {0} module not implemented'.format(module))
 
 
-def dump_treasury_curves(module='treasuries', filename='treasury_curves.csv'):
+def dump_treasury_curves(module='treasuries', filename='treasury_curves.dat'):
     """
     Dumps data to be used with zipline.
 
     Puts source treasury and data into zipline.
     """
-    try:
-        m = importlib.import_module("." + module, package='alephnull.data')
-    except ImportError:
-        raise NotImplementedError(
-            'Treasury curve {0} module not implemented'.format(module))
+    m = _treasury_module(module)
+    curves = m.get_treasury_curves()
+    store.write(get_data_filepath(filename), curves)
 
-    tr_data = {}
+    return curves
 
-    for curve in m.get_treasury_data():
-        # Not ideal but massaging data into expected format
-        tr_data[curve['date']] = curve
 
-    curves = pd.DataFrame(tr_data).T
+def update_treasury_curves(module, filename, last_date):
+    """
+    Appends the curves after last_date to the stored ones.
+    """
+    m = _treasury_module(module)
+    start = last_date + timedelta(days=1)
+    curves = m.get_treasury_curves(start_date=start)
+    store.append(get_data_filepath(filename), curves)
 
-    datafile = get_datafile(filename, mode='wb')
-    curves.to_csv(datafile)
-    datafile.close()
 
-    return curves
+def _benchmarks_frame(daily_returns):
+    benchmark_data = []
+    for daily_return in daily_returns:
+        # Not ideal but massaging data into expected format
+        benchmark = (daily_return.date, daily_return.returns)
+        benchmark_data.append(benchmark)
+
+    return pd.DataFrame({'returns': pd.Series(dict(benchmark_data))})
 
 
 def dump_benchmarks(symbol):
@@ -113,16 +124,8 @@ def dump_benchmarks(symbol):
 
     Puts source treasury and data into zipline.
     """
-    benchmark_data = []
-    for daily_return in get_benchmark_returns(symbol):
-        # Not ideal but massaging data into expected format
-        benchmark = (daily_return.date, daily_return.returns)
-        benchmark_data.append(benchmark)
-
-    datafile = get_datafile(get_benchmark_filename(symbol), mode='wb')
-    benchmark_returns = pd.Series(dict(benchmark_data))
-    benchmark_returns.to_csv(datafile)
-    datafile.close()
+    store.write(get_data_filepath(get_benchmark_filename(symbol)),
+                _benchmarks_frame(get_benchmark_returns(symbol)))
 
 
 def update_benchmarks(symbol, last_date):
@@ -131,121 +134,117 @@ def update_benchmarks(symbol, last_date):
 
     last_date should be a datetime object of the most recent data
 
-    Puts source benchmark into zipline.
+    Appends the source benchmarks after last_date to the stored ones.
     """
-    datafile = get_datafile(get_benchmark_filename(symbol), mode='rb')
-    saved_benchmarks = pd.Series.from_csv(datafile)
-    datafile.close()
+    path = get_data_filepath(get_benchmark_filename(symbol))
 
     try:
         start = last_date + timedelta(days=1)
-        for daily_return in get_benchmark_returns(symbol, start_date=start):
-            # Not ideal but massaging data into expected format
-            benchmark = pd.Series({daily_return.date: daily_return.returns})
-            saved_benchmarks = saved_benchmarks.append(benchmark)
-
-        datafile = get_datafile(get_benchmark_filename(symbol), mode='wb')
-        saved_benchmarks.to_csv(datafile)
-        datafile.close()
+        store.append(path, _benchmarks_frame(
+            get_benchmark_returns(symbol, start_date=start)))
     except benchmarks.BenchmarkDataNotFoundError as exc:
         logger.warn(exc)
-    return saved_benchmarks
+    return store.read_series(path)
 
 
 def get_benchmark_filename(symbol):
-    return "%s_benchmark.csv" % symbol
-
-
-def load_market_data(bm_symbol='^GSPC'):
-    try:
-        fp_bm = get_datafile(get_benchmark_filename(bm_symbol), "rb")
-    except IOError:
-        print("""
-data files aren't distributed with source.
-Fetching data from Yahoo Finance.
-""").strip()
-        dump_benchmarks(bm_symbol)
-        fp_bm = get_datafile(get_benchmark_filename(bm_symbol), "rb")
-
-    saved_benchmarks = pd.Series.from_csv(fp_bm)
-    saved_benchmarks = saved_benchmarks.tz_localize('UTC')
-    fp_bm.close()
-
-    most_recent = pd.Timestamp('today', tz='UTC') - trading_day
-    most_recent_index = trading_days.searchsorted(most_recent)
-    days_up_to_now = trading_days[:most_recent_index + 1]
+    return "%s_benchmark.dat" % symbol
 
-    # Find the offset of the last date for which we have trading data in our
-    # list of valid trading days
-    last_bm_date = saved_benchmarks.index[-1]
-    last_bm_date_offset = days_up_to_now.searchsorted(
-        last_bm_date.strftime('%Y/%m/%d'))
 
-    # If more than 1 trading days has elapsed since the last day where
-    # we have data,then we need to update
-    if len(days_up_to_now) - last_bm_date_offset > 1:
-        benchmark_returns = update_benchmarks(bm_symbol, last_bm_date)
-        if (
-            benchmark_returns.index.tz is None
-            or
-            benchmark_returns.index.tz.zone != 'UTC'
-        ):
-            benchmark_returns = benchmark_returns.tz_localize('UTC')
+def _import_csv(csv_path, path, series=False):
+    # one-off conversion of the files written by earlier versions
+    if series:
+        data = pd.DataFrame({'returns': pd.Series.from_csv(csv_path)})
     else:
-        benchmark_returns = saved_benchmarks
-        if (
-            benchmark_returns.index.tz is None
-            or
-            benchmark_returns.index.tz.zone != 'UTC'
-        ):
-            benchmark_returns = benchmark_returns.tz_localize('UTC')
+        data = pd.DataFrame.from_csv(csv_path)
+        data = data[[c for c in data.columns if c not in ('date', 'tid')]]
+    store.write(path, data)
 
-    #Get treasury curve module, filename & source from mapping.
-    #Default to USA.
-    module, filename, source = INDEX_MAPPING.get(
-        bm_symbol, INDEX_MAPPING['^GSPC'])
 
-    try:
-        fp_tr = get_datafile(filename, "rb")
-    except IOError:
-        print("""
+def _market_data_path(filename, dump, source, series=False):
+    """
+    Path of the stored @filename, importing it from the CSV file of an
+    earlier version or fetching it with @dump if there is none.
+    """
+    path = get_data_filepath(filename)
+    if not os.path.exists(path):
+        csv_path = os.path.splitext(path)[0] + '.csv'
+        if os.path.exists(csv_path):
+            _import_csv(csv_path, path, series)
+        else:
+            print("""
 data files aren't distributed with source.
 Fetching data from {0}
 """).format(source).strip()
-        dump_treasury_curves(module, filename)
-        fp_tr = get_datafile(filename, "rb")
+            dump()
+    return path
+
 
-    saved_curves = pd.DataFrame.from_csv(fp_tr)
+def _is_stale(path, days_up_to_now):
+    last_date = store.last_date(path)
+    if last_date is None:
+        return True, None
 
-    # Find the offset of the last date for which we have trading data in our
+    # Find the offset of the last date for which we have data in our
     # list of valid trading days
-    last_tr_date = saved_curves.index[-1]
-    last_tr_date_offset = days_up_to_now.searchsorted(
-        last_tr_date.strftime('%Y/%m/%d'))
+    last_date_offset = days_up_to_now.searchsorted(last_date)
 
     # If more than 1 trading days has elapsed since the last day where
     # we have data,then we need to update
-    if len(days_up_to_now) - last_tr_date_offset > 1:
-        treasury_curves = dump_treasury_curves(module, filename)
+    return len(days_up_to_now) - last_date_offset > 1, last_date
+
+
+def _refresh(path, days_up_to_now, dump, update):
+    """
+    Bring the data stored at @path up to date, appending the days after
+    its last one with @update(last_date), or fetching all of it again with
+    @dump if it is empty.
+    """
+    stale, last_date = _is_stale(path, days_up_to_now)
+    if not stale:
+        return
+    if last_date is None:
+        dump()
     else:
-        treasury_curves = saved_curves.tz_localize('UTC')
+        update(last_date)
 
-    tr_curves = {}
-    for tr_dt, curve in treasury_curves.T.iterkv():
-        # tr_dt = tr_dt.replace(hour=0, minute=0, second=0, microsecond=0,
-        #                       tzinfo=pytz.utc)
-        tr_curves[tr_dt] = curve.to_dict()
 
-    fp_tr.close()
+def load_market_data(bm_symbol='^GSPC'):
+    calendar = calendars.get_calendar('NYSE')
+    trading_days = calendar.trading_days
+    most_recent = pd.Timestamp('today', tz='UTC') - calendar.trading_day
+    most_recent_index = trading_days.searchsorted(most_recent)
+    days_up_to_now = trading_days[:most_recent_index + 1]
+
+    bm_path = _market_data_path(get_benchmark_filename(bm_symbol),
+                                lambda: dump_benchmarks(bm_symbol),
+                                'Yahoo Finance', series=True)
+
+    _refresh(bm_path, days_up_to_now,
+             lambda: dump_benchmarks(bm_symbol),
+             lambda last_date: update_benchmarks(bm_symbol, last_date))
+    benchmark_returns = store.read_series(bm_path)
+
+    #Get treasury curve module, filename & source from mapping.
+    #Default to USA.
+    module, filename, source = INDEX_MAPPING.get(
+        bm_symbol, INDEX_MAPPING['^GSPC'])
+
+    tr_path = _market_data_path(filename,
+                                lambda: dump_treasury_curves(module, filename),
+                                source)
 
-    tr_curves = OrderedDict(sorted(
-        ((dt, c) for dt, c in tr_curves.iteritems()),
-        key=lambda t: t[0]))
+    _refresh(tr_path, days_up_to_now,
+             lambda: dump_treasury_curves(module, filename),
+             lambda last_date: update_treasury_curves(module, filename,
+                                                      last_date))
+    treasury_curves = store.read_frame(tr_path)
 
-    return benchmark_returns, tr_curves
+    return benchmark_returns, treasury_curves
 
 
-def _load_raw_yahoo_data(indexes=None, stocks=None, start=None, end=None):
+def _load_raw_yahoo_data(indexes=None, stocks=None, start=None, end=None,
+                         provider=None, max_workers=MAX_WORKERS):
     """Load closing prices from yahoo finance.
 
     :Optional:
@@ -258,6 +257,10 @@ def _load_raw_yahoo_data(indexes=None, stocks=None, start=None, end=None):
             Retrieve prices from start date on.
         end : datetime (Default: datetime(2002, 1, 1, 0, 0, 0, 0, pytz.utc))
             Retrieve prices until end date.
+        provider : Provider (Default: YahooProvider())
+            Source of the prices, see alephnull.data.providers.
+        max_workers : int (Default: MAX_WORKERS)
+            Number of symbols fetched at once.
 
     :Note:
         This is based on code presented in a talk by Wes McKinney:
@@ -273,28 +276,52 @@ must specify stocks or indexes"""
     if not start is None and not end is None:
         assert start < end, "start date is later than end date."
 
-    data = OrderedDict()
+    if end is None:
+        end = pd.Timestamp('today', tz='UTC')
 
-    if stocks is not None:
-        for stock in stocks:
-            cache_filename = "{stock}-{start}-{end}.csv".format(
-                stock=stock,
-                start=start,
-                end=end).replace(':', '-')
-            cache_filepath = get_cache_filepath(_colon_to_semicolon(cache_filename))
-            if os.path.exists(cache_filepath):
-                stkd = pd.DataFrame.from_csv(cache_filepath)
-            else:
-                stkd = DataReader(stock, 'yahoo', start, end).sort_index()
-                stkd.to_csv(cache_filepath)
-            data[stock] = stkd
+    if provider is None:
+        provider = YahooProvider()
 
+    names = []
+    symbols = []
+    if stocks is not None:
+        names.extend(stocks)
+        symbols.extend(stocks)
     if indexes is not None:
         for name, ticker in indexes.iteritems():
-            stkd = DataReader(ticker, 'yahoo', start, end).sort_index()
-            data[name] = stkd
+            names.append(name)
+            symbols.append(ticker)
+
+    def load(symbol):
+        return _load_symbol_data(provider, symbol, start, end)
+
+    frames = concurrent_map(load, symbols,
+                            max_workers=max_workers,
+                            retries=provider.retries,
+                            backoff=provider.backoff)
+    return OrderedDict(zip(names, frames))
+
+
+def get_symbol_cache_filepath(prefix, symbol):
+    return get_cache_filepath(
+        _colon_to_semicolon("{0}-{1}.npz".format(prefix, symbol)))
+
+
+def _load_symbol_data(provider, symbol, start, end):
+    """
+    Daily bars of @symbol from @provider. Those of a cached provider are
+    read from the per symbol cache, fetching only the dates it does not
+    cover yet.
+    """
+    def fetch(fetch_start, fetch_end):
+        return provider.fetch(symbol, fetch_start, fetch_end)
 
-    return data
+    if provider.cache_prefix is None:
+        return fetch(pd.Timestamp(cache.to_nanos(start)),
+                     pd.Timestamp(cache.to_nanos(end)))
+    return cache.load_range(
+        get_symbol_cache_filepath(provider.cache_prefix, symbol),
+        start, end, fetch)
 
 
 def _colon_to_semicolon(text):
@@ -305,7 +332,8 @@ def load_from_yahoo(indexes=None,
                     stocks=None,
                     start=None,
                     end=None,
-                    adjusted=True):
+                    adjusted=True,
+                    provider=None):
     """
     Loads price data from Yahoo into a dataframe for each of the indicated
     securities.  By default, 'price' is taken from Yahoo's 'Adjusted Close',
@@ -322,9 +350,11 @@ def load_from_yahoo(indexes=None,
     :type end: datetime
     :param adjusted: Adjust the price for splits and dividends.
     :type adjusted: bool
+    :param provider: Source of the prices, Yahoo by default.
+    :type provider: alephnull.data.providers.Provider
 
     """
-    data = _load_raw_yahoo_data(indexes, stocks, start, end)
+    data = _load_raw_yahoo_data(indexes, stocks, start, end, provider)
     if adjusted:
         close_key = 'Adj Close'
     else:
@@ -338,7 +368,8 @@ def load_bars_from_yahoo(indexes=None,
                          stocks=None,
                          start=None,
                          end=None,
-                         adjusted=True):
+                         adjusted=True,
+                         provider=None):
     """
     Loads data from Yahoo into a panel with the following
     column names for each indicated security:
@@ -365,9 +396,11 @@ def load_bars_from_yahoo(indexes=None,
     :param adjusted: Adjust open/high/low/close for splits and dividends.
         The 'price' field is always adjusted.
     :type adjusted: bool
+    :param provider: Source of the prices, Yahoo by default.
+    :type provider: alephnull.data.providers.Provider
 
     """
-    data = _load_raw_yahoo_data(indexes, stocks, start, end)
+    data = _load_raw_yahoo_data(indexes, stocks, start, end, provider)
     panel = pd.Panel(data)
     # Rename columns
     panel.minor_axis = ['open', 'high', 'low', 'close', 'volume', 'price']
@@ -0,0 +1,72 @@
+#
+# Copyright 2013 Quantopian, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Sources of daily bars for the loader.
+
+A provider returns, for a symbol and a range of dates, a frame indexed by
+date with the columns of Yahoo's daily prices:
+
+    Open, High, Low, Close, Volume, Adj Close
+"""
+
+import os
+
+import pandas as pd
+from pandas.io.data import DataReader
+
+YAHOO_COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume', 'Adj Close']
+
+
+class Provider(object):
+
+    # prefix of the per symbol cache files, or None to read uncached
+    cache_prefix = None
+    # retries of a failed fetch, and the seconds to wait before the first
+    retries = 0
+    backoff = 0.5
+
+    def fetch(self, symbol, start, end):
+        """
+        The daily bars of @symbol from @start to @end, inclusive.
+        """
+        raise NotImplementedError
+
+
+class YahooProvider(Provider):
+
+    cache_prefix = 'yahoo'
+    retries = 3
+
+    def fetch(self, symbol, start, end):
+        return DataReader(symbol, 'yahoo', start, end)
+
+
+class LocalDirectoryProvider(Provider):
+    """
+    Reads the bars of each symbol from a CSV file in @path, named after
+    @filename, with a Date column and the Yahoo columns, e.g. as saved from
+    the Yahoo website.
+    """
+
+    def __init__(self, path, filename='{symbol}.csv'):
+        self.path = path
+        self.filename = filename
+
+    def fetch(self, symbol, start, end):
+        filepath = os.path.join(self.path,
+                                self.filename.format(symbol=symbol))
+        bars = pd.read_csv(filepath, index_col=0, parse_dates=True)
+        return bars[YAHOO_COLUMNS].sort_index().ix[start:end]
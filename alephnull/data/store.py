@@ -0,0 +1,180 @@
+#
+# Copyright 2013 Quantopian, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Append-only binary files of daily rows, for the benchmark returns and
+treasury curves.
+
+A file starts with a fixed size header:
+
+    magic       8 bytes
+    columns     int64, the number of value columns
+    rows        int64, the number of rows written
+    last date   int64, nanoseconds since the epoch, of the last row
+    names       16 bytes for each column
+
+followed by the rows, each an int64 date in nanoseconds and one float64
+for each column. Rows are appended after the last one, and the header is
+only rewritten once they are on disk, so a failed append leaves the file
+as it was.
+"""
+
+import os
+import struct
+
+import numpy as np
+import pandas as pd
+
+MAGIC = 'ALNDAILY'
+HEADER = struct.Struct('<8sqqq')
+NAME_SIZE = 16
+
+# last date of an empty file
+NO_DATE = np.iinfo(np.int64).min
+
+
+class StoreHeader(object):
+
+    def __init__(self, columns, rows, last_date):
+        self.columns = columns
+        self.rows = rows
+        self.last_date = last_date
+
+    @property
+    def size(self):
+        return HEADER.size + NAME_SIZE * len(self.columns)
+
+    @property
+    def row_dtype(self):
+        return np.dtype([('date', '<i8'),
+                         ('values', '<f8', (len(self.columns),))])
+
+    def pack(self):
+        names = ''.join(struct.pack('{0}s'.format(NAME_SIZE), name)
+                        for name in self.columns)
+        return HEADER.pack(MAGIC, len(self.columns), self.rows,
+                           self.last_date) + names
+
+
+def read_header(f):
+    f.seek(0)
+    magic, ncolumns, rows, last_date = HEADER.unpack(f.read(HEADER.size))
+    if magic != MAGIC:
+        raise IOError("Not a daily store: {0}".format(f.name))
+    names = f.read(NAME_SIZE * ncolumns)
+    columns = [names[i:i + NAME_SIZE].rstrip('\0')
+               for i in range(0, len(names), NAME_SIZE)]
+    return StoreHeader(columns, rows, last_date)
+
+
+def last_date(path):
+    """
+    The date of the last row stored at @path, or None if it is empty.
+    """
+    with open(path, 'rb') as f:
+        header = read_header(f)
+    if not header.rows:
+        return None
+    return pd.Timestamp(header.last_date, tz='UTC')
+
+
+def _to_rows(header, dates, values):
+    rows = np.empty(len(dates), dtype=header.row_dtype)
+    rows['date'] = dates
+    rows['values'] = np.asarray(values, dtype=np.float64).reshape(
+        len(dates), len(header.columns))
+    return rows
+
+
+def _dates_to_nanos(dates):
+    return pd.DatetimeIndex(dates).asi8
+
+
+def write(path, frame):
+    """
+    Store the rows of @frame, indexed by date, at @path, replacing what
+    was there.
+    """
+    frame = frame.sort_index()
+    columns = [str(c) for c in frame.columns]
+    for name in columns:
+        if len(name) > NAME_SIZE:
+            raise ValueError("Column name {0!r} is longer than {1}".format(
+                name, NAME_SIZE))
+
+    dates = _dates_to_nanos(frame.index)
+    header = StoreHeader(columns, len(dates),
+                         dates[-1] if len(dates) else NO_DATE)
+    rows = _to_rows(header, dates, frame.values)
+
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(header.pack())
+        rows.tofile(f)
+    os.rename(tmp_path, path)
+
+
+def append(path, frame):
+    """
+    Append the rows of @frame, a frame with the columns of the file at
+    @path indexed by date, that are later than its last date. Returns the
+    number of rows appended.
+    """
+    frame = frame.sort_index()
+    dates = _dates_to_nanos(frame.index)
+
+    with open(path, 'r+b') as f:
+        header = read_header(f)
+        if list(frame.columns) != header.columns:
+            frame = frame.reindex(columns=header.columns)
+        new = dates > header.last_date
+        if not new.any():
+            return 0
+
+        rows = _to_rows(header, dates[new], frame.values[new])
+        f.seek(header.size + header.rows * header.row_dtype.itemsize)
+        rows.tofile(f)
+        f.truncate()
+        f.flush()
+        os.fsync(f.fileno())
+
+        header.rows += len(rows)
+        header.last_date = rows['date'][-1]
+        f.seek(0)
+        f.write(header.pack())
+    return len(rows)
+
+
+def read(path):
+    """
+    (dates, values, columns) of the file at @path, where @dates are the
+    UTC DatetimeIndex of its rows, and @values their 2d float64 array.
+    """
+    with open(path, 'rb') as f:
+        header = read_header(f)
+        f.seek(header.size)
+        rows = np.fromfile(f, dtype=header.row_dtype, count=header.rows)
+    dates = pd.DatetimeIndex(rows['date'], tz='UTC')
+    return dates, rows['values'], header.columns
+
+
+def read_frame(path):
+    dates, values, columns = read(path)
+    return pd.DataFrame(values, index=dates, columns=columns)
+
+
+def read_series(path):
+    dates, values, columns = read(path)
+    return pd.Series(values[:, 0], index=dates)
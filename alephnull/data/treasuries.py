@@ -13,6 +13,8 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 import re
+from array import array
+from itertools import izip
 
 import numpy as np
 import pandas as pd
@@ -57,6 +59,10 @@ _CURVE_MAPPINGS = {
     '30year': (get_treasury_rate, "BC_30YEAR"),
 }
 
+# the stored columns, in order
+DURATIONS = ['1month', '3month', '6month', '1year', '2year', '3year',
+             '5year', '7year', '10year', '20year', '30year']
+
 
 def treasury_mappings(mappings):
     return {key: Mapping(*value)
@@ -64,39 +70,23 @@ def treasury_mappings(mappings):
             in mappings.iteritems()}
 
 
-class iter_to_stream(object):
-    """
-    Exposes an iterable as an i/o stream
-    """
-    def __init__(self, iterable):
-        self.buffered = ""
-        self.iter = iter(iterable)
-
-    def read(self, size):
-        result = ""
-        while size > 0:
-            data = self.buffered or next(self.iter, None)
-            self.buffered = ""
-            if data is None:
-                break
-            size -= len(data)
-            if size < 0:
-                data, self.buffered = data[:size], data[size:]
-            result += data
-        return result
-
-
 def get_localname(element):
     qtag = ET.QName(element.tag).text
     return re.match("(\{.*\})(.*)", qtag).group(2)
 
 
-def get_treasury_source():
+def get_treasury_source(start_date=None):
     url = """\
 http://data.treasury.gov/feed.svc/DailyTreasuryYieldCurveRateData\
 """
-    res = requests.get(url, stream=True)
-    stream = iter_to_stream(res.iter_lines())
+    params = {}
+    if start_date is not None:
+        params['$filter'] = "NEW_DATE ge datetime'{0}'".format(
+            start_date.strftime('%Y-%m-%dT00:00:00'))
+    res = requests.get(url, params=params, stream=True)
+    # parse the body as it is read off the socket
+    stream = res.raw
+    stream.decode_content = True
 
     elements = ET.iterparse(stream, ('end', 'start-ns', 'end-ns'))
 
@@ -132,12 +122,51 @@ http://data.treasury.gov/feed.svc/DailyTreasuryYieldCurveRateData\
             updated_namespaces()
 
 
-def get_treasury_data():
+def get_treasury_data(start_date=None):
     mappings = treasury_mappings(_CURVE_MAPPINGS)
-    source = get_treasury_source()
+    source = get_treasury_source(start_date)
     return source_to_records(mappings, source)
 
 
+def curves_frame(rows, mappings, durations):
+    """
+    DataFrame of the curves of @rows, dicts of the source strings of a day,
+    converted as by @mappings, e.g. _CURVE_MAPPINGS. It is indexed by the
+    'date' of each row, with a column for each of @durations, and NaN for
+    missing rates.
+
+    The rows are consumed one at a time into a column of dates and a float
+    column for each duration.
+    """
+    mappings = treasury_mappings(mappings)
+    date_mapping = mappings['date']
+    rate_mappings = [mappings[duration] for duration in durations]
+
+    dates = []
+    rates = [array('d') for _ in durations]
+    for row in rows:
+        dates.append(guarded_conversion(date_mapping.conversion,
+                                        row.get(date_mapping.source)))
+        for column, mapping in izip(rates, rate_mappings):
+            rate = guarded_conversion(mapping.conversion,
+                                      row.get(mapping.source))
+            column.append(np.nan if rate is None else rate)
+
+    values = np.column_stack([np.array(column, dtype=np.float64)
+                              for column in rates])
+    return pd.DataFrame(values.reshape(len(dates), len(durations)),
+                        index=pd.to_datetime(dates, utc=True),
+                        columns=durations)
+
+
+def get_treasury_curves(start_date=None):
+    """
+    The curves from @start_date on, as by curves_frame.
+    """
+    return curves_frame(get_treasury_source(start_date), _CURVE_MAPPINGS,
+                        DURATIONS)
+
+
 def dataconverter(s):
     try:
         return float(s) / 100
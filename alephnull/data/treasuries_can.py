@@ -21,7 +21,7 @@ from . loader_utils import (
 )
 
 from alephnull.data.treasuries import (
-    treasury_mappings, get_treasury_date, get_treasury_rate
+    treasury_mappings, get_treasury_date, get_treasury_rate, curves_frame
 )
 
 
@@ -40,6 +40,10 @@ _CURVE_MAPPINGS = {
     '30year': (get_treasury_rate, "V39056"),
 }
 
+# the stored columns, in order
+DURATIONS = ['1month', '3month', '6month', '1year', '2year', '3year',
+             '5year', '7year', '10year', '30year']
+
 BILLS = ['V39063', 'V39065', 'V39066', 'V39067']
 BONDS = ['V39051', 'V39052', 'V39053', 'V39054', 'V39055', 'V39056']
 
@@ -119,7 +123,15 @@ def get_treasury_source(start_date=None, end_date=None):
         yield bill_dict
 
 
-def get_treasury_data():
+def get_treasury_data(start_date=None):
     mappings = treasury_mappings(_CURVE_MAPPINGS)
-    source = get_treasury_source()
+    source = get_treasury_source(start_date)
     return source_to_records(mappings, source)
+
+
+def get_treasury_curves(start_date=None):
+    """
+    The curves from @start_date on, as by curves_frame.
+    """
+    return curves_frame(get_treasury_source(start_date), _CURVE_MAPPINGS,
+                        DURATIONS)
@@ -120,3 +120,12 @@ the corresponding order.
     msg = """
 Transaction volume of {txn} exceeds the order volume of {order}.
 """.strip()
+
+
+class InvalidContractSpec(ZiplineError):
+    """
+    Raised when a contract spec fails validation while loading.
+    """
+    msg = """
+Invalid contract spec for {root} {contract}: {reason}
+""".strip()
@@ -53,7 +53,7 @@ futdata = FuturesDataFrameSource(source.tz_localize('UTC'))
 
 
 class FrontTrader(TradingAlgorithm):
-    @roll(lambda x: x[x['open_interest'] == x['open_interest'].max()])
+    @roll('open_interest')
     def handle_data(self, data):
         for sym in data.keys():
             self.order((sym, data[sym]['contract']), 2)
@@ -10,7 +10,7 @@ from pandas.tslib import Timestamp
 from pandas.core.frame import DataFrame
 from collections import OrderedDict
 import datetime
-import random
+import numpy as np
 import pytz
 import pandas as pd
 
@@ -56,31 +56,12 @@ CONTRACT_COUNT = sum([sum([1 for m in month_list]) for month_list in [x for x in
 
 
 
-class PrevIterator(object):
-    """Iterator with the capability to fetch the previous element
-    (though history does not go back any farther).
-    """
-    def __init__(self, iterator):
-        self.iterator = iterator
-        self.current_element = None
-        self.last_element = None
-    
-    def __iter__(self):
-        return self
-    
-    def next(self):
-        self.last_element = self.current_element
-        self.current_element = next(self.iterator)
-        return self.current_element
-        
-    def last(self):
-        return self.last_element
-
-
-def lazy_contracts():
-    for symbol, months in ACCEPTABLE_SYMBOLS.iteritems():
+def lazy_contracts(symbols=None, contract_out_limit=None):
+    symbols = symbols or ACCEPTABLE_SYMBOLS
+    contract_out_limit = contract_out_limit or CONTRACT_OUT_LIMIT
+    for symbol, months in symbols.iteritems():
         for month in list(months):
-            for year in range(datetime.date.today().year, CONTRACT_OUT_LIMIT + 1):
+            for year in range(BAR_RANGE[0].year, contract_out_limit + 1):
                 short_year = year - 2000
                 yield (symbol, month, str(short_year))
 
@@ -109,50 +90,78 @@ def lazy_timestamps():
             running_timestamp = Timestamp(running_timestamp)
 
 
-def create_dummy_universe_dict():
+def create_dummy_frame(seed=None, symbols=None, contract_out_limit=None,
+                       timestamps=None, price_percent_change=0.1,
+                       open_interest_percent_change=0.1):
     """
-    WARNING: Because the underlying data structure has to be highly nested, the logic in here
-    will be highly nested.
+    Random walks of price and open interest for every contract, in the
+    (symbol, contract, metric) column format of FuturesDataFrameSource.
+
+    Each step multiplies the previous value by a gaussian of mean 1 and
+    standard deviation of the percent change, for all contracts at once.
+    Margin requirements stay static at 100.00.
+
+    Args:
+        seed (int): seed of the random walks, for repeatable data
+        symbols (dict): symbol => delivery month codes, defaults to
+            ACCEPTABLE_SYMBOLS
+        contract_out_limit (int): the last delivery year, defaults to
+            CONTRACT_OUT_LIMIT
+        timestamps (DatetimeIndex): bar times, defaults to lazy_timestamps()
     """
+    random_state = np.random.RandomState(seed)
+    if timestamps is None:
+        timestamps = pd.DatetimeIndex(list(lazy_timestamps()))
+    contracts = [(symbol, month + short_year) for symbol, month, short_year
+                 in lazy_contracts(symbols, contract_out_limit)]
+    shape = (len(timestamps), len(contracts))
+
+    def random_walk(first, percent_change):
+        steps = 1 + percent_change * random_state.standard_normal(shape)
+        steps[0] = first
+        return steps.cumprod(axis=0)
+
+    prices = random_walk(random_state.random_sample(len(contracts)) * 100,
+                         price_percent_change).round(2)
+    open_interest = random_walk(
+        random_state.random_sample(len(contracts)) * 2000,
+        open_interest_percent_change).round(0)
+    volume = random_state.randint(1, 1000, shape).astype(float)
+    margin_requirements = np.empty(shape)
+    margin_requirements.fill(100.00)
+
+    metrics = ['price', 'volume', 'open_interest', 'margin_requirements']
+    values = np.dstack([prices, volume, open_interest, margin_requirements])
+    columns = pd.MultiIndex.from_tuples(
+        [(symbol, expiry, metric) for symbol, expiry in contracts
+         for metric in metrics])
+    return DataFrame(values.reshape(len(timestamps), -1),
+                     index=timestamps, columns=columns)
+
+
+def create_dummy_universe_dict(seed=None):
+    """
+    create_dummy_frame as a nested {timestamp: {symbol: {contract:
+    {metric: value}}}} dict.
+    """
+    frame = create_dummy_frame(seed)
+    contracts = []
+    for symbol, expiry, _ in frame.columns:
+        if (symbol, expiry) not in contracts:
+            contracts.append((symbol, expiry))
+    values = frame.values.reshape(len(frame.index), len(contracts), -1)
+
     universe_dict = OrderedDict()
-    timestamps = PrevIterator(lazy_timestamps())
-    for timestamp in timestamps:
-        universe_dict[timestamp] = {}
-        for symbol, month, short_year in lazy_contracts():
-            if symbol not in universe_dict[timestamp]:
-                universe_dict[timestamp][symbol] = {}
-            expiry = month + str(short_year)
-            universe_dict[timestamp][symbol][expiry] = {}
-            
-            if timestamps.last() in universe_dict:
-                old_price = universe_dict[timestamps.last()][symbol][expiry]["Price"]
-                price_percent_change = 0.1
-                new_price = random.gauss(mu=old_price, sigma=old_price * price_percent_change)
-                
-                old_open_interest = universe_dict[timestamps.last()][symbol][expiry]["Open Interest"]
-                open_interest_percent_change = 0.1
-                new_open_interest = random.gauss(mu=old_open_interest,
-                                                 sigma=old_open_interest * open_interest_percent_change)
-
-                # For now, assume all margin requirements stay static.
-                # In the future: read the SPAN Margining handout for an algorithm
-                old_margin_requirements = universe_dict[timestamps.last()][symbol][expiry]["Margin Requirements"]
-                new_margin_requirements = old_margin_requirements
-            else:
-                # First price
-                new_price = random.random() * 100
-                new_open_interest = random.random() * 2000
-                new_margin_requirements = 100.00
-                
-            new_price = round(new_price, 2)
-            universe_dict[timestamp][symbol][expiry]["Price"] = new_price
-            
-            new_open_interest = int(round(new_open_interest, 0))
-            universe_dict[timestamp][symbol][expiry]["Open Interest"] = new_open_interest
-
-            new_margin_requirements = round(new_margin_requirements, 2)
-            universe_dict[timestamp][symbol][expiry]["Margin Requirements"] = new_margin_requirements
-        
+    for i, timestamp in enumerate(frame.index):
+        universe_dict[timestamp] = symbol_dict = {}
+        for j, (symbol, expiry) in enumerate(contracts):
+            price, _, open_interest, margin_requirements = values[i, j]
+            symbol_dict.setdefault(symbol, {})[expiry] = {
+                "Price": price,
+                "Open Interest": int(open_interest),
+                "Margin Requirements": margin_requirements,
+            }
+
     return universe_dict
 
 
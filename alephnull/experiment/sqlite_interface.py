@@ -1,47 +1,142 @@
+"""
+SQLite store of futures bars.
+
+Bars live in one table with a row per (timestamp, symbol, contract_month),
+indexed on that key and on (symbol, timestamp, contract_month), so point
+lookups and date range scans, across all symbols or of one symbol, are
+index searches returning rows already in timestamp order.
+Bulk loads go through executemany in a single transaction, and the
+database runs in WAL mode so readers don't block a loading writer.
+
+Timestamps are stored as integer seconds since the epoch, UTC.
+"""
+
 import sqlite3
+
+import numpy as np
+import pandas as pd
 from pandas.tslib import Timestamp
 
+from alephnull.gens.utils import hash_args
+from alephnull.sources.data_source import DataSource
+
+METRICS = ('price', 'open_interest', 'margin_requirements', 'volume')
+
+RANGE_DTYPE = [
+    ('dt', np.int64),
+    ('symbol', object),
+    ('contract_month', object),
+    ('price', np.float64),
+    ('open_interest', np.float64),
+    ('margin_requirements', np.float64),
+    ('volume', np.float64),
+]
+
+
+def _metric_name(metric):
+    # Change "Margin Requirements" to "margin_requirements", etc.
+    metric = metric.replace(" ", "_").lower()
+    if metric not in METRICS:
+        raise ValueError("Unknown metric {0!r}, expected one of {1}".format(
+            metric, METRICS))
+    return metric
+
 
 class FuturesDB(object):
-    
+
     def __init__(self, file_path):
+        self.file_path = file_path
         self.conn = sqlite3.connect(file_path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
         self.cursor = self.conn.cursor()
-        
+
     def initialize_tables(self):
-        self.cursor.execute('''CREATE TABLE timestamps
-                     (t_id INTEGER PRIMARY KEY, timestamp integer)''')
-        self.cursor.execute('''CREATE TABLE symbols
-                     (s_id INTEGER PRIMARY KEY, symbol TEXT, t_parent INTEGER)''')
-        self.cursor.execute('''CREATE TABLE contracts
-                     (c_id INTEGER PRIMARY KEY, contract_month TEXT, price REAL, open_interest INTEGER,
-                     margin_requirements REAL, s_parent INTEGER)''')
-                     
+        with self.conn:
+            self.conn.execute('''CREATE TABLE IF NOT EXISTS bars
+                (timestamp INTEGER NOT NULL,
+                 symbol TEXT NOT NULL,
+                 contract_month TEXT NOT NULL,
+                 price REAL,
+                 open_interest INTEGER,
+                 margin_requirements REAL,
+                 volume INTEGER)''')
+            self.conn.execute('''CREATE UNIQUE INDEX IF NOT EXISTS
+                bars_by_timestamp ON bars
+                (timestamp, symbol, contract_month)''')
+            self.conn.execute('''CREATE INDEX IF NOT EXISTS
+                bars_by_symbol ON bars
+                (symbol, timestamp, contract_month)''')
+
+    def insert_rows(self, rows):
+        """
+        Insert or replace (timestamp, symbol, contract_month, price,
+        open_interest, margin_requirements, volume) tuples, with timestamps
+        in seconds, in one transaction.
+        """
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO bars VALUES (?, ?, ?, ?, ?, ?, ?)",
+                rows)
+
     def insert_dict(self, universe_dict):
-        for timestamp, symbol_dict in universe_dict.iteritems():
-            timestamp_as_int = self._int_from_timestamp(timestamp)
-            self.cursor.execute("INSERT INTO timestamps VALUES (NULL, ?)", (timestamp_as_int,))
-            t_id = self.cursor.lastrowid
-            
-            for symbol, contract_dict in symbol_dict.iteritems():
-                self.cursor.execute("INSERT INTO symbols VALUES (NULL, ?, ?)", (symbol, t_id))
-                s_id = self.cursor.lastrowid
-                
-                for contract_month, details_dict in contract_dict.iteritems():
-                    self.cursor.execute("INSERT INTO contracts VALUES (NULL, ?, ?, ?, ?)",
-                                        (contract_month, details_dict['Price'], details_dict['Open Interest'], s_id))
+        """
+        Insert a nested {timestamp: {symbol: {contract_month: {metric:
+        value}}}} dict, e.g. from create_dummy_universe_dict.
+        """
+        def rows():
+            for timestamp, symbol_dict in universe_dict.iteritems():
+                timestamp_as_int = self._int_from_timestamp(timestamp)
+                for symbol, contract_dict in symbol_dict.iteritems():
+                    for contract_month, details in contract_dict.iteritems():
+                        yield (timestamp_as_int, symbol, contract_month,
+                               details.get('Price'),
+                               details.get('Open Interest'),
+                               details.get('Margin Requirements'),
+                               details.get('Volume'))
+
+        self.insert_rows(rows())
+
+    def insert_frame(self, data):
+        """
+        Insert a DataFrame in the format of FuturesDataFrameSource, with
+        (symbol, contract_month, metric) columns.
+        """
+        timestamps = data.index.asi8 // 10 ** 9
+        contracts = []
+        for column in data.columns:
+            if column[:2] not in contracts:
+                contracts.append(column[:2])
+
+        def column_values(symbol, contract_month, metric):
+            for name in (metric, metric.replace('_', ' ').title()):
+                if (symbol, contract_month, name) in data.columns:
+                    values = data[(symbol, contract_month, name)].values
+                    return [None if v != v else v
+                            for v in values.astype(float).tolist()]
+            return [None] * len(timestamps)
+
+        def rows():
+            for symbol, contract_month in contracts:
+                columns = [column_values(symbol, contract_month, metric)
+                           for metric in METRICS]
+                for i, timestamp in enumerate(timestamps.tolist()):
+                    yield ((timestamp, symbol, contract_month) +
+                           tuple(column[i] for column in columns))
+
+        self.insert_rows(rows())
 
     def get(self, metric, timestamp, symbol=None, month=None):
         """Get a dict of prices that is wider or narrower depending on what parameters
         are specified.
-        
+
         If you call fdb.get_prices(some_timestamp), you will get a dict that looks like:
            {YG: {F15: 100.00, N14: 340.12}, CT: {F16: 53.23, Z12: 56.98}}
         If you call fdb.get_prices(some_timestamp, some_symbol), you will get a dict that looks like:
             {F15: 100.00, N14: 340.12}
         If you call fdb.get_prices(some_timestamp, some_symbol, some_month), you will get a double
             that represents a single price, like 134.57
-        
+
         Args:
             metric (string): which metric - i.e. price, margin_requirements, etc. - is requested
             timestamp (Timestamp): a Timestamp instance
@@ -49,94 +144,159 @@ class FuturesDB(object):
             month (string): a month letter plus a year that represents, along with the symbol,
                 a specific contract (i.e. F15)
         """
-        # Change "Margin Requirements" to "margin_requirements", etc.
-        metric = metric.replace(" ", "_")
-        metric = metric.lower()
-
+        metric = _metric_name(metric)
         timestamp_as_int = self._int_from_timestamp(timestamp)
-        self.cursor.execute("SELECT * FROM timestamps WHERE timestamp=?", (timestamp_as_int,))
-        t_row = self.cursor.fetchone()
-        t_record = self._dict_from_result_tuple('timestamps', t_row)
-        
+
+        if symbol is not None and month is not None:
+            self.cursor.execute(
+                "SELECT {0} FROM bars WHERE timestamp=? AND symbol=? "
+                "AND contract_month=?".format(metric),
+                (timestamp_as_int, symbol, month))
+            row = self.cursor.fetchone()
+            return row[0] if row is not None else None
+
         if symbol is not None:
-            self.cursor.execute("SELECT s_id, symbol FROM symbols WHERE t_parent=? AND symbol=?", (t_record['t_id'], symbol))
-            s_row = self.cursor.fetchone()
-            s_record = {'s_id': s_row[0], 'symbol': s_row[1]}
-            
-            if month is not None:
-                self.cursor.execute("""SELECT * FROM contracts
-                WHERE s_parent=? AND contract_month=?""", (s_record['s_id'], month))
-                c_row = self.cursor.fetchone()
-                c_record = self._dict_from_result_tuple('contracts', c_row)
-                
-                return c_record[metric]
-                
-            else:
-                result_dict = {}
-                self.cursor.execute("""SELECT * FROM contracts WHERE s_parent=?""", (s_record['s_id'],))
-                for result in self.cursor:
-                    c_record = self._dict_from_result_tuple('contracts', result)
-                    result_dict[c_red] = c_record[metric]
-                return result_dict
-        else:
-            symbol_dict = {}
-            result_dict = {}
-            self.cursor.execute("SELECT s_id, symbol FROM symbols WHERE t_parent=?", (t_record['t_id'],))
-            for s_id, symbol in self.cursor:
-                symbol_dict[symbol] = s_id
-            
-            for symbol, s_id in symbol_dict.iteritems():
-                result_dict[symbol] = {}
-                self.cursor.execute("SELECT contract_month, price FROM contracts WHERE s_parent=?", (s_id,))
-                for contract_month, price in self.cursor:
-                    result_dict[symbol][contract_month] = {"Price": price}
-            
-            return result_dict
-                    
+            self.cursor.execute(
+                "SELECT contract_month, {0} FROM bars "
+                "WHERE timestamp=? AND symbol=?".format(metric),
+                (timestamp_as_int, symbol))
+            return dict(self.cursor.fetchall())
+
+        result_dict = {}
+        self.cursor.execute(
+            "SELECT symbol, contract_month, {0} FROM bars "
+            "WHERE timestamp=?".format(metric),
+            (timestamp_as_int,))
+        for symbol, contract_month, value in self.cursor:
+            result_dict.setdefault(symbol, {})[contract_month] = value
+        return result_dict
+
     def get_price(self, timestamp, symbol, month):
         return self.get("Price", timestamp, symbol, month)
-        
+
+    def get_range(self, start, end, symbol=None, month=None):
+        """
+        All bars with timestamps in [@start, @end], optionally of one
+        @symbol or contract, in timestamp order, as a numpy record array
+        with the fields of RANGE_DTYPE. dt is in nanoseconds and missing
+        values are NaN.
+        """
+        query, args = self._range_query('*', start, end, symbol, month)
+        self.cursor.execute(query, args)
+        rows = [(row[0] * 10 ** 9,) + row[1:3] +
+                tuple(np.nan if value is None else value
+                      for value in row[3:])
+                for row in self.cursor.fetchall()]
+        return np.array(rows, dtype=RANGE_DTYPE).view(np.recarray)
+
+    def _range_query(self, columns, start, end, symbol=None, month=None,
+                     symbols=None):
+        query = "SELECT {0} FROM bars WHERE timestamp BETWEEN ? AND ?".format(
+            columns)
+        args = [self._int_from_timestamp(start),
+                self._int_from_timestamp(end)]
+        if symbol is not None:
+            query += " AND symbol=?"
+            args.append(symbol)
+        if month is not None:
+            query += " AND contract_month=?"
+            args.append(month)
+        if symbols is not None:
+            query += " AND symbol IN ({0})".format(
+                ', '.join('?' * len(symbols)))
+            args.extend(symbols)
+        query += " ORDER BY timestamp, symbol, contract_month"
+        return query, args
+
     def get_all_timestamps(self):
-        self.cursor.execute("SELECT timestamp FROM timestamps")
-        return [self._timestamp_from_int(ts_as_int) for (ts_as_int,) in self.cursor]
-        
-    def __getitem__(self, timestamp):
-        query1 = "SELECT * FROM timestamps WHERE timestamp=?"
-        query2 = "SELECT * FROM symbols WHERE t_parent=? AND symbol=?"
-        query3 = "SELECT * FROM contracts WHERE  s_parent=? AND contract_month=?"
-        
-    def _kw_row(self, row, table):
-        if table=='timestamps':
-            t_record = {'t_id': t_row[0], 'timestamp': t_row[1]}
-        if table=='symbols':
-            pass
-            
+        self.cursor.execute("SELECT DISTINCT timestamp FROM bars "
+                            "ORDER BY timestamp")
+        return [self._timestamp_from_int(ts_as_int)
+                for (ts_as_int,) in self.cursor]
+
     def _int_from_timestamp(self, timestamp):
-        return int(timestamp.value / 10 ** 9)
+        return int(Timestamp(timestamp).value // 10 ** 9)
 
     def _timestamp_from_int(self, timestamp_as_int):
-        return Timestamp(timestamp_as_int * 10 ** 9)
+        return Timestamp(timestamp_as_int * 10 ** 9, tz='UTC')
 
-    def _dict_from_result_tuple(self, table, result):
-        """
+    def close(self):
+        self.conn.close()
 
-        Assumes that the requester did a "SELECT *" from whatever table.
-        If that is not the case, this method will yield an incorrect result.
 
-        Args:
-            table (string): table name by which the results are formatted
-            result (tuple): result of a "SELECT *" query
+class FuturesDBSource(DataSource):
+    """
+    Streams the bars of a FuturesDB between @start and @end, in timestamp
+    order, as futures trade events.
 
-        Returns:
-            map (dict): dictionary that maps a column name to its value
-        """
-        if table == 'timestamps':
-            map = {'t_id': result[0], 'timestamp': result[1]}
-        elif table == 'symbols':
-
-        elif table == 'contracts':
-            map = {'c_id': result[0], 'contract_month': result[1], 'price': result[2],
-                    'open_interest': result[3], 'margin_requirements': result[4], 's_parent': result[5]}
-        
-    def close(self):
-        self.conn.close()
\ No newline at end of file
+    Configuration options:
+
+    sids   : optional list of symbols to stream
+    """
+
+    def __init__(self, db, start, end, **kwargs):
+        if isinstance(db, basestring):
+            db = FuturesDB(db)
+        self.db = db
+        self.start = start
+        self.end = end
+        self.sids = kwargs.get('sids')
+        self.chunk_size = kwargs.get('chunk_size', 10000)
+
+        self.arg_string = hash_args(db.file_path, start, end, **kwargs)
+        self._raw_data = None
+
+    def _query(self, columns):
+        query, args = self.db._range_query(columns, self.start, self.end,
+                                           symbols=self.sids)
+        cursor = self.db.conn.cursor()
+        cursor.execute(query, args)
+        return cursor
+
+    @property
+    def mapping(self):
+        return {
+            'dt': (lambda x: pd.Timestamp(x * 10 ** 9, tz='UTC'),
+                   'timestamp'),
+            'sid': (lambda x: x, 'symbol'),
+            'contract': (lambda x: x, 'contract_month'),
+            'price': (float, 'price'),
+            'open_interest': (int, 'open_interest'),
+            'volume': (int, 'volume'),
+        }
+
+    def apply_mapping(self, raw_row):
+        row = {target: mapping_func(raw_row[source_key])
+               for target, (mapping_func, source_key)
+               in self.mapping.items()
+               if raw_row[source_key] is not None}
+        row.update({'source_id': self.get_hash()})
+        row.update({'type': self.event_type})
+        return row
+
+    @property
+    def instance_hash(self):
+        return self.arg_string
+
+    @property
+    def event_dts(self):
+        cursor = self._query('timestamp')
+        return np.fromiter((timestamp for (timestamp,) in cursor),
+                           dtype=np.int64) * 10 ** 9
+
+    def raw_data_gen(self):
+        cursor = self._query('timestamp, symbol, contract_month, price, '
+                             'open_interest, volume')
+        names = [description[0] for description in cursor.description]
+        while True:
+            rows = cursor.fetchmany(self.chunk_size)
+            if not rows:
+                break
+            for row in rows:
+                yield dict(zip(names, row))
+
+    @property
+    def raw_data(self):
+        if not self._raw_data:
+            self._raw_data = self.raw_data_gen()
+        return self._raw_data
@@ -30,6 +30,7 @@ from alephnull.finance.slippage import (
     check_order_triggers
     )
 from alephnull.finance.commission import PerShare
+from alephnull.finance.contracts import get_contract_specs
 import alephnull.utils.math_utils as zp_math
 
 
@@ -67,6 +68,8 @@ class Blotter(object):
         self.new_orders = []
         self.current_dt = None
         self.max_shares = int(1e+11)
+        # read on the first futures fill, see futures_handle_leverage
+        self.contract_specs = None
 
     def __repr__(self):
         return """
@@ -251,15 +254,20 @@ class Blotter(object):
         #if this offsets an existing position return
 
         sid = (order.sid, order.contract)
+        if self.contract_specs is None:
+            self.contract_specs = get_contract_specs()
+        # dollar value of the order's fills including this transaction
+        order_value = txn.price * self.contract_specs.multiplier(sid) * \
+            (txn.amount + order.filled)
 
         if self.portfolio.positions[sid].amount + txn.amount != 0:
             #test to see if this is a short position
 
             if txn.amount + self.portfolio.positions[sid].amount < 0:
                 if order.direction < 0:
-                    if abs(txn.price * (txn.amount + order.filled)) * .5 > self.portfolio.portfolio_value:
+                    if abs(order_value) * .5 > self.portfolio.portfolio_value:
                         log.info(leverage_err.format(
-                            txn.price * (txn.amount + order.filled),
+                            order_value,
                             order.sid, self.portfolio.portfolio_value / .5,
                             order.filled, order.amount,
                             order.amount - order.filled))
@@ -271,9 +279,9 @@ class Blotter(object):
             #test to see if this is a long position
             if txn.amount + self.portfolio.positions[sid].amount > 0:
                 if order.direction > 0:
-                    if txn.price * (txn.amount + order.filled) > self.portfolio.cash:
+                    if order_value > self.portfolio.cash:
                         log.info(leverage_err.format(
-                            txn.price * (txn.amount + order.filled),
+                            order_value,
                             order.sid, self.portfolio.cash,
                             order.filled, order.amount,
                             order.amount - order.filled))
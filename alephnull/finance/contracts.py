@@ -0,0 +1,395 @@
+#
+# Copyright 2013 Quantopian, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+
+Contract Specs
+==============
+
+Futures contract specifications, keyed by root symbol. Each root carries a
+multiplier (what a price is multiplied by to give the value of a single
+contract), a tick size, a quote currency and the initial and maintenance
+margin as a fraction of contract value. Each contract of the root may carry
+its first notice and expiration dates.
+
+Specs are read from a JSON or CSV file, and are parsed and validated once,
+at load. A JSON file looks like::
+
+    {"GS": {"multiplier": 25, "tick_size": 0.05, "currency": "$",
+            "contracts": {"N10": {"first_notice": "2010-06-28",
+                                  "expiration": "2010-07-15"}}}}
+
+A CSV file has one row per contract, with the header::
+
+    root,contract,multiplier,contract_size,quoted_unit,tick_size,currency,
+    initial_margin_rate,maintenance_margin_rate,first_notice,expiration
+
+Rows with an empty contract only set the fields of the root. Instead of a
+multiplier, a spec may give a contract_size such as "1,000 TONS" or
+"$50 X INDEX" together with the quoted_unit of the price, from which the
+multiplier is parsed.
+
+Contracts without a multiplier in the specs take theirs from alephtools
+when it is installed, and otherwise from DEFAULT_MULTIPLIER, with a
+warning. Contracts without listed dates have no first notice or
+expiration.
+
+"""
+
+import csv
+import json
+import os
+import re
+from collections import namedtuple
+from os.path import expanduser
+
+import logbook
+import pandas as pd
+from pandas.tseries.tools import normalize_date
+
+from alephnull.errors import InvalidContractSpec
+
+log = logbook.Logger('Contracts')
+
+# multiplier of the contracts there is no spec for
+DEFAULT_MULTIPLIER = 25
+
+try:
+    from alephtools.connection import get_multiplier
+except ImportError:
+    def get_multiplier(sid):
+        log.warn("No contract spec for {0}, using multiplier {1}".format(
+            sid, DEFAULT_MULTIPLIER))
+        return DEFAULT_MULTIPLIER
+
+# the data directory of alephnull.data.loader, where the specs file is
+# looked for
+DATA_PATH = os.path.join(expanduser("~"), '.zipline', 'data')
+
+DELIVERY_MONTHS = 'FGHJKMNQUVXZ'
+
+CONTRACT_SPEC_FILES = ('contract_specs.json', 'contract_specs.csv')
+
+DEFAULT_INITIAL_MARGIN_RATE = 0.25
+DEFAULT_MAINTENANCE_MARGIN_RATE = 0.20
+
+# Estimated number of units of each quote currency to the dollar, used to
+# bring contract sizes quoted in other currencies to dollars.
+UNITS_PER_DOLLAR = {
+    '$': 1,
+    'AU$': 1.12,
+    'CD$': 1.07,
+    'CHF': 0.91,
+    'CZK': 20.18,
+    'HUF': 220.32,
+    'NOK': 6.17,
+    'NZD': 1.21,
+    'SEK': 6.51,
+    'TRY': 2.17,
+    u'\xa3': 0.61,  # Pound
+    u'\xa5': 104.49,  # Yen
+    u'\xf3': 100,  # Cents
+    u'\u20ac': 0.73,  # Euro
+}
+
+QUANTITY_SIZE = re.compile(r'^([0-9,\.]+) [A-Za-z\. \$]+$')
+INDEX_SIZE = re.compile(
+    r'^\$?([\.0-9,]+)[ ]+(X[ ]+INDEX|TIMES INDEX VALUE)$')
+PER_UNIT_QUOTE = re.compile(r'^\$/.+$')
+
+
+ContractSpec = namedtuple('ContractSpec', [
+    'root',
+    'multiplier',
+    'tick_size',
+    'currency',
+    'initial_margin_rate',
+    'maintenance_margin_rate',
+])
+
+
+def parse_multiplier(contract_size, quoted_unit='$'):
+    """
+    Parse a contract size, e.g. "42,000 GAL" quoted in "$", or
+    "$50 X INDEX" quoted in "PTS.", to the dollar value of one contract
+    per unit of price.
+
+    Returns None when the contract size is not understood.
+    """
+    contract_size = contract_size.strip()
+    # the keys of UNITS_PER_DOLLAR are unicode, e.g. u'\xa3'
+    if isinstance(quoted_unit, str):
+        quoted_unit = quoted_unit.decode('utf-8')
+
+    if quoted_unit == 'PTS.':
+        match = INDEX_SIZE.match(contract_size)
+        if match:
+            return float(match.group(1).replace(',', ''))
+        return None
+
+    if quoted_unit in UNITS_PER_DOLLAR or PER_UNIT_QUOTE.match(quoted_unit):
+        match = QUANTITY_SIZE.match(contract_size)
+        if match:
+            quantity = float(match.group(1).replace(',', ''))
+            return quantity / UNITS_PER_DOLLAR.get(quoted_unit, 1)
+
+    return None
+
+
+def _decode(value):
+    if isinstance(value, str):
+        return value.decode('utf-8')
+    return value
+
+
+def parse_date(value, field, root, contract):
+    if value is None or value == '':
+        return None
+    try:
+        return normalize_date(pd.Timestamp(value, tz='UTC'))
+    except (ValueError, TypeError):
+        raise InvalidContractSpec(root=root, contract=contract,
+                                  reason="{0} is not a date: {1!r}".format(
+                                      field, value))
+
+
+def delivery_month(contract):
+    """
+    The first day of the delivery month of a contract code, e.g. 'N10' for
+    July 2010.
+    """
+    month = DELIVERY_MONTHS.find(contract[0]) + 1
+    if month == 0 or not contract[1:].isdigit():
+        return None
+    year = int(contract[1:])
+    if year < 100:
+        year += 2000
+    return pd.Timestamp('{0}-{1:02d}-01'.format(year, month), tz='UTC')
+
+
+class ContractSpecs(object):
+    """
+    Registry of contract specs.
+
+    Lookups take a position key, i.e. a (root, contract) tuple, or a
+    bare root. Roots without a multiplier fall back to
+    @fallback_multiplier, which is asked once per key.
+    """
+
+    def __init__(self, fallback_multiplier=get_multiplier):
+        self.fallback_multiplier = fallback_multiplier
+        self.specs = {}
+        # (root, contract) => (first_notice, expiration)
+        self.dates = {}
+        # key => spec with the fallback multiplier of the key
+        self._fallbacks = {}
+
+    def __len__(self):
+        return len(self.specs)
+
+    def __contains__(self, root):
+        return root in self.specs
+
+    @classmethod
+    def load(cls, path, **kwargs):
+        """
+        Read specs from a .json or .csv file.
+        """
+        specs = cls(**kwargs)
+        if path.endswith('.json'):
+            with open(path) as f:
+                specs.update_from_dict(json.load(f))
+        else:
+            with open(path, 'rb') as f:
+                specs.update_from_rows(csv.DictReader(f))
+        return specs
+
+    def update_from_dict(self, roots):
+        for root, fields in roots.iteritems():
+            self.add(root, **fields)
+
+    def update_from_rows(self, rows):
+        """
+        Add the specs of @rows, dicts of UTF-8 encoded CSV cells.
+        """
+        for row in rows:
+            row = dict((k.strip(), _decode(v).strip())
+                       for k, v in row.iteritems()
+                       if k is not None and v is not None)
+            contract = row.pop('contract', '') or None
+            first_notice = row.pop('first_notice', None)
+            expiration = row.pop('expiration', None)
+            contracts = None
+            if contract is not None:
+                contracts = {contract: {'first_notice': first_notice,
+                                        'expiration': expiration}}
+            self.add(contracts=contracts, **row)
+
+    def add(self, root, multiplier=None, contract_size=None,
+            quoted_unit='$', tick_size=None, currency=None,
+            initial_margin_rate=None, maintenance_margin_rate=None,
+            contracts=None):
+        """
+        Add or extend the spec of @root, validating its fields.
+        """
+        existing = self.specs.get(root)
+
+        if multiplier in (None, '') and contract_size:
+            multiplier = parse_multiplier(contract_size, quoted_unit or '$')
+            if multiplier is None:
+                raise InvalidContractSpec(
+                    root=root, contract=None,
+                    reason="can't parse contract size {0!r} quoted in "
+                           "{1!r}".format(contract_size, quoted_unit))
+
+        multiplier = self._positive(root, 'multiplier', multiplier)
+        tick_size = self._positive(root, 'tick_size', tick_size)
+        initial_margin_rate = self._positive(
+            root, 'initial_margin_rate', initial_margin_rate)
+        maintenance_margin_rate = self._positive(
+            root, 'maintenance_margin_rate', maintenance_margin_rate)
+
+        if existing is not None:
+            if multiplier is not None and existing.multiplier is not None \
+                    and multiplier != existing.multiplier:
+                raise InvalidContractSpec(
+                    root=root, contract=None,
+                    reason="conflicting multipliers {0} and {1}".format(
+                        existing.multiplier, multiplier))
+            multiplier = multiplier or existing.multiplier
+            tick_size = tick_size or existing.tick_size
+            currency = currency or existing.currency
+            initial_margin_rate = \
+                initial_margin_rate or existing.initial_margin_rate
+            maintenance_margin_rate = \
+                maintenance_margin_rate or existing.maintenance_margin_rate
+
+        currency = currency or '$'
+        initial_margin_rate = initial_margin_rate or \
+            DEFAULT_INITIAL_MARGIN_RATE
+        maintenance_margin_rate = maintenance_margin_rate or \
+            DEFAULT_MAINTENANCE_MARGIN_RATE
+        if maintenance_margin_rate > initial_margin_rate:
+            raise InvalidContractSpec(
+                root=root, contract=None,
+                reason="maintenance margin {0} exceeds initial margin "
+                       "{1}".format(maintenance_margin_rate,
+                                    initial_margin_rate))
+
+        self.specs[root] = ContractSpec(root, multiplier, tick_size, currency,
+                                        initial_margin_rate,
+                                        maintenance_margin_rate)
+
+        for contract, dates in (contracts or {}).iteritems():
+            first_notice = parse_date(dates.get('first_notice'),
+                                      'first_notice', root, contract)
+            expiration = parse_date(dates.get('expiration'),
+                                    'expiration', root, contract)
+            if first_notice is not None and expiration is not None \
+                    and first_notice > expiration:
+                raise InvalidContractSpec(
+                    root=root, contract=contract,
+                    reason="first notice {0} is after expiration {1}".format(
+                        first_notice.date(), expiration.date()))
+            self.dates[(root, contract)] = (first_notice, expiration)
+
+    @staticmethod
+    def _positive(root, field, value):
+        if value is None or value == '':
+            return None
+        try:
+            value = float(value)
+        except (ValueError, TypeError):
+            raise InvalidContractSpec(
+                root=root, contract=None,
+                reason="{0} is not a number: {1!r}".format(field, value))
+        if value <= 0:
+            raise InvalidContractSpec(
+                root=root, contract=None,
+                reason="{0} must be positive, got {1}".format(field, value))
+        return value
+
+    def spec(self, sid):
+        root = sid[0] if type(sid) is tuple else sid
+        spec = self.specs.get(root)
+        if spec is not None and spec.multiplier is not None:
+            return spec
+
+        try:
+            return self._fallbacks[sid]
+        except KeyError:
+            pass
+
+        multiplier = float(self.fallback_multiplier(sid))
+        if spec is None:
+            spec = ContractSpec(root, multiplier, None, '$',
+                                DEFAULT_INITIAL_MARGIN_RATE,
+                                DEFAULT_MAINTENANCE_MARGIN_RATE)
+        else:
+            spec = spec._replace(multiplier=multiplier)
+        self._fallbacks[sid] = spec
+        return spec
+
+    def multiplier(self, sid):
+        return self.spec(sid).multiplier
+
+    def tick_size(self, sid):
+        return self.spec(sid).tick_size
+
+    def currency(self, sid):
+        return self.spec(sid).currency
+
+    def _dates(self, sid):
+        return self.dates.get(sid, (None, None))
+
+    def first_notice(self, sid):
+        """
+        Midnight of the first notice day of the (root, contract) @sid, or
+        None if it isn't listed.
+        """
+        return self._dates(sid)[0]
+
+    def expiration(self, sid):
+        return self._dates(sid)[1]
+
+
+_contract_specs = None
+
+
+def get_contract_specs():
+    """
+    The default registry, read from the first of CONTRACT_SPEC_FILES found
+    in the data directory. When there is no specs file, every contract
+    falls back to get_multiplier.
+    """
+    global _contract_specs
+    if _contract_specs is None:
+        _contract_specs = ContractSpecs()
+        for name in CONTRACT_SPEC_FILES:
+            path = os.path.join(DATA_PATH, name)
+            if os.path.exists(path):
+                _contract_specs = ContractSpecs.load(path)
+                log.info("Loaded {0} contract specs from {1}".format(
+                    len(_contract_specs), path))
+                break
+    return _contract_specs
+
+
+def set_contract_specs(specs):
+    """
+    Replace the default registry, e.g. with ContractSpecs.load(path).
+    """
+    global _contract_specs
+    _contract_specs = specs
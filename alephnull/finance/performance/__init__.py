@@ -15,6 +15,7 @@
 
 from . tracker import PerformanceTracker, FuturesPerformanceTracker
 from . period import PerformancePeriod
+from . futures_period import FuturesPerformancePeriod
 from . position import Position
 
 __all__ = [
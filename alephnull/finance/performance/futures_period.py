@@ -4,18 +4,12 @@ from collections import OrderedDict, defaultdict
 
 import logbook
 import numpy as np
-import pandas as pd
 
 import alephnull.protocol as zp
+from alephnull.finance.contracts import get_contract_specs
 from .position import positiondict
 
 
-try:
-    from alephtools.connection import get_multiplier
-except:
-    #Replace this with source to multiplier
-    get_multiplier = lambda x: 25
-
 log = logbook.Logger('Performance')
 
 
@@ -47,9 +41,13 @@ class FuturesPerformancePeriod(object):
         self.keep_transactions = keep_transactions
         self.keep_orders = keep_orders
 
-        # Arrays for quick calculations of positions value
-        self._position_amounts = pd.Series()
-        self._position_last_sale_prices = pd.Series()
+        # Arrays for quick calculations of positions value, one slot per
+        # position in the order positions are first seen.
+        self.contract_specs = get_contract_specs()
+        self._position_slots = {}
+        self._position_amounts = np.zeros(0)
+        self._position_last_sale_prices = np.zeros(0)
+        self._position_multipliers = np.zeros(0)
 
         self.calculate_performance()
 
@@ -76,13 +74,24 @@ class FuturesPerformancePeriod(object):
 
     def ensure_position_index(self, sid):
         try:
-            _ = self._position_amounts[sid]
-            _ = self._position_last_sale_prices[sid]
-        except (KeyError, IndexError):
-            self._position_amounts = \
-                self._position_amounts.append(pd.Series({sid: 0.0}))
-            self._position_last_sale_prices = \
-                self._position_last_sale_prices.append(pd.Series({sid: 0.0}))
+            return self._position_slots[sid]
+        except KeyError:
+            slot = len(self._position_slots)
+            if slot == len(self._position_amounts):
+                # grow the slot arrays geometrically
+                size = max(8, 2 * slot)
+                self._position_amounts = np.resize(self._position_amounts,
+                                                   size)
+                self._position_last_sale_prices = np.resize(
+                    self._position_last_sale_prices, size)
+                self._position_multipliers = np.resize(
+                    self._position_multipliers, size)
+            self._position_amounts[slot] = 0.0
+            self._position_last_sale_prices[slot] = 0.0
+            self._position_multipliers[slot] = \
+                self.contract_specs.multiplier(sid)
+            self._position_slots[sid] = slot
+            return slot
 
     def add_dividend(self, div):
         pass
@@ -122,6 +131,7 @@ class FuturesPerformancePeriod(object):
         if commission.sid in self.positions:
             self.positions[commission.sid]. \
                 adjust_commission_cost_basis(commission)
+            self.positions.touch(commission.sid)
 
     def adjust_cash(self, amount):
         # * #
@@ -157,6 +167,30 @@ class FuturesPerformancePeriod(object):
                 del self.orders_by_id[order.id]
             self.orders_by_id[order.id] = order
 
+    def update_positions(self, positions):
+        """
+        Set every position in @positions, a dict of sid => object with
+        amount, last_sale_price and cost_basis, e.g. the positions of a
+        Portfolio reconciled with a broker.
+        """
+        sids = list(positions)
+        slots = np.array([self.ensure_position_index(sid) for sid in sids],
+                         dtype=int)
+        amounts = np.zeros(len(sids))
+        prices = np.zeros(len(sids))
+        for i, sid in enumerate(sids):
+            source = positions[sid]
+            pos = self.positions[sid]
+            self.positions.touch(sid)
+            if hasattr(source, 'contract'):
+                pos.contract = source.contract
+            pos.amount = amounts[i] = source.amount
+            pos.last_sale_price = prices[i] = source.last_sale_price
+            pos.cost_basis = source.cost_basis
+
+        self._position_amounts[slots] = amounts
+        self._position_last_sale_prices[slots] = prices
+
     def execute_transaction(self, txn):
         # Update Position
         # ----------------
@@ -168,8 +202,9 @@ class FuturesPerformancePeriod(object):
         position = self.positions[sid]
 
         position.update(txn)
-        self.ensure_position_index(sid)
-        self._position_amounts[sid] = position.amount
+        self.positions.touch(sid)
+        slot = self.ensure_position_index(sid)
+        self._position_amounts[slot] = position.amount
 
         # Max Leverage
         # ---------------
@@ -181,7 +216,8 @@ class FuturesPerformancePeriod(object):
         # now we update ending_mav and ending_total_value such that the performance tracker doesn't think we
         # profited when in fact we just entered another position.
         # how? just put a negative balance into cash_adjustment equal to the value of the position entered
-        self.cash_adjustment -= txn.price * txn.amount * get_multiplier(sid)
+        self.cash_adjustment -= \
+            txn.price * txn.amount * self._position_multipliers[slot]
 
         if math.fabs(self.cumulative_capital_used) > self.max_capital_used:
             self.max_capital_used = math.fabs(self.cumulative_capital_used)
@@ -206,11 +242,10 @@ class FuturesPerformancePeriod(object):
         return int(base * round(float(x) / base))
 
     def calculate_positions_value(self):
-        multipliers = [get_multiplier(symbol) for symbol in self._position_amounts.keys()]
-        result = 0
-        for amount, price, multiplier in zip(self._position_amounts, self._position_last_sale_prices, multipliers):
-            result += amount * price * multiplier
-        return result
+        n = len(self._position_slots)
+        return np.dot(
+            self._position_amounts[:n] * self._position_multipliers[:n],
+            self._position_last_sale_prices[:n])
 
     def update_last_sale(self, event):
         if 'contract' in event:
@@ -224,8 +259,9 @@ class FuturesPerformancePeriod(object):
 
         if sid in self.positions and is_trade and has_price:
             self.positions[sid].last_sale_price = event.price
-            self.ensure_position_index(sid)
-            self._position_last_sale_prices[sid] = event.price
+            self.positions.touch(sid)
+            slot = self.ensure_position_index(sid)
+            self._position_last_sale_prices[slot] = event.price
             self.positions[sid].last_sale_date = event.dt
 
     def __core_dict(self):
@@ -258,7 +294,9 @@ class FuturesPerformancePeriod(object):
         """
         rval = self.__core_dict()
 
-        if self.serialize_positions:
+        if self.serialize_positions == 'compact':
+            rval['positions'] = self.positions.as_arrays()
+        elif self.serialize_positions:
             positions = self.get_positions_list()
             rval['positions'] = positions
 
@@ -313,25 +351,7 @@ class FuturesPerformancePeriod(object):
         return portfolio
 
     def get_positions(self):
-        positions = self._positions_store
-
-        for sid, pos in self.positions.iteritems():
-
-            if sid not in positions:
-                if type(sid) is tuple:
-                    positions[sid] = zp.Position(sid[0], contract=sid[1])
-                else:
-                    positions[sid] = zp.Position(sid)
-            position = positions[sid]
-            position.amount = pos.amount
-            position.cost_basis = pos.cost_basis
-            position.last_sale_price = pos.last_sale_price
-
-        return positions
+        return self.positions.update_store(self._positions_store)
 
     def get_positions_list(self):
-        positions = []
-        for sid, pos in self.positions.iteritems():
-            if pos.amount != 0:
-                positions.append(pos.to_dict())
-        return positions
\ No newline at end of file
+        return self.positions.serialized()
@@ -0,0 +1,233 @@
+#
+# Copyright 2013 Quantopian, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+
+Margin
+======
+
+Initial and maintenance margin of a futures portfolio, kept up to date as
+prices move and fills arrive.
+
+Each position owns a slot in a set of numpy arrays holding its amount,
+last price, multiplier, margin rates and its current contribution to the
+portfolio's margin. A price or fill touches only the slot of its position,
+and the portfolio totals are adjusted by the change in that slot's
+contribution, so an update costs the same however many positions are open.
+
+    +-----------------+----------------------------------------------------+
+    | key             | value                                              |
+    +=================+====================================================+
+    | equity          | The account value: capital base plus profit and    |
+    |                 | loss on all fills, less commissions.               |
+    +-----------------+----------------------------------------------------+
+    | initial_margin  | Sum over positions of abs(amount) * price *        |
+    |                 | multiplier * initial_margin_rate.                  |
+    +-----------------+----------------------------------------------------+
+    | maintenance     | Sum over positions of abs(amount) * price *        |
+    | _margin         | multiplier * maintenance_margin_rate.              |
+    +-----------------+----------------------------------------------------+
+
+The portfolio is in a margin call while its equity is below its
+maintenance margin.
+
+"""
+
+from __future__ import division
+
+import logbook
+import numpy as np
+import pandas as pd
+
+from alephnull.finance.contracts import get_contract_specs
+
+log = logbook.Logger('Margin')
+
+HISTORY_FIELDS = ['equity', 'initial_margin', 'maintenance_margin']
+
+
+class MarginEngine(object):
+    """
+    Incremental margin accounting for a futures portfolio.
+
+    Handlers registered with register_margin_call are called with the
+    engine and the dt of the update, at most once per dt, whenever an
+    update leaves the equity below the maintenance margin.
+    """
+
+    def __init__(self, capital_base, contract_specs=None):
+        if contract_specs is None:
+            contract_specs = get_contract_specs()
+        self.contract_specs = contract_specs
+
+        self.equity = float(capital_base)
+        self.initial_margin = 0.0
+        self.maintenance_margin = 0.0
+
+        self.margin_call_handlers = []
+        self.last_call_dt = None
+
+        # sid => index into the slot arrays
+        self._slots = {}
+        self._amounts = np.zeros(0)
+        self._prices = np.zeros(0)
+        self._multipliers = np.zeros(0)
+        self._initial_rates = np.zeros(0)
+        self._maintenance_rates = np.zeros(0)
+        self._initial = np.zeros(0)
+        self._maintenance = np.zeros(0)
+
+        # one row per dt, overwritten while the dt stays the same
+        self._history_dts = np.zeros(0, dtype=np.int64)
+        self._history = np.zeros((0, len(HISTORY_FIELDS)))
+        self._history_len = 0
+
+    def __repr__(self):
+        return "{0}(equity={1}, initial_margin={2}, " \
+               "maintenance_margin={3})".format(self.__class__.__name__,
+                                                self.equity,
+                                                self.initial_margin,
+                                                self.maintenance_margin)
+
+    def register_margin_call(self, handler):
+        self.margin_call_handlers.append(handler)
+
+    @property
+    def excess_equity(self):
+        """
+        Equity above the initial margin, i.e. what new positions may use.
+        """
+        return self.equity - self.initial_margin
+
+    @property
+    def in_margin_call(self):
+        return self.equity < self.maintenance_margin
+
+    def slot(self, sid):
+        try:
+            return self._slots[sid]
+        except KeyError:
+            pass
+
+        index = len(self._slots)
+        if index == len(self._amounts):
+            size = max(2 * index, 16)
+            for name in ('_amounts', '_prices', '_multipliers',
+                         '_initial_rates', '_maintenance_rates',
+                         '_initial', '_maintenance'):
+                grown = np.zeros(size)
+                grown[:index] = getattr(self, name)[:index]
+                setattr(self, name, grown)
+
+        spec = self.contract_specs.spec(sid)
+        self._multipliers[index] = spec.multiplier
+        self._initial_rates[index] = spec.initial_margin_rate
+        self._maintenance_rates[index] = spec.maintenance_margin_rate
+        self._slots[sid] = index
+        return index
+
+    def _remargin(self, index):
+        notional = abs(self._amounts[index]) * self._prices[index] * \
+            self._multipliers[index]
+        initial = notional * self._initial_rates[index]
+        maintenance = notional * self._maintenance_rates[index]
+
+        self.initial_margin += initial - self._initial[index]
+        self.maintenance_margin += maintenance - self._maintenance[index]
+        self._initial[index] = initial
+        self._maintenance[index] = maintenance
+
+    def update_price(self, sid, price):
+        """
+        Mark the position in @sid to @price. Prices of sids without a
+        position, and missing prices, are ignored.
+        """
+        try:
+            index = self._slots[sid]
+        except KeyError:
+            return
+        if np.isnan(price):
+            return
+
+        amount = self._amounts[index]
+        if amount != 0:
+            self.equity += amount * self._multipliers[index] * \
+                (price - self._prices[index])
+        self._prices[index] = price
+        self._remargin(index)
+
+    def update_amount(self, sid, amount, price):
+        """
+        Apply a fill of @amount contracts of @sid at @price.
+        """
+        index = self.slot(sid)
+        if self._amounts[index] != 0:
+            self.equity += self._amounts[index] * self._multipliers[index] * \
+                (price - self._prices[index])
+        self._amounts[index] += amount
+        self._prices[index] = price
+        self._remargin(index)
+
+    def adjust_equity(self, amount):
+        self.equity += amount
+
+    def check(self, dt):
+        """
+        Record the margin as of @dt, and call the margin call handlers if
+        the equity has fallen below the maintenance margin.
+        """
+        self.record(dt)
+
+        if self.in_margin_call and self.last_call_dt != dt:
+            self.last_call_dt = dt
+            log.info("Margin call at {0}: equity {1} below maintenance "
+                     "margin {2}".format(dt, self.equity,
+                                         self.maintenance_margin))
+            for handler in self.margin_call_handlers:
+                handler(self, dt)
+
+    def record(self, dt):
+        dt_value = pd.Timestamp(dt).value
+        n = self._history_len
+        if n == 0 or self._history_dts[n - 1] != dt_value:
+            if n == len(self._history_dts):
+                size = max(2 * n, 256)
+                self._history_dts = np.resize(self._history_dts, size)
+                self._history = np.resize(self._history,
+                                          (size, len(HISTORY_FIELDS)))
+            n += 1
+            self._history_len = n
+            self._history_dts[n - 1] = dt_value
+
+        self._history[n - 1] = (self.equity,
+                                self.initial_margin,
+                                self.maintenance_margin)
+
+    @property
+    def history(self):
+        """
+        DataFrame of the equity and margins, one row per recorded dt.
+        """
+        n = self._history_len
+        index = pd.DatetimeIndex(self._history_dts[:n], tz='UTC')
+        return pd.DataFrame(self._history[:n].copy(), index=index,
+                            columns=HISTORY_FIELDS)
+
+    def position_margins(self):
+        """
+        The maintenance margin of each position, keyed by sid.
+        """
+        return dict((sid, self._maintenance[index])
+                    for sid, index in self._slots.iteritems())
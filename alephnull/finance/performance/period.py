@@ -43,7 +43,9 @@ omitted).
     +---------------+------------------------------------------------------+
     | positions     | a list of dicts representing positions, see          |
     |               | :py:meth:`Position.to_dict()`                        |
-    |               | for details on the contents of the dict              |
+    |               | for details on the contents of the dict. With        |
+    |               | serialize_positions='compact', a dict of parallel    |
+    |               | sid, amount, cost_basis and last_sale_price arrays.  |
     +---------------+------------------------------------------------------+
     | pnl           | Dollar value profit and loss, for both realized and  |
     |               | unrealized gains.                                    |
@@ -160,6 +162,7 @@ class PerformancePeriod(object):
             # Make the position object handle the split. It returns the
             # leftover cash from a fractional share, if there is any.
             leftover_cash = self.positions[split.sid].handle_split(split)
+            self.positions.touch(split.sid)
 
             if leftover_cash > 0:
                 self.handle_cash_payment(leftover_cash)
@@ -196,6 +199,7 @@ class PerformancePeriod(object):
         if commission.sid in self.positions:
             self.positions[commission.sid].\
                 adjust_commission_cost_basis(commission)
+            self.positions.touch(commission.sid)
 
     def adjust_cash(self, amount):
         self.period_cash_flow += amount
@@ -231,6 +235,7 @@ class PerformancePeriod(object):
                         last_sale_date=None, cost_basis=None):
         pos = self.positions[sid]
         self.ensure_position_index(sid)
+        self.positions.touch(sid)
 
         if contract is not None:
             pos.contract = contract
@@ -245,6 +250,35 @@ class PerformancePeriod(object):
         if cost_basis is not None:
             pos.cost_basis = cost_basis
 
+    def update_positions(self, positions):
+        """
+        update_position for every position in @positions, a dict of sid =>
+        object with amount, last_sale_price and cost_basis, e.g. the
+        positions of a Portfolio reconciled with a broker. The value
+        arrays are rebuilt once, from a frame of all the sids.
+        """
+        sids = list(positions)
+        values = np.empty((len(sids), 2))
+        for i, sid in enumerate(sids):
+            source = positions[sid]
+            pos = self.positions[sid]
+            self.positions.touch(sid)
+            if hasattr(source, 'contract'):
+                pos.contract = source.contract
+            pos.amount = source.amount
+            pos.last_sale_price = source.last_sale_price
+            pos.cost_basis = source.cost_basis
+            values[i] = pos.amount, pos.last_sale_price
+
+        update = pd.DataFrame(values, index=sids,
+                              columns=['amount', 'last_sale_price'])
+        current = pd.DataFrame({'amount': self._position_amounts,
+                                'last_sale_price':
+                                self._position_last_sale_prices})
+        current = current[~current.index.isin(update.index)].append(update)
+        self._position_amounts = current['amount']
+        self._position_last_sale_prices = current['last_sale_price']
+
     def execute_transaction(self, txn):
         # Update Position
         # ----------------
@@ -256,6 +290,7 @@ class PerformancePeriod(object):
         position = self.positions[sid]
 
         position.update(txn)
+        self.positions.touch(sid)
         self.ensure_position_index(sid)
         self._position_amounts[sid] = position.amount
 
@@ -305,6 +340,7 @@ class PerformancePeriod(object):
 
         if is_contract_tracked and is_trade and has_price:
             self.positions[sid].last_sale_price = event.price
+            self.positions.touch(sid)
             self.ensure_position_index(sid)
             self._position_last_sale_prices[sid] = event.price
             self.positions[sid].last_sale_date = event.dt
@@ -340,7 +376,9 @@ class PerformancePeriod(object):
         """
         rval = self.__core_dict()
 
-        if self.serialize_positions:
+        if self.serialize_positions == 'compact':
+            rval['positions'] = self.positions.as_arrays()
+        elif self.serialize_positions:
             positions = self.get_positions_list()
             rval['positions'] = positions
 
@@ -395,260 +433,7 @@ class PerformancePeriod(object):
         return portfolio
 
     def get_positions(self):
-        positions = self._positions_store
-
-        for sid, pos in self.positions.iteritems():
-
-            if sid not in positions:
-                if type(sid) is tuple:
-                    positions[sid] = zp.Position(sid[0], contract=sid[1])
-                else:
-                    positions[sid] = zp.Position(sid)
-            position = positions[sid]
-            position.amount = pos.amount
-            position.cost_basis = pos.cost_basis
-            position.last_sale_price = pos.last_sale_price
-
-        return positions
+        return self.positions.update_store(self._positions_store)
 
     def get_positions_list(self):
-        positions = []
-        for sid, pos in self.positions.iteritems():
-            if pos.amount != 0:
-                positions.append(pos.to_dict())
-        return positions
-
-
-"""class FuturesPerformancePeriod(object):
-    "We need to replicate:
-    * calculate_performance
-    * execute_transaction
-    * record_order
-    * update_last_sale
-    "
-    def __init__(
-            self,
-            starting_cash,
-            period_open=None,
-            period_close=None,
-            keep_transactions=True,
-            keep_orders=False,
-            serialize_positions=True):
-        self.backing_period = PerformancePeriod(starting_cash, period_open, period_close, keep_transactions,
-                                                keep_orders, serialize_positions)
-
-        self.margin_account_value = starting_cash
-        self.owned_positions = {}  # will have a format like {("GS", "N10"): {amount: 100, last_price: 0.25}
-        self.margin_history = {}  # format like {Timestamp(...): 400.30}
-
-        self.contract_multiplier = 100
-        self.maintenance_margin_rate = 0.20
-        self.initial_margin_rate = 0.30
-
-        self.contract_details = {}  # set externally if at all
-        self.margin_data = {}  # set externally if at all
-        self.margin_call = self.scale_back_positions  # can be set to another function externally
-        self.gameover = False
-
-        self.algo = None
-
-    def get_initial_margin(self, sid, timestamp, contract_value):
-        return self.get_margin("initial", sid, timestamp, contract_value)
-
-    def get_maintenance_margin(self, sid, timestamp, contract_value):
-        return self.get_margin("maintenance", sid, timestamp, contract_value)
-
-    def get_margin(self, margin_type, sid, timestamp, contract_value):
-        # provides initial margin for a sid, basing it on the latest_price if there is no data available.
-        multiplier = {"initial": 0.25, "maintenance": 0.2}[margin_type]
-
-        # the structure of self.margin_data is like so:
-        # self.margin_data["initial"]["GS"]["N14"][Timestamp] == 300.03
-        # where the final dict in the nesting is a TimeSeries
-        if (margin_type in self.margin_data and
-                sid[0] in self.margin_data[margin_type] and
-                sid[1] in self.margin_data[margin_type][sid[0]]):
-            series = self.margin_data[margin_type][sid[0]][sid[1]]
-            previous_data = series[:timestamp]
-            if previous_data:
-                return previous_data[-1]
-        return contract_value * multiplier
-
-
-    def unit_multiplier(self, currency):
-        "Returns a number C such that given_price / C = value of item in dollars.
-        Another way of figuring is that 1 USD = C other currencies
-        Exchange rates are estimated based on the time this is programmed and are thus in no way accurate.
-        We're not really dealing with currencies so I don't much mind.
-        The ones that matter are mainly dollars and cents (C's of 1 and 100 of course)
-
-        Defaults to 1 if we don't know what to do."
-
-        return {'$': 1,
-                '$/GAL': 1,
-                '$/GRAM': 1,
-                '$/MBTU': 1,
-                '$/MWH': 1,
-                '$/TON': 1,
-                'AU$': 1.12,
-                'CD$': 1.07,
-                'CHF': 0.91,
-                'CZK': 20.18,
-                'HUF': 220.32,
-                'NOK': 6.17,
-                'NZD': 1.21,
-                'SEK': 6.51,
-                'TRY': 2.17,
-                u'\xa3': 0.61,  # Pound
-                u'\xa5': 104.49,  # Yen
-                u'\xf3': 100,  # Cents
-                u'\u20ac': 0.73, # Euro
-                }.get(currency, 1)
-
-    def dollars_from_currency(self, price, unit):
-        return price / self.unit_multiplier(unit)
-
-    def get_multiplier(self, sid):
-        # multiplier = contract_size * quoted_unit / $
-        # i.e. what do I multiply price by to get the value of a single contract
-
-        fallback = 1000
-
-        contract_size = self.contract_details.get(sid[0], {}).get('contract_size', str(fallback) + " UNITS")
-        quoted_unit = self.contract_details.get(sid[0], {}).get('quoted_unit', "$")
-
-        def matches(pattern, text):
-            result = re.match(pattern, text)
-            if result is not None:
-                return result.group() == text
-            else:
-                return False
-
-        # case 1: some number with units like "1,000 TONS" or "42,000 GAL" and a quoted unit that is simply "$"
-        # what "$" means is "$/UNIT", whether UNIT be GAL or LITERS or whatever.
-
-        straight_currencies = {'$', 'AU$', 'CD$', 'CHF', 'CZK', 'HUF', 'NOK', 'NZD', 'SEK', 'TRY',
-                                   u'\xa3',    # Pound
-                                   u'\xa5',    # Yen
-                                   u'\xf3',    # Cents
-                                   u'\u20ac',  # Euro
-                              }
-
-        is_standard_quoted_unit = quoted_unit in straight_currencies or matches("\$\/.+", quoted_unit)
-        is_standard_contract_size = matches("[0-9,\\.]+ [A-Za-z\\. \$]+", contract_size)
-
-        is_standard_pointwise_contract_size = matches("\$?[\\.0-9,]+[ ]+(X[ ]+INDEX|TIMES INDEX VALUE)", contract_size)
-
-        if quoted_unit == 'PTS.' and is_standard_pointwise_contract_size:
-            result = ""
-            # remove currency
-            for n, ch in enumerate(contract_size):
-                if ch in '0123456789':
-                    result = contract_size[n:]
-                    break
-            result = result.replace(" ", "").replace("XINDEX", "").replace("TIMESINDEXVALUE", "")
-            return result
-        elif is_standard_quoted_unit and is_standard_contract_size:
-            chunks = [x for x in contract_size.split(" ") if x]
-            quantity = self.dollars_from_currency(
-                float(chunks[0].replace(",", "")),
-                quoted_unit)
-            return quantity
-        else:
-            return fallback
-
-    def get_first_notice(self, sid):
-        # returns a Timestamp representing midnight at the day of first delivery
-        expiration = self.contract_details.get(sid[0], {}).get('contracts', {}).get(sid[1], {}).get('expiration_date')
-        if expiration is not None:
-            return Timestamp(expiration, tz='UTC') - timedelta(days=5)
-        else:
-            delivery_months = "FGHJKMNQUVXZ"
-            contract_delivery_month = delivery_months.find(sid[1][0]) + 1
-            contract_delivery_year = int("20" + str(sid[1][1:]))
-            return Timestamp(contract_delivery_year + "-" + contract_delivery_month + "-01") - timedelta(days=3)
-
-
-    def record_order(self, order):
-        # self.owned_positions[order.sid] = order.amount
-
-        self.backing_period.record_order(order)
-
-    def execute_transaction(self, txn):
-        if self.gameover:
-            self.margin_history[txn.dt] = self.margin_account_value
-            return
-
-        margin_for_new_txn = self.get_initial_margin(txn.sid, txn.dt,
-            txn.price * self.get_multiplier(txn.sid)) * txn.amount
-
-        if txn.sid in self.owned_positions:
-            self.recalculate_margin_from_price_change(txn.sid, txn.price - txn.commission)
-
-            if margin_for_new_txn <= self.margin_account_value - self.calculate_maintenance_margin(txn.dt):
-                self.owned_positions[txn.sid]['amount'] += txn.amount
-                self.margin_account_value -= txn.commission * txn.amount
-        else:  # buying the first units of a contract
-            if margin_for_new_txn <= self.margin_account_value - self.calculate_maintenance_margin(txn.dt):
-                self.owned_positions[txn.sid] = {'amount': txn.amount, 'last_price': txn.price}
-
-    def calculate_maintenance_margin(self, timestamp):
-        "Uses the owned_positions dictionary to calculate the minimum a margin account must meet in order for
-        new transactions to take place."
-
-        maintenance_margin = 0
-        for sid, position in self.owned_positions.iteritems():
-            maintenance_margin += self.get_maintenance_margin(sid, timestamp,
-                self.get_multiplier(sid) * position['last_price']) * position['amount']
-        return maintenance_margin
-
-    def update_last_sale(self, event):
-        if self.gameover:
-            self.margin_history[event.dt] = self.margin_account_value
-            return
-
-        if event.sid in self.owned_positions:
-            self.recalculate_margin_from_price_change(event.sid, event.price)
-            if self.calculate_maintenance_margin(event.dt) > self.margin_account_value:
-                self.margin_call(event.dt)
-
-        self.margin_history[event.dt] = self.margin_account_value
-
-    def recalculate_margin_from_price_change(self, sid, new_price):
-        "Adjusts the margin account value to compensate with a change in price of an already-owned contract"
-        last_price = self.owned_positions[sid]['last_price']
-        amount = self.owned_positions[sid]['amount']
-
-        delta = self.get_multiplier(sid) * (new_price - last_price) * amount
-        self.margin_account_value += delta
-        self.owned_positions[sid]['last_price'] = new_price
-
-        # margin call logic
-        if self.margin_account_value <= 0:
-            self.gameover = True
-
-    def scale_back_positions(self, timestamp):
-        # A default option for margin calls where it goes through positions alphabetically exits those positions until
-        # the maintenance margin is below the margin account value
-
-        # we know that
-        #  self.calculate_maintenance_margin() > self.margin_account_value
-
-        positions = list(reversed(sorted(self.owned_positions.items())))
-        while self.calculate_maintenance_margin(timestamp) > self.margin_account_value:
-            shortfall = self.calculate_maintenance_margin(timestamp) - self.margin_account_value
-            position = positions.pop()
-            sid = position[0]
-            details = position[1]
-
-            contract_value = self.get_multiplier(sid) * details['last_price']
-            margin_per_contract = self.get_maintenance_margin(sid, timestamp, contract_value)
-            contracts_to_exit_amount = int(shortfall / margin_per_contract) + 1
-            if contracts_to_exit_amount >= details['amount']:
-                del self.owned_positions[sid]
-            else:
-                self.owned_positions[sid] -= contracts_to_exit_amount
-
-
-    def __getattr__(self, name):
-        return getattr(self.backing_period, name)"""
\ No newline at end of file
+        return self.positions.serialized()
@@ -37,6 +37,9 @@ from __future__ import division
 import math
 
 import logbook
+import numpy as np
+
+import alephnull.protocol as zp
 
 
 log = logbook.Logger('Performance')
@@ -209,6 +212,20 @@ last_sale_price: {last_sale_price}"
 
 
 class positiondict(dict):
+    """
+    sid => Position, which keeps the serialized form of its positions and
+    refreshes only the positions touched since it was last asked for.
+
+    Code that changes a position must call touch(sid).
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(positiondict, self).__init__(*args, **kwargs)
+        # sid => to_dict() of each open position
+        self._dicts = {}
+        # sids changed since the last serialized / update_store call
+        self._dirty_dicts = set(self)
+        self._dirty_store = set(self)
 
     def __missing__(self, key):
         if type(key) is tuple:
@@ -216,4 +233,62 @@ class positiondict(dict):
         else:
             pos = Position(key)
         self[key] = pos
+        self.touch(key)
         return pos
+
+    def touch(self, sid):
+        self._dirty_dicts.add(sid)
+        self._dirty_store.add(sid)
+
+    def serialized(self):
+        """
+        List of the to_dict() of the open positions.
+
+        The dicts are shared between calls, until their position changes,
+        and must not be modified.
+        """
+        for sid in self._dirty_dicts:
+            pos = self[sid]
+            if pos.amount != 0:
+                self._dicts[sid] = pos.to_dict()
+            else:
+                self._dicts.pop(sid, None)
+        self._dirty_dicts.clear()
+        return self._dicts.values()
+
+    def as_arrays(self):
+        """
+        The open positions as parallel sequences: a list of sids, and
+        arrays of amounts, cost bases and last sale prices.
+        """
+        dicts = self.serialized()
+        sids = [pos['sid'] if 'contract' not in pos
+                else (pos['sid'], pos['contract']) for pos in dicts]
+        return {
+            'sid': sids,
+            'amount': np.array([pos['amount'] for pos in dicts],
+                               dtype=float),
+            'cost_basis': np.array([pos['cost_basis'] for pos in dicts],
+                                   dtype=float),
+            'last_sale_price': np.array(
+                [pos['last_sale_price'] for pos in dicts], dtype=float),
+        }
+
+    def update_store(self, store):
+        """
+        Copy the positions changed since the last call into @store, a
+        zp.Positions.
+        """
+        for sid in self._dirty_store:
+            pos = self[sid]
+            if sid not in store:
+                if type(sid) is tuple:
+                    store[sid] = zp.Position(sid[0], contract=sid[1])
+                else:
+                    store[sid] = zp.Position(sid)
+            position = store[sid]
+            position.amount = pos.amount
+            position.cost_basis = pos.cost_basis
+            position.last_sale_price = pos.last_sale_price
+        self._dirty_store.clear()
+        return store
@@ -68,6 +68,7 @@ import alephnull.finance.risk as risk
 from alephnull.finance import trading
 from . period import PerformancePeriod
 from . futures_period import FuturesPerformancePeriod
+from . margin import MarginEngine
 
 log = logbook.Logger('Performance')
 
@@ -77,7 +78,8 @@ class BasePerformanceTracker(object):
     Tracks the performance of the algorithm.
     """
 
-    def __init__(self, sim_params, perf_tracker_class):
+    def __init__(self, sim_params, perf_tracker_class,
+                 serialize_positions=True):
 
         self.sim_params = sim_params
         self.perf_tracker_class = perf_tracker_class
@@ -108,9 +110,10 @@ class BasePerformanceTracker(object):
                 risk.RiskMetricsCumulative(self.sim_params)
 
         elif self.emission_rate == 'minute':
-            self.all_benchmark_returns = pd.Series(index=pd.date_range(
-                self.sim_params.first_open, self.sim_params.last_close,
-                freq='Min'))
+            # only market minutes are read, so only those are allocated
+            self.all_benchmark_returns = pd.Series(
+                index=trading.environment.market_minutes_for_days(
+                    self.trading_days))
             self.intraday_risk_metrics = \
                 risk.RiskMetricsCumulative(self.sim_params)
 
@@ -161,7 +164,8 @@ class BasePerformanceTracker(object):
             self.market_close,
             keep_transactions=True,
             keep_orders=True,
-            serialize_positions=True
+            # True for a list of position dicts, 'compact' for arrays
+            serialize_positions=serialize_positions
         )
         self.perf_periods.append(self.todays_performance)
 
@@ -275,11 +279,20 @@ class BasePerformanceTracker(object):
                     microsecond=0)
             else:
                 midnight = event.dt
+                if self.emission_rate == 'minute' and \
+                        midnight not in self.all_benchmark_returns.index:
+                    # only market minutes have risk metrics, and
+                    # handle_minute_close skips the other minutes
+                    return
 
             self.all_benchmark_returns[midnight] = event.returns
 
     def handle_minute_close(self, dt):
         self.update_performance()
+        if dt not in self.all_benchmark_returns.index:
+            # outside of market minutes, e.g. an off hours benchmark, there
+            # is no risk to update
+            return
         todays_date = normalize_date(dt)
 
         minute_returns = self.minute_performance.returns
@@ -394,9 +407,42 @@ class BasePerformanceTracker(object):
         return risk_dict
 
 
-def PerformanceTracker(sim_params):
-    return BasePerformanceTracker(sim_params, PerformancePeriod)
+def PerformanceTracker(sim_params, serialize_positions=True):
+    return BasePerformanceTracker(sim_params, PerformancePeriod,
+                                  serialize_positions=serialize_positions)
+
+
+class FuturesPerformanceTracker(BasePerformanceTracker):
+    """
+    Tracks the performance of a futures algorithm, and its margin. See
+    :py:class:`alephnull.finance.performance.margin.MarginEngine`.
+    """
+
+    def __init__(self, sim_params, serialize_positions=True):
+        super(FuturesPerformanceTracker, self).__init__(
+            sim_params, FuturesPerformancePeriod,
+            serialize_positions=serialize_positions)
+        self.margin = MarginEngine(
+            self.capital_base,
+            contract_specs=self.cumulative_performance.contract_specs)
+
+    def process_event(self, event):
+        super(FuturesPerformanceTracker, self).process_event(event)
+
+        if event.type == zp.DATASOURCE_TYPE.TRADE:
+            self.margin.update_price(self.position_key(event), event.price)
+            self.margin.check(event.dt)
 
+        elif event.type == zp.DATASOURCE_TYPE.TRANSACTION:
+            self.margin.update_amount(self.position_key(event),
+                                      event.amount, event.price)
+            self.margin.check(event.dt)
+
+        elif event.type == zp.DATASOURCE_TYPE.COMMISSION:
+            self.margin.adjust_equity(-event.cost)
 
-def FuturesPerformanceTracker(sim_params):
-    return BasePerformanceTracker(sim_params, FuturesPerformancePeriod)
\ No newline at end of file
+    @staticmethod
+    def position_key(event):
+        if 'contract' in event.__dict__:
+            return (event.sid, event.contract)
+        return event.sid
\ No newline at end of file
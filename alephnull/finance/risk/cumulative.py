@@ -28,6 +28,7 @@ from . risk import (
     alpha,
     check_entry,
     choose_treasury,
+    DrawdownTracker,
 )
 
 log = logbook.Logger('Risk Cumulative')
@@ -134,14 +135,18 @@ class RiskMetricsCumulative(object):
 
     def __init__(self, sim_params,
                  returns_frequency=None,
-                 create_first_day_stats=False):
+                 create_first_day_stats=False,
+                 record_underwater=False):
         """
         - @returns_frequency allows for configuration of the whether
         the benchmark and algorithm returns are in units of minutes or days,
         if `None` defaults to the `emission_rate` in `sim_params`.
+        - @record_underwater keeps the drawdown of every update, as
+        `underwater`.
         """
 
         self.treasury_curves = trading.environment.treasury_curves
+        self.treasury_rates = trading.environment.treasury_rates
         self.start_date = sim_params.period_start.replace(
             hour=0, minute=0, second=0, microsecond=0
         )
@@ -199,23 +204,20 @@ class RiskMetricsCumulative(object):
                                     columns=self.METRIC_NAMES)
 
         self.max_drawdown = 0
-        self.current_max = -np.inf
+        # max_drawdown, its duration and the underwater curve all describe
+        # the drawdown of the cumulative log return from its running peak
+        self.drawdown = DrawdownTracker(record_underwater)
+        self._compounded_dt = None
+        self._compounded = np.nan
+        self._cumulative_log_return = 0.0
         self.daily_treasury = pd.Series(index=self.trading_days)
 
     def get_minute_index(self, sim_params):
         """
-        Stitches together multiple days worth of business minutes into
-        one continous index.
+        The business minutes of all the trading days, as one continuous
+        index.
         """
-        trading_minutes = None
-        for day in self.trading_days:
-            minutes_for_day = trading.environment.market_minutes_for_day(day)
-            if trading_minutes is None:
-                # Create container for all minutes on first iteration
-                trading_minutes = minutes_for_day
-            else:
-                trading_minutes = trading_minutes + minutes_for_day
-        return trading_minutes
+        return trading.environment.market_minutes_for_days(self.trading_days)
 
     def get_daily_index(self):
         return self.trading_days
@@ -263,7 +265,7 @@ class RiskMetricsCumulative(object):
 
         self.num_trading_days = len(self.algorithm_returns)
 
-        self.update_compounded_log_returns()
+        self.update_compounded_log_returns(algorithm_returns)
 
         self.algorithm_period_returns[dt] = \
             self.calculate_period_returns(self.algorithm_returns)
@@ -284,7 +286,6 @@ algorithm_returns ({algo_count}) in range {start} : {end} on {dt}"
             )
             raise Exception(message)
 
-        self.update_current_max()
         self.metrics.benchmark_volatility[dt] = \
             self.calculate_volatility(self.benchmark_returns)
         self.metrics.algorithm_volatility[dt] = \
@@ -297,7 +298,7 @@ algorithm_returns ({algo_count}) in range {start} : {end} on {dt}"
         treasury_end = dt.replace(hour=0, minute=0)
         if np.isnan(self.daily_treasury[treasury_end]):
             treasury_period_return = choose_treasury(
-                self.treasury_curves,
+                self.treasury_rates,
                 self.start_date,
                 treasury_end
             )
@@ -391,45 +392,62 @@ algorithm_returns ({algo_count}) in range {start} : {end} on {dt}"
 
         return '\n'.join(statements)
 
-    def update_compounded_log_returns(self):
+    def update_compounded_log_returns(self, latest_return=None):
         if len(self.algorithm_returns) == 0:
             return
 
+        if latest_return is None or np.isnan(latest_return):
+            latest_return = self.algorithm_returns[
+                self.algorithm_returns.last_valid_index()]
+
         try:
-            compound = math.log(1 + self.algorithm_returns[
-                self.algorithm_returns.last_valid_index()])
+            compound = math.log(1 + latest_return)
+            self._cumulative_log_return += compound
         except ValueError:
             compound = 0.0
             # BUG? Shouldn't this be set to log(1.0 + 0) ?
+            # as in compounded_log_returns, a total loss restarts the sum
+            self._cumulative_log_return = 0.0
 
-        if np.isnan(self.compounded_log_returns[self.latest_dt]):
-            self.compounded_log_returns[self.latest_dt] = compound
+        if self._compounded_dt != self.latest_dt:
+            self._compounded_dt = self.latest_dt
+            self._compounded = compound
         else:
-            self.compounded_log_returns[self.latest_dt] = \
-                self.compounded_log_returns[self.latest_dt] + compound
+            self._compounded += compound
+
+        self.compounded_log_returns[self.latest_dt] = self._compounded
 
     def calculate_period_returns(self, returns):
         return (1. + returns).prod() - 1
 
-    def update_current_max(self):
-        if len(self.compounded_log_returns) == 0:
-            return
-        if self.current_max < self.compounded_log_returns[self.latest_dt]:
-            self.current_max = self.compounded_log_returns[self.latest_dt]
+    @property
+    def current_max(self):
+        return self.drawdown.peak
 
-    def calculate_max_drawdown(self):
-        if len(self.compounded_log_returns) == 0:
-            return self.max_drawdown
+    @property
+    def max_drawdown_duration(self):
+        """
+        The most consecutive updates the cumulative return spent below its
+        running peak.
+        """
+        return self.drawdown.max_duration
 
-        cur_drawdown = 1.0 - math.exp(
-            self.compounded_log_returns[self.latest_dt] -
-            self.current_max)
+    @property
+    def underwater(self):
+        """
+        The drawdown of the cumulative return from its running peak as of
+        each update, or None unless created with record_underwater.
+        """
+        if self.drawdown.underwater is None:
+            return None
+        return np.array(self.drawdown.underwater)
 
-        if self.max_drawdown < cur_drawdown:
-            return cur_drawdown
-        else:
+    def calculate_max_drawdown(self):
+        if self._compounded_dt is None:
             return self.max_drawdown
 
+        return self.drawdown.update(self._cumulative_log_return)
+
     def calculate_sharpe(self):
         """
         http://en.wikipedia.org/wiki/Sharpe_ratio
@@ -29,6 +29,7 @@ from . risk import (
     alpha,
     check_entry,
     information_ratio,
+    max_drawdown,
     sharpe_ratio,
     sortino_ratio,
 )
@@ -43,16 +44,7 @@ class RiskMetricsPeriod(object):
     def __init__(self, start_date, end_date, returns,
                  benchmark_returns=None):
 
-        treasury_curves = trading.environment.treasury_curves
-        if treasury_curves.index[-1] >= start_date:
-            mask = ((treasury_curves.index >= start_date) &
-                    (treasury_curves.index <= end_date))
-
-            self.treasury_curves = treasury_curves[mask]
-        else:
-            # our test is beyond the treasury curve history
-            # so we'll use the last available treasury curve
-            self.treasury_curves = treasury_curves[-1:]
+        self.treasury_rates = trading.environment.treasury_rates
 
         self.start_date = start_date
         self.end_date = end_date
@@ -93,7 +85,7 @@ class RiskMetricsPeriod(object):
         self.algorithm_volatility = self.calculate_volatility(
             self.algorithm_returns)
         self.treasury_period_return = choose_treasury(
-            self.treasury_curves,
+            self.treasury_rates,
             self.start_date,
             self.end_date
         )
@@ -252,30 +244,4 @@ class RiskMetricsPeriod(object):
                      self.beta)
 
     def calculate_max_drawdown(self):
-        compounded_returns = []
-        cur_return = 0.0
-        for r in self.algorithm_returns:
-            try:
-                cur_return += math.log(1.0 + r)
-            # this is a guard for a single day returning -100%
-            except ValueError:
-                log.debug("{cur} return, zeroing the returns".format(
-                    cur=cur_return))
-                cur_return = 0.0
-                # BUG? Shouldn't this be set to log(1.0 + 0) ?
-            compounded_returns.append(cur_return)
-
-        cur_max = None
-        max_drawdown = None
-        for cur in compounded_returns:
-            if cur_max is None or cur > cur_max:
-                cur_max = cur
-
-            drawdown = (cur - cur_max)
-            if max_drawdown is None or drawdown < max_drawdown:
-                max_drawdown = drawdown
-
-        if max_drawdown is None:
-            return 0.0
-
-        return 1.0 - math.exp(max_drawdown)
+        return max_drawdown(self.algorithm_returns.values)
@@ -59,11 +59,54 @@ import logbook
 import datetime
 from dateutil.relativedelta import relativedelta
 
-from . period import RiskMetricsPeriod
+import numpy as np
+import pandas as pd
+
+from alephnull.finance import trading
+import alephnull.utils.math_utils as zp_math
+
+from . risk import (
+    alpha,
+    max_drawdown,
+    sharpe_ratio,
+    sortino_ratio,
+)
+from . period import RiskMetricsPeriod, choose_treasury
 
 log = logbook.Logger('Risk Report')
 
 
+def _to_int64(dt):
+    return pd.Timestamp(dt).value
+
+
+def _prefix_sum(values):
+    """
+    Prefix sums with a leading zero, so that the sum over values[i:j] is
+    ``sums[j] - sums[i]``.
+    """
+    sums = np.empty(len(values) + 1, dtype=np.float64)
+    sums[0] = 0.0
+    np.cumsum(values, out=sums[1:])
+    return sums
+
+
+class RiskMetricsWindow(RiskMetricsPeriod):
+    """
+    A RiskMetricsPeriod whose metrics were computed in bulk by
+    RiskReport, rather than by masking and re-reducing the full returns
+    series for each window.
+    """
+    def __init__(self, start_date, end_date, algorithm_returns,
+                 benchmark_returns, treasury_rates, metrics):
+        self.start_date = start_date
+        self.end_date = end_date
+        self.algorithm_returns = algorithm_returns
+        self.benchmark_returns = benchmark_returns
+        self.treasury_rates = treasury_rates
+        self.__dict__.update(metrics)
+
+
 class RiskReport(object):
     def __init__(self, algorithm_returns, sim_params, benchmark_returns=None):
         """
@@ -81,6 +124,7 @@ class RiskReport(object):
         else:
             start_date = self.algorithm_returns.index[0]
             end_date = self.algorithm_returns.index[-1]
+            self.prepare_returns()
 
         self.month_periods = self.periods_in_range(1, start_date, end_date)
         self.three_month_periods = self.periods_in_range(3, start_date,
@@ -110,6 +154,70 @@ class RiskReport(object):
             'twelve_month': [x.to_dict() for x in self.year_periods],
         }
 
+    def prepare_returns(self):
+        """
+        Mask the algorithm and benchmark returns to trading days once, and
+        build the prefix sums from which every window's metrics are taken.
+        """
+        returns = self.algorithm_returns
+        benchmark_returns = self.benchmark_returns
+        if benchmark_returns is None:
+            br = trading.environment.benchmark_returns
+            benchmark_returns = br[(br.index >= returns.index[0]) &
+                                   (br.index <= returns.index[-1])]
+
+        self._algo = self.mask_to_trading_days(returns)
+        self._bench = self.mask_to_trading_days(benchmark_returns)
+        self._algo_dts = self._algo.index.asi8
+        self._bench_dts = self._bench.index.asi8
+        self._aligned = self._algo.index.equals(self._bench.index)
+
+        algo = self._algo.values.astype(np.float64)
+        self._algo_values = algo
+
+        # Compounded returns are taken as differences of a running sum of
+        # log returns; windows containing a -100% day are reduced directly.
+        ruined = algo <= -1.0
+        log_returns = np.zeros(len(algo))
+        log_returns[~ruined] = np.log1p(algo[~ruined])
+        self._log_sums = _prefix_sum(log_returns)
+        self._ruin_counts = _prefix_sum(ruined)
+
+        bench = self._bench.values.astype(np.float64)
+        self._bench_values = bench
+        ruined = bench <= -1.0
+        log_returns = np.zeros(len(bench))
+        log_returns[~ruined] = np.log1p(bench[~ruined])
+        self._bench_log_sums = _prefix_sum(log_returns)
+        self._bench_ruin_counts = _prefix_sum(ruined)
+
+        if self._aligned:
+            # Second moments are accumulated about the full-series means to
+            # keep the window differences well conditioned.
+            a = algo - algo.mean()
+            b = bench - bench.mean()
+            self._mean_d = (algo - bench).mean()
+            d = (algo - bench) - self._mean_d
+            self._sums = {
+                'a': _prefix_sum(a),
+                'b': _prefix_sum(b),
+                'aa': _prefix_sum(a * a),
+                'bb': _prefix_sum(b * b),
+                'ab': _prefix_sum(a * b),
+                'd': _prefix_sum(d),
+                'dd': _prefix_sum(d * d),
+            }
+
+        self._treasury_rates = trading.environment.treasury_rates
+
+    def mask_to_trading_days(self, returns):
+        if isinstance(returns, list):
+            returns = pd.Series([x.returns for x in returns],
+                                index=[x.date for x in returns])
+
+        trade_days = trading.environment.trading_days
+        return returns[returns.index.normalize().isin(trade_days)]
+
     def periods_in_range(self, months_per, start, end):
         one_day = datetime.timedelta(days=1)
         ends = []
@@ -127,14 +235,147 @@ class RiskReport(object):
             cur_end = cur_start + relativedelta(months=months_per) - one_day
             if(cur_end > the_end):
                 break
-            cur_period_metrics = RiskMetricsPeriod(
-                start_date=cur_start,
-                end_date=cur_end,
-                returns=self.algorithm_returns,
-                benchmark_returns=self.benchmark_returns
-            )
+            cur_period_metrics = self.window_metrics(cur_start, cur_end)
 
             ends.append(cur_period_metrics)
             cur_start = cur_start + relativedelta(months=1)
 
         return ends
+
+    @staticmethod
+    def period_return(values, log_sums, ruin_counts, i, j):
+        if ruin_counts[j] - ruin_counts[i]:
+            return (1. + values[i:j]).prod() - 1
+        return np.expm1(log_sums[j] - log_sums[i])
+
+    @staticmethod
+    def variance(total, total_sq, n):
+        if n < 2:
+            return np.nan
+        return max(total_sq - total * total / n, 0.0) / (n - 1)
+
+    @staticmethod
+    def covariance(total_a, total_b, total_ab, n):
+        if n < 2:
+            return np.nan
+        return (total_ab - total_a * total_b / n) / (n - 1)
+
+    @staticmethod
+    def information(mean_relative, relative_variance):
+        """
+        http://en.wikipedia.org/wiki/Information_ratio
+        """
+        relative_deviation = np.sqrt(relative_variance)
+        if (
+            np.isnan(relative_deviation)
+            or
+            zp_math.tolerant_equals(relative_deviation, 0)
+        ):
+            return 0.0
+
+        return mean_relative / relative_deviation
+
+    def window_metrics(self, start_date, end_date):
+        start = _to_int64(start_date)
+        end = _to_int64(end_date)
+
+        i = self._algo_dts.searchsorted([start], side='left')[0]
+        j = self._algo_dts.searchsorted([end], side='right')[0]
+        k = self._bench_dts.searchsorted([start], side='left')[0]
+        l = self._bench_dts.searchsorted([end], side='right')[0]
+
+        algorithm_returns = self._algo[i:j]
+        benchmark_returns = self._bench[k:l]
+
+        if not (self._aligned or
+                algorithm_returns.index.equals(benchmark_returns.index)):
+            message = "Mismatch between benchmark_returns ({bm_count}) and \
+            algorithm_returns ({algo_count}) in range {start} : {end}"
+            message = message.format(
+                bm_count=len(benchmark_returns),
+                algo_count=len(algorithm_returns),
+                start=start_date,
+                end=end_date
+            )
+            raise Exception(message)
+
+        n = j - i
+
+        m = {'num_trading_days': n}
+        m['algorithm_period_returns'] = self.period_return(
+            self._algo_values, self._log_sums, self._ruin_counts, i, j)
+        m['benchmark_period_returns'] = self.period_return(
+            self._bench_values, self._bench_log_sums,
+            self._bench_ruin_counts, k, l)
+
+        if self._aligned:
+            s = self._sums
+            sum_a = s['a'][j] - s['a'][i]
+            sum_b = s['b'][j] - s['b'][i]
+            sum_d = s['d'][j] - s['d'][i]
+            var_a = self.variance(sum_a, s['aa'][j] - s['aa'][i], n)
+            var_b = self.variance(sum_b, s['bb'][j] - s['bb'][i], n)
+            var_d = self.variance(sum_d, s['dd'][j] - s['dd'][i], n)
+            cov_ab = self.covariance(sum_a, sum_b,
+                                     s['ab'][j] - s['ab'][i], n)
+            mean_d = sum_d / n + self._mean_d if n else np.nan
+            m['algorithm_volatility'] = np.sqrt(var_a) * np.sqrt(n)
+            m['benchmark_volatility'] = np.sqrt(var_b) * np.sqrt(n)
+        else:
+            # the windows are equal even though the full series are not, so
+            # fall back to reducing the window directly.
+            a = algorithm_returns.values
+            b = benchmark_returns.values
+            var_a = np.var(a, ddof=1) if n > 1 else np.nan
+            var_b = np.var(b, ddof=1) if n > 1 else np.nan
+            var_d = np.var(a - b, ddof=1) if n > 1 else np.nan
+            cov_ab = np.cov(a, b, ddof=1)[0][1] if n > 1 else np.nan
+            mean_d = np.mean(a - b) if n else np.nan
+            m['algorithm_volatility'] = np.sqrt(var_a * n)
+            m['benchmark_volatility'] = np.sqrt(var_b * n)
+
+        treasury_period_return = choose_treasury(
+            self._treasury_rates,
+            start_date,
+            end_date
+        )
+        m['treasury_period_return'] = treasury_period_return
+
+        m['sharpe'] = sharpe_ratio(m['algorithm_volatility'],
+                                   m['algorithm_period_returns'],
+                                   treasury_period_return)
+        m['sortino'] = sortino_ratio(self._algo_values[i:j],
+                                     m['algorithm_period_returns'],
+                                     treasury_period_return)
+
+        m['information'] = self.information(mean_d, var_d)
+
+        if n < 2:
+            m['beta'] = 0.0
+            m['algorithm_covariance'] = 0.0
+            m['benchmark_variance'] = 0.0
+            m['condition_number'] = 0.0
+            m['eigen_values'] = []
+        else:
+            # eigenvalues of the 2x2 covariance matrix in closed form
+            half_trace = (var_a + var_b) / 2.0
+            det = var_a * var_b - cov_ab * cov_ab
+            root = np.sqrt(max(half_trace * half_trace - det, 0.0))
+            eigen_values = np.array([half_trace + root, half_trace - root])
+            m['beta'] = cov_ab / var_b
+            m['algorithm_covariance'] = cov_ab
+            m['benchmark_variance'] = var_b
+            m['condition_number'] = eigen_values.max() / eigen_values.min()
+            m['eigen_values'] = eigen_values
+
+        m['alpha'] = alpha(m['algorithm_period_returns'],
+                           treasury_period_return,
+                           m['benchmark_period_returns'],
+                           m['beta'])
+        m['excess_return'] = m['algorithm_period_returns'] - \
+            treasury_period_return
+
+        m['max_drawdown'] = max_drawdown(self._algo_values[i:j])
+
+        return RiskMetricsWindow(start_date, end_date, algorithm_returns,
+                                 benchmark_returns, self._treasury_rates, m)
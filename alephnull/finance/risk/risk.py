@@ -56,7 +56,11 @@ Risk Report
 """
 
 import logbook
+import math
+from collections import OrderedDict
+
 import numpy as np
+import pandas as pd
 
 from alephnull.finance import trading
 import alephnull.utils.math_utils as zp_math
@@ -179,32 +183,122 @@ def alpha(algorithm_period_return, treasury_period_return,
         (treasury_period_return + beta *
          (benchmark_period_returns - treasury_period_return))
 
-###########################
-# End Risk Metric Section #
-###########################
 
+def compounded_log_returns(returns):
+    """
+    Running sum of log returns.
+
+    Args:
+        returns (np.array-like): Period returns, in order.
+
+    Returns:
+        np.array. The compounded log return at each period. A period
+        returning -100% or worse has no defined log return; the running sum
+        restarts from zero on such a period.
+    """
+    returns = np.asarray(returns, dtype=np.float64)
+    ruined = returns <= -1.0
+    log_returns = np.log1p(np.where(ruined, 0.0, returns))
+    compounded = np.cumsum(log_returns)
+    if ruined.any():
+        last_ruin = np.maximum.accumulate(
+            np.where(ruined, np.arange(len(returns)), -1))
+        base = np.where(last_ruin >= 0,
+                        compounded[np.maximum(last_ruin, 0)],
+                        0.0)
+        compounded = compounded - base
+    return compounded
+
+
+def underwater_curve(compounded):
+    """
+    Args:
+        compounded (np.array-like): Compounded log returns.
+
+    Returns:
+        np.array. The fractional drawdown from the running peak at each
+        period, 0 at a new high.
+    """
+    compounded = np.asarray(compounded, dtype=np.float64)
+    if len(compounded) == 0:
+        return compounded
+    return 1.0 - np.exp(compounded - np.maximum.accumulate(compounded))
+
+
+def max_drawdown(returns):
+    """
+    Args:
+        returns (np.array-like): Period returns, in order.
+
+    Returns:
+        float. The largest relative peak to trough move of the compounded
+        returns.
+    """
+    underwater = underwater_curve(compounded_log_returns(returns))
+    if len(underwater) == 0:
+        return 0.0
+    return underwater.max()
+
+
+def max_drawdown_duration(underwater):
+    """
+    Args:
+        underwater (np.array-like): Output of underwater_curve.
+
+    Returns:
+        int. The longest run of consecutive periods spent below a peak.
+    """
+    below = np.concatenate([[False], np.asarray(underwater) > 0, [False]])
+    edges = np.diff(below.astype(np.int8))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+    if len(starts) == 0:
+        return 0
+    return int((ends - starts).max())
 
-def get_treasury_rate(treasury_curves, treasury_duration, day):
-    rate = None
 
-    curve = treasury_curves.ix[day]
-    # 1month note data begins in 8/2001,
-    # so we can use 3month instead.
-    idx = TREASURY_DURATIONS.index(treasury_duration)
-    for duration in TREASURY_DURATIONS[idx:]:
-        rate = curve[duration]
-        if rate is not None:
-            break
+class DrawdownTracker(object):
+    """
+    Incremental counterpart to max_drawdown, for metrics that are updated
+    one period at a time.
+
+    Each update takes the compounded log return for the latest period and
+    updates the running peak, the current and maximum drawdown and the
+    number of periods spent below the peak, without revisiting history.
+
+    With @record_underwater, the drawdown of every update is also kept in
+    the underwater list, which otherwise stays None.
+    """
 
-    return rate
+    def __init__(self, record_underwater=False):
+        self.peak = -np.inf
+        self.current_drawdown = 0.0
+        self.max_drawdown = 0.0
+        self.duration = 0
+        self.max_duration = 0
+        self.underwater = [] if record_underwater else None
+
+    def update(self, compounded):
+        if compounded > self.peak:
+            self.peak = compounded
+        self.current_drawdown = 1.0 - math.exp(compounded - self.peak)
+        if self.current_drawdown > self.max_drawdown:
+            self.max_drawdown = self.current_drawdown
+
+        if self.current_drawdown > 0:
+            self.duration += 1
+            if self.duration > self.max_duration:
+                self.max_duration = self.duration
+        else:
+            self.duration = 0
 
+        if self.underwater is not None:
+            self.underwater.append(self.current_drawdown)
+        return self.max_drawdown
 
-def search_day_distance(end_date, dt):
-    tdd = trading.environment.trading_day_distance(dt, end_date)
-    if tdd is None:
-        return None
-    assert tdd >= 0
-    return tdd
+###########################
+# End Risk Metric Section #
+###########################
 
 
 def select_treasury_duration(start_date, end_date):
@@ -233,38 +327,71 @@ def select_treasury_duration(start_date, end_date):
     return treasury_duration
 
 
-def choose_treasury(select_treasury, treasury_curves, start_date, end_date,
-                    compound=True):
-    treasury_duration = select_treasury(start_date, end_date)
-    end_day = end_date.replace(hour=0, minute=0, second=0, microsecond=0)
-    search_day = None
-
-    if end_day in treasury_curves.index:
-        rate = get_treasury_rate(treasury_curves,
-                                 treasury_duration,
-                                 end_day)
-        if rate is not None:
-            search_day = end_day
-
-    if not search_day:
-        # in case end date is not a trading day or there is no treasury
-        # data, search for the previous day with an interest rate.
-        search_days = treasury_curves.index
-
-        # Find rightmost value less than or equal to end_day
-        i = search_days.searchsorted(end_day)
-        for prev_day in search_days[i - 1::-1]:
-            rate = get_treasury_rate(treasury_curves,
-                                     treasury_duration,
-                                     prev_day)
-            if rate is not None:
-                search_day = prev_day
-                search_dist = search_day_distance(end_date, prev_day)
-                break
-
-        if search_day:
-            if (search_dist is None or search_dist > 1) and \
-                    search_days[0] <= end_day <= search_days[-1]:
+class TreasuryRates(object):
+    """
+    Treasury curves as a dense (days x durations) float array.
+
+    Missing durations are resolved in advance to the next longer duration
+    with a rate on the same day (1month note data begins in 8/2001, so
+    3month is used instead before then), and days without a rate carry the
+    previous day's rate forward. Period returns are memoized in an LRU
+    cache keyed by (start, end, duration).
+    """
+
+    def __init__(self, treasury_curves, trading_day_distance=None,
+                 cache_size=4096):
+        curves = treasury_curves.reindex(columns=TREASURY_DURATIONS)
+        rates = curves.values.astype(np.float64)
+
+        for col in xrange(len(TREASURY_DURATIONS) - 2, -1, -1):
+            missing = np.isnan(rates[:, col])
+            rates[missing, col] = rates[missing, col + 1]
+
+        # forward fill each duration through days without a rate
+        rows = np.arange(len(rates))[:, np.newaxis].repeat(rates.shape[1], 1)
+        rows[np.isnan(rates)] = 0
+        rows = np.maximum.accumulate(rows, axis=0)
+        self.rates = rates[rows, np.arange(rates.shape[1])]
+
+        self.days = curves.index
+        self.day_values = self.days.asi8
+        self.columns = dict((d, i) for i, d in enumerate(TREASURY_DURATIONS))
+        self.trading_day_distance = trading_day_distance
+
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+
+    def __len__(self):
+        return len(self.day_values)
+
+    def rate(self, treasury_duration, end_date):
+        """
+        The rate for @treasury_duration on the last day with a curve on or
+        before the date of @end_date, or None if @end_date is before the
+        treasury history or no rate for the duration has been seen yet.
+        """
+        if len(self.day_values) == 0:
+            return None
+
+        end_day = end_date.replace(hour=0, minute=0, second=0, microsecond=0)
+        end_value = pd.Timestamp(end_day).value
+        i = self.day_values.searchsorted([end_value], side='right')[0] - 1
+
+        if i < 0:
+            log.warn("End date = {dt} is before the treasury history, which "
+                     "starts on {start}.".format(dt=end_date,
+                                                 start=self.days[0]))
+            return None
+        elif self.day_values[i] != end_value and \
+                end_value <= self.day_values[-1]:
+            # in case end date is not a trading day or there is no treasury
+            # data, the previous day with an interest rate is used.
+            search_day = self.days[i]
+            search_dist = None
+            if self.trading_day_distance is not None:
+                search_dist = self.trading_day_distance(search_day, end_date)
+                assert search_dist is None or search_dist >= 0
+            if search_dist is None or search_dist > 1:
                 message = "No rate within 1 trading day of end date = \
 {dt} and term = {term}. Using {search_day}. Check that date doesn't exceed \
 treasury history range."
@@ -273,17 +400,57 @@ treasury history range."
                                          search_day=search_day)
                 log.warn(message)
 
-    if search_day:
-        td = end_date - start_date
+        rate = self.rates[i, self.columns[treasury_duration]]
+        if np.isnan(rate):
+            log.warn("No {term} rate on or before end date = {dt}.".format(
+                term=treasury_duration, dt=end_date))
+            return None
+
+        return rate
+
+    def period_return(self, start_date, end_date, treasury_duration,
+                      compound=True):
+        key = (start_date, end_date, treasury_duration, compound)
+        try:
+            value = self._cache.pop(key)
+        except KeyError:
+            value = self._period_return(start_date, end_date,
+                                        treasury_duration, compound)
+            if len(self._cache) >= self.cache_size:
+                self._cache.popitem(last=False)
+        self._cache[key] = value
+        return value
+
+    def _period_return(self, start_date, end_date, treasury_duration,
+                       compound):
+        rate = self.rate(treasury_duration, end_date)
+
+        if rate is None:
+            message = "No rate for end date = {dt} and term = {term}. Check \
+that date doesn't exceed treasury history range."
+            message = message.format(
+                dt=end_date,
+                term=treasury_duration
+            )
+            raise Exception(message)
+
         if compound:
+            td = end_date - start_date
             return rate * (td.days + 1) / 365
         else:
             return rate
 
-    message = "No rate for end date = {dt} and term = {term}. Check \
-that date doesn't exceed treasury history range."
-    message = message.format(
-        dt=end_date,
-        term=treasury_duration
-    )
-    raise Exception(message)
+
+def choose_treasury(select_treasury, treasury_curves, start_date, end_date,
+                    compound=True):
+    """
+    @treasury_curves is either a TreasuryRates table, or a DataFrame of
+    curves from which a table is built for this call.
+    """
+    if not isinstance(treasury_curves, TreasuryRates):
+        treasury_curves = TreasuryRates(
+            treasury_curves, trading.environment.trading_day_distance)
+    treasury_duration = select_treasury(start_date, end_date)
+    return treasury_curves.period_return(start_date, end_date,
+                                         treasury_duration,
+                                         compound=compound)
@@ -16,16 +16,21 @@
 import bisect
 import logbook
 import datetime
+from itertools import izip
 
+import numpy as np
 import pandas as pd
 
 from alephnull.data.loader import load_market_data
-from alephnull.utils import tradingcalendar
-from alephnull.utils.tradingcalendar import get_early_closes
+from alephnull.protocol import DATASOURCE_TYPE, Event
+from alephnull.utils import calendars
 
 
 log = logbook.Logger('Trading')
 
+NANOS_IN_MINUTE = 60 * 10 ** 9
+NANOS_IN_DAY = 24 * 60 * NANOS_IN_MINUTE
+
 
 # The financial simulations in zipline depend on information
 # about the benchmark index and the risk free rates of return.
@@ -40,6 +45,8 @@ log = logbook.Logger('Trading')
 #   hosting the benchmark index. All dates are normalized to UTC
 #   for serialization and storage, and the timezone is used to
 #   ensure proper rollover through daylight savings and so on.
+# The market hours and early closes come from the calendar of the
+# exchange, selected by its code in alephnull.utils.calendars.
 #
 # This module maintains a global variable, environment, which is
 # subsequently referenced directly by zipline financial
@@ -50,7 +57,8 @@ log = logbook.Logger('Trading')
 #
 # or if you want to switch the environment for a limited context
 # you can use a TradingEnvironment in a with clause:
-#       lse = TradingEnvironment(bm_index="^FTSE", exchange_tz="Europe/London")
+#       lse = TradingEnvironment(bm_index="^FTSE", exchange_tz="Europe/London",
+#                                exchange="LSE")
 #       with lse:
 #           # the code here will have lse as the global trading.environment
 #           algo.run(start, end)
@@ -74,19 +82,34 @@ class TradingEnvironment(object):
         bm_symbol='^GSPC',
         exchange_tz="US/Eastern",
         max_date=None,
-        extra_dates=None
+        extra_dates=None,
+        exchange=calendars.DEFAULT_EXCHANGE
     ):
         self.prev_environment = self
         self.bm_symbol = bm_symbol
+        self.exchange = exchange
         if not load:
             load = load_market_data
 
         self.benchmark_returns, treasury_curves_map = \
             load(self.bm_symbol)
 
-        self.treasury_curves = pd.DataFrame(treasury_curves_map).T
+        self.benchmark_returns = self.benchmark_returns.sort_index()
+        # Sorted arrays backing benchmark_source, so that every run only
+        # pays for a searchsorted and a slice.
+        self.benchmark_dts = self.benchmark_returns.index.asi8
+        self.benchmark_values = self.benchmark_returns.values.astype(
+            np.float64)
+        self._benchmark_events = None
+
+        if isinstance(treasury_curves_map, pd.DataFrame):
+            # days x durations, as stored
+            self.treasury_curves = treasury_curves_map
+        else:
+            self.treasury_curves = pd.DataFrame(treasury_curves_map).T
         if max_date:
             self.treasury_curves = self.treasury_curves.ix[:max_date, :]
+        self._treasury_rates = None
 
         self.full_trading_day = datetime.timedelta(hours=6, minutes=30)
         self.early_close_trading_day = datetime.timedelta(hours=3, minutes=30)
@@ -109,10 +132,12 @@ class TradingEnvironment(object):
         self.first_trading_day = self.trading_days[0]
         self.last_trading_day = self.trading_days[-1]
 
-        self.early_closes = get_early_closes(self.first_trading_day,
-                                             self.last_trading_day)
+        self.calendar = calendars.get_calendar(self.exchange,
+                                               self.first_trading_day,
+                                               self.last_trading_day)
+        self.early_closes = self.calendar.early_closes
 
-        self.open_and_closes = tradingcalendar.open_and_closes.ix[
+        self.open_and_closes = self.calendar.open_and_closes.ix[
             self.trading_days]
 
     def __enter__(self, *args, **kwargs):
@@ -130,6 +155,40 @@ class TradingEnvironment(object):
         # stack.
         return False
 
+    def benchmark_source(self, start, end):
+        """
+        Returns the benchmark events for every day from the date of
+        @start through the date of @end, inclusive.
+
+        The events are built once per environment and shared across runs.
+        """
+        if self._benchmark_events is None:
+            self._benchmark_events = [
+                Event({'dt': dt,
+                       'returns': ret,
+                       'type': DATASOURCE_TYPE.BENCHMARK,
+                       'source_id': 'benchmarks'})
+                for dt, ret in izip(self.benchmark_returns.index,
+                                    self.benchmark_values)
+            ]
+
+        first = self.normalize_date(start).value
+        last = self.normalize_date(end).value + NANOS_IN_DAY
+        i, j = self.benchmark_dts.searchsorted([first, last])
+
+        return self._benchmark_events[i:j]
+
+    @property
+    def treasury_rates(self):
+        """
+        The treasury curves as a dense, memoized TreasuryRates table.
+        """
+        if self._treasury_rates is None:
+            from alephnull.finance.risk.risk import TreasuryRates
+            self._treasury_rates = TreasuryRates(self.treasury_curves,
+                                                 self.trading_day_distance)
+        return self._treasury_rates
+
     def normalize_date(self, test_date):
         test_date = pd.Timestamp(test_date, tz='UTC')
         return pd.tseries.tools.normalize_date(test_date)
@@ -190,6 +249,26 @@ Last successful date: %s" % self.last_trading_day)
         market_open, market_close = self.get_open_and_close(midnight)
         return pd.date_range(market_open, market_close, freq='T')
 
+    def market_minutes_for_days(self, days):
+        """
+        The market minutes of all of the trading @days, as one index.
+
+        The minutes are laid out from the opens and closes of the days in
+        one pass, instead of joining an index per day. Days that aren't
+        in the calendar have no minutes.
+        """
+        opens_and_closes = self.open_and_closes.reindex(
+            pd.DatetimeIndex(days)).dropna()
+        opens = pd.DatetimeIndex(list(opens_and_closes['market_open'])).asi8
+        closes = pd.DatetimeIndex(
+            list(opens_and_closes['market_close'])).asi8
+
+        counts = (closes - opens) // NANOS_IN_MINUTE + 1
+        starts = np.repeat(counts.cumsum() - counts, counts)
+        minutes = np.repeat(opens, counts) + \
+            (np.arange(counts.sum()) - starts) * NANOS_IN_MINUTE
+        return pd.DatetimeIndex(minutes, tz='UTC')
+
     def trading_day_distance(self, first_date, second_date):
         first_date = self.normalize_date(first_date)
         second_date = self.normalize_date(second_date)
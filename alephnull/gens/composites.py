@@ -13,25 +13,146 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import calendar
 import heapq
 
+import numpy as np
 
-def _decorate_source(source):
-    for message in source:
-        yield ((message.dt, message.source_id), message)
+
+def _dt_to_int64(dt):
+    """
+    Nanoseconds since the epoch for @dt, which is either a pandas
+    Timestamp or a tz-aware datetime.
+    """
+    try:
+        return dt.value
+    except AttributeError:
+        return calendar.timegm(dt.utctimetuple()) * 10 ** 9 + \
+            dt.microsecond * 1000
+
+
+def _source_id(source):
+    if isinstance(source, (list, tuple)):
+        if source:
+            return source[0].source_id
+        return ''
+    return source.get_hash()
+
+
+def _event_dts(source):
+    """
+    Returns an int64 array with the timestamp of every message in
+    @source, or None if those can't be known without consuming it.
+    """
+    if isinstance(source, (list, tuple)):
+        return np.fromiter((_dt_to_int64(message.dt) for message in source),
+                           dtype=np.int64,
+                           count=len(source))
+    return getattr(source, 'event_dts', None)
+
+
+def _merge_columnar(sources):
+    """
+    Merges sources whose timestamps are known up front by sorting all
+    of the timestamps at once, then pulling from each source in the
+    resulting order. Ties are broken by source_id, then by the order
+    of the messages within their source.
+    """
+    sources = sorted(sources, key=lambda pair: _source_id(pair[0]))
+
+    all_dts = [dts for _, dts in sources]
+    labels = np.repeat(np.arange(len(all_dts)),
+                       [len(dts) for dts in all_dts])
+    # mergesort is stable, which keeps the tie breaking described above.
+    order = np.concatenate(all_dts).argsort(kind='mergesort')
+
+    iters = [iter(source) for source, _ in sources]
+    for label in labels[order]:
+        message = next(iters[label], None)
+        if message is None:
+            raise ValueError(
+                "Source {0} ran out before its {1} event_dts".format(
+                    _source_id(sources[label][0]), len(all_dts[label])))
+        yield message
+
+    for label, it in enumerate(iters):
+        if next(it, None) is not None:
+            raise ValueError(
+                "Source {0} has more events than its {1} event_dts".format(
+                    _source_id(sources[label][0]), len(all_dts[label])))
+
+
+def _decorate_source(source, rank):
+    # rank and position make every key unique, so that messages
+    # themselves are never compared.
+    for position, message in enumerate(source):
+        yield ((_dt_to_int64(message.dt), message.source_id, rank, position),
+               message)
 
 
 def date_sorted_sources(*sources):
     """
     Takes an iterable of sources, generating namestrings and
     piping their output into date_sort.
+
+    Sources that know their timestamps ahead of time (lists of events,
+    or DataSources exposing event_dts) are merged in bulk; only the
+    remaining generator sources go through the heap.
+    """
+    columnar = []
+    streams = []
+    for source in sources:
+        dts = _event_dts(source)
+        if dts is None:
+            streams.append(source)
+        else:
+            columnar.append((source, dts))
+
+    if columnar:
+        streams.insert(0, _merge_columnar(columnar))
+
+    if len(streams) == 1:
+        sorted_stream = streams[0]
+    else:
+        decorated = heapq.merge(*(_decorate_source(s, rank)
+                                  for rank, s in enumerate(streams)))
+        # Strip out key decoration
+        sorted_stream = (message for _, message in decorated)
+
+    for message in sorted_stream:
+        yield message
+
+
+def inject_benchmarks(benchmarks, stream_in):
+    """
+    Injects the date sorted @benchmarks into the date sorted
+    @stream_in. A benchmark event is emitted right before the first
+    message that falls after it, so it trails every other message
+    sharing its dt.
+
+    The exception is a message flagged end_of_bar, which group_by_dt
+    hands on as soon as it is read: benchmarks sharing its dt are
+    emitted right before it, so they stay in the bar's group.
     """
-    sorted_stream = heapq.merge(*(_decorate_source(s) for s in sources))
+    benchmarks = iter(benchmarks)
+    bm = next(benchmarks, None)
+    bm_key = None if bm is None else _dt_to_int64(bm.dt)
 
-    # Strip out key decoration
-    for _, message in sorted_stream:
+    for message in stream_in:
+        if bm is not None:
+            key = _dt_to_int64(message.dt)
+            if 'end_of_bar' in message:
+                key += 1
+            while bm is not None and bm_key < key:
+                yield bm
+                bm = next(benchmarks, None)
+                bm_key = None if bm is None else _dt_to_int64(bm.dt)
         yield message
 
+    while bm is not None:
+        yield bm
+        bm = next(benchmarks, None)
+
 
 def sequential_transforms(stream_in, *transforms):
     """
@@ -54,3 +175,25 @@ def alias_dt(stream_in):
     for message in stream_in:
         message['datetime'] = message['dt']
         yield message
+
+
+def group_by_dt(stream_in):
+    """
+    (dt, messages) for each run of messages sharing a dt, like
+    itertools.groupby. A run also ends at a message flagged end_of_bar,
+    so a streamed bar is handed on without waiting for the next one.
+    """
+    group = []
+    dt = None
+    for message in stream_in:
+        if group and message.dt != dt:
+            yield dt, group
+            group = []
+        dt = message.dt
+        group.append(message)
+        if 'end_of_bar' in message:
+            yield dt, group
+            group = []
+
+    if group:
+        yield dt, group
@@ -1,21 +1,22 @@
 __author__ = 'oglebrandon'
 
+from functools import partial
+
 from logbook import Logger
 
 from ib.ext.Contract import Contract
-from ib.ext.ExecutionFilter import ExecutionFilter
 from ib.ext.Order import Order as IBOrder
 from alephnull.finance.blotter import Blotter
 from alephnull.utils.protocol_utils import Enum
-from alephnull.finance.slippage import Transaction
+from alephnull.live.executions import ExecutionQueue
+from alephnull.live import reconcile
+from alephnull.live.throttle import OrderThrottle, DEFAULT_MAX_PER_SECOND
 import alephnull.protocol as zp
 
 
 # Medici fork of IbPy
 # https://github.com/CarterBain/Medici
 from ib.client.IBrokers import IBClient
-import datetime as dt
-import pytz
 
 log = Logger('Blotter')
 
@@ -32,21 +33,38 @@ def round_for_minimum_price_variation(x):
 
 
 class LiveBlotter(Blotter):
-    id_map = {}
 
-    def __init__(self):
+    def __init__(self, executions=None,
+                 max_messages_per_second=DEFAULT_MAX_PER_SECOND):
         super(LiveBlotter, self).__init__()
-
+        if executions is None:
+            executions = ExecutionQueue()
+        self.executions = executions
+        self.id_map = {}
+
+        # place_order and cancel_order are set by LiveExecution
+        self.throttle = OrderThrottle(
+            send=lambda contract, ib_order: self.place_order(contract,
+                                                             ib_order),
+            cancel=lambda ib_id: self.cancel_order(ib_id),
+            on_sent=self._order_sent,
+            max_per_second=max_messages_per_second)
+        # ref of a coalesced broker order => the orders it was sent for
+        self.order_groups = {}
+        # order id => ref of the coalesced broker order it was sent as
+        self.group_of = {}
 
     def order(self, sid, amount, limit_price, stop_price, order_id=None):
         id = super(LiveBlotter, self).order(sid, amount, limit_price, stop_price, order_id=None)
+        if id is None:
+            return
         order_obj = self.orders[id]
 
         ib_order = IBOrder()
         ib_order.m_transmit = True
         ib_order.m_orderRef = order_obj.id
-        ib_order.m_totalQuantity = order_obj.amount
-        ib_order.m_action = ['BUY' if ib_order.m_totalQuantity > 0 else 'SELL'][0]
+        ib_order.m_totalQuantity = abs(order_obj.amount)
+        ib_order.m_action = ['BUY' if order_obj.amount > 0 else 'SELL'][0]
         ib_order.m_tif = 'DAY'
         #Todo: make the FA params configurable
         ib_order.m_faGroup = 'ALL'
@@ -84,15 +102,42 @@ class LiveBlotter(Blotter):
             contract.m_secType = 'STK'
             contract.m_exchange = 'SMART'
 
-        ib_id = self.place_order(contract, ib_order)
-        self.id_map[order_obj.id] = ib_id
+        # queue the order to be sent from the throttle's thread, merged
+        # with a queued order of this bar it can be sent with.
+        key = (order_obj.sid, getattr(order_obj, 'contract', None),
+               self.current_dt, ib_order.m_action, ib_order.m_orderType,
+               order_obj.limit, order_obj.stop)
+        self.throttle.submit(key, order_obj.id, contract, ib_order,
+                             order_obj.amount,
+                             on_queued=partial(self._join_group, order_obj))
+        self.throttle.start()
 
         return order_obj.id
 
+    def _join_group(self, order_obj, ref):
+        # called under the throttle's lock, so the group is complete
+        # before the dispatch thread can send it
+        if ref != order_obj.id:
+            self.group_of[order_obj.id] = ref
+            self.order_groups.setdefault(
+                ref, [self.orders[ref]]).append(order_obj)
+
+    def _order_sent(self, ref, ib_id):
+        # called from the throttle's thread
+        for order in self.order_groups.get(ref, [self.orders[ref]]):
+            self.id_map[order.id] = ib_id
+        self.executions.register(ref, ib_id)
+
     def cancel(self, order_id):
-        ib_id = self.id_map[order_id]
-        self.cancel_order(ib_id)
-        super(Blotter, self).order(order_id)
+        if order_id not in self.orders:
+            return
+        if self.throttle.cancel(order_id):
+            # it was never sent, so no fills will come for it
+            group = self.order_groups.get(self.group_of.get(order_id,
+                                                            order_id))
+            if group is not None:
+                group.remove(self.orders[order_id])
+        super(LiveBlotter, self).cancel(order_id)
 
     def process_trade(self, trade_event):
 
@@ -102,25 +147,21 @@ class LiveBlotter(Blotter):
 
         # checks if is future contract
         if hasattr(trade_event, 'contract'):
-            sid = (trade_event.sid, trade_event.cotract)
+            sid = (trade_event.sid, trade_event.contract)
         else:
             sid = trade_event.sid
 
-        if sid in self.open_orders:
-            orders = self.open_orders[sid]
-            # sort orders by datetime, and filter out future dates
-            # lambda x: sort([order.dt for order in orders])
-
-        else:
+        if sid not in self.open_orders:
             return
 
-        for order, txn in self.get_transactions(trade_event, orders):
-            # check that not commission
-            order.filled += txn.amount
-            if order.amount - order.filled == 0:
-                order.status = ORDER_STATUS.FILLED
-            order.dt = txn.dt
-            print txn.__dict__
+        # fills were pushed by the broker as they happened, so only take
+        # the ones not seen yet, once per broker order.
+        fills = self.executions.fill_orders(
+            self.open_orders[sid],
+            ref_of=lambda order: self.group_of.get(order.id, order.id),
+            orders_of=lambda ref: self.order_groups.get(ref,
+                                                        [self.orders[ref]]))
+        for txn, order in fills:
             yield txn, order
 
         self.open_orders[sid] = \
@@ -134,11 +175,13 @@ class LiveExecution(IBClient):
        inherits from IBClient in the Medici fork of IbPy
     """
 
-    def __init__(self, call_msg):
+    def __init__(self, call_msg,
+                 max_messages_per_second=DEFAULT_MAX_PER_SECOND):
         super(LiveExecution, self).__init__(call_msg=call_msg)
-        self._blotter = LiveBlotter()
+        self.execution_queue = ExecutionQueue()
+        self._blotter = LiveBlotter(self.execution_queue,
+                                    max_messages_per_second)
         self._blotter.place_order = self.place_order
-        self._blotter.get_transactions = self.get_transactions
         self._blotter.cancel_order = self.cancel_order
         super(LiveExecution, self).__track_orders__()
 
@@ -146,128 +189,26 @@ class LiveExecution(IBClient):
     def blotter(self):
         return self._blotter
 
+    def execDetails(self, reqId, contract, execution):
+        # called from the connection's reader thread
+        self.execution_queue.put_execution(execution)
+        handler = getattr(super(LiveExecution, self), 'execDetails', None)
+        if handler is not None:
+            handler(reqId, contract, execution)
 
-    def __ib_to_aleph_sym_map__(self, contract):
-        decade = dt.date.today().strftime('%y')[0]
-        sym = contract.m_symbol
-        exp = contract.m_localSymbol.split(sym)[1]
-        exp = exp[0] + decade[0] + exp[1]
+    def orderStatus(self, orderId, status, filled, remaining, *args):
+        # called from the connection's reader thread
+        self.execution_queue.put_status(orderId, status, filled, remaining)
+        handler = getattr(super(LiveExecution, self), 'orderStatus', None)
+        if handler is not None:
+            handler(orderId, status, filled, remaining, *args)
 
-        return (sym, exp)
 
+    def __ib_to_aleph_sym_map__(self, contract):
+        return reconcile.contract_sid(contract)
 
     def total_cash(self):
-        cash = 0
-        for acct in self.account.child_accounts:
-            try:
-                cash += float([x.value for x in self.account_details(acct)
-                               if x.key == 'TotalCashValue'][0])
-            except:
-                return self.total_cash()
-
-        return cash
+        return reconcile.total_cash(self)
 
     def ib_portfolio(self):
-
-        portfolio_store = zp.Portfolio()
-        positions_store = zp.Positions()
-
-        for acct in self.account.child_accounts:
-            positions = self.portfolio(acct)
-            for pos in positions:
-                # Skip empty requests
-                if hasattr(pos, 'contract'):
-                    contract = pos.contract
-
-                    # determine position sid
-                    if contract.m_secType == 'STK':
-                        sid = contract.m_localSymbol
-                    if contract.m_secType == 'FUT':
-                        sid = self.__ib_to_aleph_sym_map__(contract)
-
-                    # if sid not in positions create a new position object
-                    if sid not in positions_store:
-                        if type(sid) is tuple:
-                            positions_store[sid] = zp.Position(sid[0], contract=sid[1])
-                        else:
-                            positions_store[sid] = zp.Position(sid)
-
-                        positions_store[sid].amount = pos.position_size
-                        positions_store[sid].last_sale_price = pos.market_price
-                        positions_store[sid].cost_basis = pos.avg_cost
-                    else:
-                        current_size = positions_store[sid].amount
-                        # adjust cost basis:
-                        # this should never result in a different value unless
-                        # IB doesn't enforce best execution
-                        positions_store[sid].amount += pos.position_size
-                        if positions_store[sid].amount != 0:
-                            mkt_value = positions_store[sid].cost_basis * current_size
-                            added_value = pos.avg_cost * pos.position_size
-                            positions_store[sid].cost_basis = (mkt_value + added_value) / \
-                                                              positions_store[sid].amount
-
-                    portfolio_store.positions_value += pos.market_value
-                    portfolio_store.pnl = pos.realized_pnl + pos.unrealized_pnl
-                    portfolio_store.positions = positions_store
-
-        return portfolio_store
-
-    def get_transactions(self, event, orders):
-        import time
-
-        time.sleep(1)
-        efilter = ExecutionFilter()
-        efilter.m_symbol = event.sid
-
-        for order in orders:
-
-            # Todo: I need to refactor how executions are summoned, this is currently a huge bottleneck
-            # cycle through all executions matching the event sid
-            for execution in self.executions(efilter):
-                prior_execution = None
-
-                # further filter out any executions not matching the order.id
-                if execution.m_orderRef == order.id:
-
-                    # prevent processing of duplicate executions
-                    if execution != prior_execution:
-                        order_status_vals = (0, 0)
-
-                        # cycle through the order status messages to get transaction details
-                        for status in self.order_status(execution.m_orderId):
-
-                            # filter out duplicate transaction messages
-                            if (status['remaining'], status['filled']) != order_status_vals:
-
-                                # get execution date
-                                date = dt.datetime.strptime(execution.m_time,
-                                                            '%Y%m%d %H:%M:%S').replace(tzinfo=pytz.utc)
-                                amount = status['filled'] - order_status_vals[1]
-
-                                txn = {'sid': event.sid,
-                                       'amount': int(amount),
-                                       'dt': date,
-                                       'price': status['lastFillPrice'],
-                                       'order_id': order.id}
-
-                                transaction = Transaction(**txn)
-                                order_status_vals = (status['remaining'], status['filled'])
-                                #TODO: pretty sure there is still transactions are being duplicated still
-                                if order.status == ORDER_STATUS.OPEN:
-                                    yield order, transaction
-
-                    prior_execution = execution
-
-
-
-
-
-
-
-
-
-
-
-
-
+        return reconcile.portfolio(self)
@@ -0,0 +1,179 @@
+"""
+Execution reports pushed by the broker, queued for the blotter.
+
+The broker connection calls put_execution and put_status from its reader
+thread as execDetails and orderStatus messages arrive. The blotter drains
+the fills of its open orders on each trade event, so it never sleeps or
+queries the broker, and each fill is read exactly once.
+
+Fills are keyed by the order's m_orderRef, which is the alephnull order
+id. Status messages only carry the broker's order id, so the blotter
+registers the broker id of each order it places.
+"""
+
+import datetime as dt
+import threading
+from collections import defaultdict, namedtuple
+
+import pytz
+
+from alephnull.finance.blotter import ORDER_STATUS
+from alephnull.finance.slippage import Transaction
+
+Fill = namedtuple('Fill', ['exec_id', 'order_ref', 'amount', 'price', 'dt'])
+
+OrderStatus = namedtuple('OrderStatus', ['status', 'filled', 'remaining'])
+
+# orderStatus values of orders that were cancelled or rejected
+CANCELLED_STATUSES = ('Cancelled', 'ApiCancelled', 'Inactive')
+
+
+def execution_dt(m_time):
+    # IB separates the date and time with one or two spaces
+    return dt.datetime.strptime(' '.join(m_time.split()),
+                                '%Y%m%d %H:%M:%S').replace(tzinfo=pytz.utc)
+
+
+class ExecutionQueue(object):
+    """
+    Thread-safe store of the undrained fills and latest status of each
+    order, keyed by order ref.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._fills = defaultdict(list)
+        self._statuses = {}
+        self._seen = set()
+        # broker order id => order ref
+        self._refs = {}
+        # statuses of broker order ids not registered yet
+        self._orphan_statuses = {}
+
+    def register(self, order_ref, order_id):
+        """
+        Map the broker's @order_id to @order_ref.
+        """
+        with self._lock:
+            self._refs[order_id] = order_ref
+            status = self._orphan_statuses.pop(order_id, None)
+            if status is not None:
+                self._statuses[order_ref] = status
+
+    def put_execution(self, execution):
+        """
+        Queue an IB Execution. Executions already queued, e.g. replayed
+        when the connection is re-established, are ignored.
+        """
+        shares = execution.m_shares
+        if execution.m_side == 'SLD':
+            shares = -shares
+        fill = Fill(execution.m_execId, execution.m_orderRef, int(shares),
+                    execution.m_price, execution_dt(execution.m_time))
+
+        with self._lock:
+            if fill.exec_id in self._seen:
+                return
+            self._seen.add(fill.exec_id)
+            self._refs.setdefault(execution.m_orderId, fill.order_ref)
+            self._fills[fill.order_ref].append(fill)
+
+    def put_status(self, order_id, status, filled, remaining):
+        with self._lock:
+            order_status = OrderStatus(status, filled, remaining)
+            order_ref = self._refs.get(order_id)
+            if order_ref is None:
+                self._orphan_statuses[order_id] = order_status
+            else:
+                self._statuses[order_ref] = order_status
+
+    def status(self, order_ref):
+        """
+        The latest OrderStatus of @order_ref, or None.
+        """
+        with self._lock:
+            return self._statuses.get(order_ref)
+
+    def has_fills(self, order_ref):
+        return order_ref in self._fills
+
+    def drain(self, order_ref):
+        """
+        Remove and return the queued fills of @order_ref, oldest first.
+        """
+        with self._lock:
+            return self._fills.pop(order_ref, [])
+
+    def allocate(self, order_ref, orders):
+        """
+        (order, Transaction) pairs for the queued fills of the broker order
+        @order_ref, which was sent for all of @orders. Each fill goes to
+        the first orders with an unfilled amount, in turn.
+        """
+        if not self.has_fills(order_ref):
+            return []
+
+        unfilled = [order.amount - order.filled for order in orders]
+        allocated = []
+        for fill in self.drain(order_ref):
+            left = fill.amount
+            for i, order in enumerate(orders):
+                if left == 0:
+                    break
+                if i == len(orders) - 1:
+                    amount = left
+                elif unfilled[i] * left > 0:
+                    amount = min(abs(unfilled[i]), abs(left))
+                    if left < 0:
+                        amount = -amount
+                else:
+                    continue
+                unfilled[i] -= amount
+                left -= amount
+                allocated.append((order, Transaction(
+                    sid=order.sid,
+                    amount=amount,
+                    dt=fill.dt,
+                    price=fill.price,
+                    order_id=order.id,
+                    contract=getattr(order, 'contract', None))))
+        return allocated
+
+    def transactions(self, order):
+        """
+        Transactions for the queued fills of @order.
+        """
+        return [txn for _, txn in self.allocate(order.id, [order])]
+
+    def fill_orders(self, open_orders, ref_of, orders_of):
+        """
+        (Transaction, order) pairs for the queued fills of @open_orders,
+        taken once per broker order. @ref_of(order) is the ref of the
+        broker order an order was sent as, and @orders_of(ref) the orders
+        sent as that ref.
+
+        Filled orders are marked FILLED, and the open orders of a broker
+        order that was cancelled, once its fills are drained, CANCELLED.
+        """
+        refs = []
+        for order in open_orders:
+            ref = ref_of(order)
+            if ref not in refs:
+                refs.append(ref)
+
+        for ref in refs:
+            orders = orders_of(ref)
+            for order, txn in self.allocate(ref, orders):
+                order.filled += txn.amount
+                if order.amount - order.filled == 0:
+                    order.status = ORDER_STATUS.FILLED
+                order.dt = txn.dt
+                yield txn, order
+
+            status = self.status(ref)
+            if status is not None and \
+                    status.status in CANCELLED_STATUSES and \
+                    not self.has_fills(ref):
+                for order in orders:
+                    if order.open:
+                        order.status = ORDER_STATUS.CANCELLED
@@ -0,0 +1,95 @@
+"""
+Startup reconciliation of an algorithm with its broker accounts.
+
+The cash and positions of every child account are requested concurrently,
+with bounded retries, and the positions of all accounts are merged into
+one Portfolio in a single pass. Works against anything with the IBClient
+account surface, e.g. LiveExecution or SimulatedBroker.
+"""
+
+import datetime as dt
+
+import alephnull.protocol as zp
+from alephnull.utils.concurrency import concurrent_map
+
+ACCOUNT_RETRIES = 3
+ACCOUNT_BACKOFF = 0.5
+MAX_WORKERS = 8
+
+
+def contract_sid(contract):
+    """
+    The alephnull sid of an IB contract: its symbol for stocks, and
+    (root, contract) for futures, e.g. ('CL', 'F14') for CLF4.
+    """
+    if contract.m_secType == 'FUT':
+        decade = dt.date.today().strftime('%y')[0]
+        sym = contract.m_symbol
+        exp = contract.m_localSymbol.split(sym)[1]
+        return (sym, exp[0] + decade + exp[1])
+    return contract.m_localSymbol
+
+
+def _for_accounts(broker, fetch):
+    return concurrent_map(fetch, broker.account.child_accounts,
+                          max_workers=MAX_WORKERS,
+                          retries=ACCOUNT_RETRIES,
+                          backoff=ACCOUNT_BACKOFF)
+
+
+def total_cash(broker):
+    """
+    Sum of the TotalCashValue of @broker's child accounts.
+    """
+    def cash(account):
+        values = [value.value for value in broker.account_details(account)
+                  if value.key == 'TotalCashValue']
+        if not values:
+            raise ValueError("No TotalCashValue for account {0}".format(
+                account))
+        return float(values[0])
+
+    return sum(_for_accounts(broker, cash))
+
+
+def merge_positions(account_positions, sid_for_contract=contract_sid):
+    """
+    One Portfolio from the portfolio positions of each account, with the
+    amounts of a sid held in several accounts summed, and its cost basis
+    the amount weighted average of theirs.
+    """
+    portfolio = zp.Portfolio()
+    positions = portfolio.positions
+
+    for account in account_positions:
+        for pos in account:
+            # skip empty responses
+            if not hasattr(pos, 'contract'):
+                continue
+            sid = sid_for_contract(pos.contract)
+
+            position = positions.get(sid)
+            if position is None:
+                position = positions[sid]
+                position.amount = pos.position_size
+                position.last_sale_price = pos.market_price
+                position.cost_basis = pos.avg_cost
+            else:
+                cost = position.cost_basis * position.amount + \
+                    pos.avg_cost * pos.position_size
+                position.amount += pos.position_size
+                if position.amount != 0:
+                    position.cost_basis = cost / position.amount
+
+            portfolio.positions_value += pos.market_value
+            portfolio.pnl += pos.realized_pnl + pos.unrealized_pnl
+
+    return portfolio
+
+
+def portfolio(broker, sid_for_contract=contract_sid):
+    """
+    The merged Portfolio of @broker's child accounts.
+    """
+    return merge_positions(_for_accounts(broker, broker.portfolio),
+                           sid_for_contract)
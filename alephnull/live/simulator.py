@@ -0,0 +1,364 @@
+"""
+In-process stand-in for the Interactive Brokers connection.
+
+SimulatedBroker implements the part of the IBClient surface LiveExecution
+uses (place_order, cancel_order, executions, order_status, portfolio,
+account_details and account.child_accounts), and pushes its execution and
+status messages into an ExecutionQueue as the broker callbacks do. A
+LiveBlotter sharing the queue sees simulated fills as it would real ones,
+so order handling can be benchmarked and regression tested on one
+machine::
+
+    broker = SimulatedBroker(prices={'AAPL': 500.0}, latency=0.05,
+                             fill_size=100)
+    broker.start()
+    ...
+    broker.stop()
+    broker.fill_latencies()
+
+Orders fill at the current price of their symbol, in fills of at most
+@fill_size shares, the first @latency seconds after the order is placed
+and each further fill @latency seconds after the last. Limit orders only
+fill while the price is at or better than the limit; all other order
+types fill as market orders. Orders for which @reject returns True are
+rejected with an 'Inactive' status.
+
+Without start, nothing fills until process is called, which makes tests
+deterministic.
+"""
+
+import datetime as dt
+import heapq
+import itertools
+import threading
+import time
+
+import numpy as np
+
+from alephnull.live.executions import ExecutionQueue
+
+
+class Execution(object):
+    """
+    The fields of an ib.ext.Execution that are read downstream.
+    """
+
+    def __init__(self, exec_id, order_id, order_ref, side, shares, price,
+                 time, acct_number):
+        self.m_execId = exec_id
+        self.m_orderId = order_id
+        self.m_orderRef = order_ref
+        self.m_side = side
+        self.m_shares = shares
+        self.m_price = price
+        self.m_time = time
+        self.m_acctNumber = acct_number
+
+
+class AccountValue(object):
+
+    def __init__(self, key, value, currency='USD', account=None):
+        self.key = key
+        self.value = value
+        self.currency = currency
+        self.account = account
+
+
+class PortfolioPosition(object):
+
+    def __init__(self, contract, position_size, market_price, avg_cost,
+                 realized_pnl):
+        self.contract = contract
+        self.position_size = position_size
+        self.market_price = market_price
+        self.market_value = position_size * market_price
+        self.avg_cost = avg_cost
+        self.realized_pnl = realized_pnl
+        self.unrealized_pnl = position_size * (market_price - avg_cost)
+
+
+class Account(object):
+
+    def __init__(self, child_accounts):
+        self.child_accounts = list(child_accounts)
+
+
+class SimulatedOrder(object):
+
+    def __init__(self, order_id, contract, ib_order, placed):
+        self.order_id = order_id
+        self.contract = contract
+        self.ib_order = ib_order
+        self.placed = placed
+        self.amount = abs(int(ib_order.m_totalQuantity))
+        self.side = 'BOT' if ib_order.m_action == 'BUY' else 'SLD'
+        self.filled = 0
+        self.last_fill_price = 0.0
+        self.status = 'Submitted'
+
+    @property
+    def remaining(self):
+        return self.amount - self.filled
+
+    @property
+    def open(self):
+        return self.status in ('PreSubmitted', 'Submitted')
+
+    def limit_allows(self, price):
+        if self.ib_order.m_orderType != 'LMT':
+            return True
+        if self.side == 'BOT':
+            return price <= self.ib_order.m_lmtPrice
+        return price >= self.ib_order.m_lmtPrice
+
+
+def _position_key(contract):
+    return (contract.m_symbol, getattr(contract, 'm_expiry', None) or None)
+
+
+class SimulatedBroker(object):
+
+    def __init__(self, prices=None, latency=0.0, fill_size=None, reject=None,
+                 cash=1000000.0, accounts=('SIM0001',), execution_queue=None,
+                 clock=time.time):
+        if fill_size is not None and fill_size < 1:
+            raise ValueError(
+                "fill_size must be at least 1, not {0!r}".format(fill_size))
+        if execution_queue is None:
+            execution_queue = ExecutionQueue()
+        self.execution_queue = execution_queue
+
+        self.prices = dict(prices or {})
+        self.latency = latency
+        self.fill_size = fill_size
+        self.reject = reject
+        self.clock = clock
+
+        self.account = Account(accounts)
+        self.cash = float(cash)
+        # (symbol, expiry) => [contract, amount, avg_cost, realized_pnl]
+        self.positions = {}
+
+        self.orders = {}
+        self._order_ids = itertools.count(1)
+        self._exec_ids = itertools.count(1)
+        # (contract, Execution) of every fill, in order
+        self._executions = []
+        self._statuses = {}
+        self._latencies = []
+
+        # heap of (due, order_id) of the next fill of each open order
+        self._schedule = []
+        # ids of orders waiting for a price they can fill at
+        self._parked = set()
+        self._lock = threading.RLock()
+        self._wakeup = threading.Condition(self._lock)
+        self._thread = None
+        self._running = False
+
+    # IBClient surface
+
+    def place_order(self, contract, ib_order):
+        with self._lock:
+            now = self.clock()
+            order = SimulatedOrder(next(self._order_ids), contract, ib_order,
+                                   now)
+            self.orders[order.order_id] = order
+
+            if self.reject is not None and self.reject(contract, ib_order):
+                order.status = 'Inactive'
+            elif order.amount == 0:
+                order.status = 'Filled'
+            else:
+                self._schedule_fill(order, now)
+
+            self._send_status(order)
+            return order.order_id
+
+    def cancel_order(self, order_id):
+        with self._lock:
+            order = self.orders.get(order_id)
+            if order is None or not order.open:
+                return
+            order.status = 'Cancelled'
+            self._send_status(order)
+
+    def executions(self, efilter=None):
+        symbol = getattr(efilter, 'm_symbol', None)
+        with self._lock:
+            return [execution for contract, execution in self._executions
+                    if symbol is None or contract.m_symbol == symbol]
+
+    def order_status(self, order_id):
+        with self._lock:
+            return list(self._statuses.get(order_id, []))
+
+    def portfolio(self, acct):
+        with self._lock:
+            if acct != self.account.child_accounts[0]:
+                return []
+            positions = []
+            for key, (contract, amount, avg_cost, realized) in \
+                    self.positions.iteritems():
+                price = self.prices.get(key[0], avg_cost)
+                positions.append(PortfolioPosition(contract, amount, price,
+                                                   avg_cost, realized))
+            return positions
+
+    def account_details(self, acct):
+        with self._lock:
+            cash = self.cash if acct == self.account.child_accounts[0] \
+                else 0.0
+            return [AccountValue('TotalCashValue', str(cash), account=acct)]
+
+    # simulation
+
+    def set_price(self, symbol, price):
+        with self._lock:
+            self.prices[symbol] = price
+            now = self.clock()
+            for order_id in self._parked:
+                heapq.heappush(self._schedule, (now, order_id))
+            self._parked.clear()
+            self._wakeup.notify()
+
+    def _schedule_fill(self, order, now):
+        heapq.heappush(self._schedule, (now + self.latency, order.order_id))
+        self._wakeup.notify()
+
+    def _send_status(self, order):
+        status = {'status': order.status,
+                  'filled': order.filled,
+                  'remaining': order.remaining,
+                  'lastFillPrice': order.last_fill_price}
+        self._statuses.setdefault(order.order_id, []).append(status)
+        self.execution_queue.put_status(order.order_id, order.status,
+                                        order.filled, order.remaining)
+
+    def _fill(self, order, now):
+        price = self.prices.get(order.contract.m_symbol)
+        if price is None or not order.limit_allows(price):
+            # parked until the price moves
+            return False
+
+        shares = order.remaining
+        if self.fill_size is not None:
+            shares = min(shares, self.fill_size)
+
+        execution = Execution(
+            exec_id='{0:08d}.01'.format(next(self._exec_ids)),
+            order_id=order.order_id,
+            order_ref=order.ib_order.m_orderRef,
+            side=order.side,
+            shares=shares,
+            price=price,
+            time=dt.datetime.utcfromtimestamp(now).strftime(
+                '%Y%m%d  %H:%M:%S'),
+            acct_number=self.account.child_accounts[0])
+        self._executions.append((order.contract, execution))
+        self._latencies.append(now - order.placed)
+
+        amount = shares if order.side == 'BOT' else -shares
+        self._update_position(order.contract, amount, price)
+        self.cash -= amount * price
+
+        order.filled += shares
+        order.last_fill_price = price
+        if order.remaining == 0:
+            order.status = 'Filled'
+
+        self.execution_queue.put_execution(execution)
+        self._send_status(order)
+        return True
+
+    def _update_position(self, contract, amount, price):
+        key = _position_key(contract)
+        if key not in self.positions:
+            if not getattr(contract, 'm_localSymbol', None):
+                # as IB names them, e.g. CLF4 for the F14 contract
+                symbol, expiry = key
+                contract.m_localSymbol = symbol if expiry is None \
+                    else symbol + expiry[0] + expiry[-1]
+            self.positions[key] = [contract, 0, 0.0, 0.0]
+        position = self.positions[key]
+        _, old_amount, avg_cost, realized = position
+
+        new_amount = old_amount + amount
+        if old_amount == 0 or (old_amount > 0) == (amount > 0):
+            # adding to the position
+            avg_cost = (avg_cost * old_amount + price * amount) / new_amount
+        else:
+            closed = min(abs(amount), abs(old_amount))
+            realized += closed * (price - avg_cost) * np.sign(old_amount)
+            if new_amount == 0:
+                avg_cost = 0.0
+            elif (new_amount > 0) != (old_amount > 0):
+                # flipped through flat
+                avg_cost = price
+        position[1:] = [new_amount, avg_cost, realized]
+
+    def process(self, now=None):
+        """
+        Make the fills due by @now, defaulting to the clock. Returns the
+        number of fills made.
+        """
+        fills = 0
+        with self._lock:
+            if now is None:
+                now = self.clock()
+            while self._schedule and self._schedule[0][0] <= now:
+                due, order_id = heapq.heappop(self._schedule)
+                order = self.orders[order_id]
+                if not order.open:
+                    continue
+                if not self._fill(order, now):
+                    self._parked.add(order_id)
+                    continue
+                fills += 1
+                if order.open:
+                    heapq.heappush(self._schedule,
+                                   (now + self.latency, order_id))
+        return fills
+
+    def start(self):
+        """
+        Make fills from a background thread as they come due.
+        """
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._running = True
+            self._thread = threading.Thread(target=self._run)
+            self._thread.daemon = True
+            self._thread.start()
+
+    def stop(self):
+        with self._lock:
+            self._running = False
+            self._wakeup.notify()
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            thread.join()
+
+    def _run(self):
+        with self._lock:
+            while self._running:
+                self.process()
+                timeout = None
+                if self._schedule:
+                    timeout = max(self._schedule[0][0] - self.clock(), 0.001)
+                self._wakeup.wait(timeout)
+
+    def idle(self):
+        """
+        Whether no open order is waiting to fill.
+        """
+        with self._lock:
+            return not any(order.open for order in self.orders.itervalues())
+
+    def fill_latencies(self):
+        """
+        Seconds from placing each order to each of its fills.
+        """
+        with self._lock:
+            return np.array(self._latencies)
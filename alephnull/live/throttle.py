@@ -0,0 +1,218 @@
+"""
+Outbound order queue for the live blotter.
+
+Orders and cancels are queued and sent to the broker from a background
+thread, at most @max_per_second messages a second, so placing an order
+returns as soon as it is queued however slow the connection is.
+
+Orders placed in the same bar for the same sid, direction, type and
+prices are coalesced while they wait: the later ones are added to the
+quantity of the queued broker order instead of being sent on their own.
+A coalesced broker order carries the order ref of its first order, and
+its fills are shared out among its orders in the order they were placed.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+from logbook import Logger
+
+log = Logger('Throttle')
+
+DEFAULT_MAX_PER_SECOND = 50
+
+
+class QueuedOrder(object):
+
+    def __init__(self, ref, contract, ib_order, amount):
+        self.ref = ref
+        self.contract = contract
+        self.ib_order = ib_order
+        # order ref => signed amount of each coalesced order
+        self.amounts = OrderedDict([(ref, amount)])
+
+    def add(self, ref, amount):
+        self.amounts[ref] = amount
+        self._set_quantity()
+
+    def remove(self, ref):
+        del self.amounts[ref]
+        self._set_quantity()
+
+    def _set_quantity(self):
+        self.ib_order.m_totalQuantity = sum(abs(amount) for amount
+                                            in self.amounts.itervalues())
+
+
+class OrderThrottle(object):
+    """
+    Sends orders with @send(contract, ib_order), which returns the broker
+    order id, and cancels with @cancel(order_id). @on_sent(ref, order_id)
+    is called, from the dispatch thread, once a queued order is sent.
+    """
+
+    def __init__(self, send, cancel, on_sent=None,
+                 max_per_second=DEFAULT_MAX_PER_SECOND, clock=time.time):
+        self.send = send
+        self.cancel_order = cancel
+        self.on_sent = on_sent
+        self.interval = 1.0 / max_per_second
+        self.clock = clock
+
+        # coalescing key => QueuedOrder, in the order they were queued
+        self._orders = OrderedDict()
+        # order ref => coalescing key, of queued orders
+        self._keys = {}
+        self._cancels = []
+        # order ref => broker order id, of sent orders
+        self.sent = {}
+        # refs of the order being sent, and those of them cancelled since
+        self._in_flight = ()
+        self._cancel_on_send = set()
+
+        self._next_send = 0.0
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._thread = None
+        self._running = False
+        self._busy = False
+
+    def submit(self, key, ref, contract, ib_order, amount, on_queued=None):
+        """
+        Queue @ib_order for the order @ref, coalescing it with a queued
+        order with the same @key. Returns the ref of the broker order it
+        will be sent as, which is also passed to @on_queued while the
+        order can't be sent yet.
+        """
+        with self._lock:
+            queued = self._orders.get(key)
+            if queued is None:
+                queued = self._orders[key] = QueuedOrder(ref, contract,
+                                                         ib_order, amount)
+            else:
+                queued.add(ref, amount)
+            self._keys[ref] = key
+            if on_queued is not None:
+                on_queued(queued.ref)
+            self._wakeup.notify_all()
+            return queued.ref
+
+    def cancel(self, ref):
+        """
+        Cancel the order @ref. Returns True if it was still queued, and
+        was simply taken out of its broker order. Otherwise the whole
+        broker order it was sent as is cancelled.
+        """
+        with self._lock:
+            key = self._keys.pop(ref, None)
+            if key is not None:
+                queued = self._orders[key]
+                queued.remove(ref)
+                if not queued.amounts:
+                    del self._orders[key]
+                return True
+
+            if ref in self._in_flight:
+                self._cancel_on_send.add(ref)
+                return False
+
+            order_id = self.sent.get(ref)
+            if order_id is not None:
+                self._cancels.append(order_id)
+                self._wakeup.notify_all()
+            return False
+
+    def pending(self):
+        with self._lock:
+            return len(self._orders) + len(self._cancels)
+
+    def _next_message(self):
+        if self._cancels:
+            return 'cancel', self._cancels.pop(0)
+        key, queued = self._orders.popitem(last=False)
+        for ref in queued.amounts:
+            del self._keys[ref]
+        self._in_flight = tuple(queued.amounts)
+        return 'order', queued
+
+    def dispatch(self):
+        """
+        Send the next queued message if the rate allows. Returns the number
+        of seconds until the next message may be sent, or None when the
+        queue is empty.
+        """
+        with self._lock:
+            if not self._orders and not self._cancels:
+                return None
+            now = self.clock()
+            if now < self._next_send:
+                return self._next_send - now
+            self._next_send = now + self.interval
+            kind, message = self._next_message()
+            self._busy = True
+
+        try:
+            # the broker may block, so send without holding the lock
+            if kind == 'cancel':
+                self.cancel_order(message)
+            else:
+                order_id = self.send(message.contract, message.ib_order)
+                with self._lock:
+                    for ref in message.amounts:
+                        self.sent[ref] = order_id
+                    if self._cancel_on_send.intersection(message.amounts):
+                        self._cancels.append(order_id)
+                    self._cancel_on_send.clear()
+                if self.on_sent is not None:
+                    self.on_sent(message.ref, order_id)
+        except Exception:
+            log.exception("Failed to send {0}".format(kind))
+        finally:
+            with self._lock:
+                self._busy = False
+                self._in_flight = ()
+                self._wakeup.notify_all()
+        return 0.0
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._running = True
+            self._thread = threading.Thread(target=self._run)
+            self._thread.daemon = True
+            self._thread.start()
+
+    def stop(self):
+        with self._lock:
+            self._running = False
+            self._wakeup.notify_all()
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            thread.join()
+
+    def _run(self):
+        while True:
+            wait = self.dispatch()
+            with self._lock:
+                if not self._running:
+                    return
+                if wait is None and not (self._orders or self._cancels):
+                    self._wakeup.wait()
+                elif wait:
+                    self._wakeup.wait(wait)
+
+    def flush(self, timeout=None):
+        """
+        Wait until every queued message was sent. Returns whether it was.
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        with self._lock:
+            while self._orders or self._cancels or self._busy:
+                remaining = None if deadline is None \
+                    else deadline - time.time()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._wakeup.wait(remaining)
+            return True
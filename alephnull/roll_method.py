@@ -1,55 +1,370 @@
+"""
+
+Rolling
+=======
+
+Keeps an algorithm in the front month of each futures root.
+
+The contracts seen for a root form a ContractChain, ordered by delivery
+month, which holds the latest value of each field the roll rule looks at
+in a numpy array. A RollRule picks the front month from the chain:
+
+    * VolumeRoll: the live contract with the largest volume.
+    * OpenInterestRoll: the live contract with the largest open interest.
+    * CalendarRoll: the nearest contract until @days_before_expiry days
+      before its first notice (or expiration), then the next.
+
+A contract is live until its first notice day. The front month of a chain
+is kept until the chain gets new data, or, for calendar rolls, until the
+next roll date, so bars that don't touch a root cost nothing.
+
+Decorate handle_data with roll to trade the front months::
+
+    class FrontTrader(TradingAlgorithm):
+        @roll('open_interest')
+        def handle_data(self, data):
+            for root in data:
+                self.order((root, data[root]['contract']), 2)
+
+handle_data then gets one SIDData per root, that of its front month, and
+positions left in other contracts of the root are rolled into the front
+month.
+
+"""
+
+from datetime import timedelta
+
+import numpy as np
 import pandas as pd
-from pandas import Series, DataFrame
 
-from alephnull.protocol import BarData, SIDData
+from alephnull.finance.contracts import delivery_month, get_contract_specs
+from alephnull.protocol import BarData
+
+# sorts contracts without a delivery month after all others
+NO_DATE = np.iinfo(np.int64).max
+MIN_DATE = np.iinfo(np.int64).min
+
+
+class ContractChain(object):
+    """
+    The contracts of one root, in delivery order, with the latest values of
+    @fields for each.
+    """
+
+    def __init__(self, root, fields=(), contract_specs=None):
+        if contract_specs is None:
+            contract_specs = get_contract_specs()
+        self.contract_specs = contract_specs
+        self.root = root
+        self.fields = tuple(fields)
+
+        self.contracts = []
+        self.index = {}
+        self.values = dict((field, np.zeros(0)) for field in self.fields)
+        # midnight of the day each contract stops being live, as an int64
+        self.last_days = np.zeros(0, dtype=np.int64)
+        # the SIDData last read for each contract
+        self._seen = {}
+        self.dirty = False
+
+    def __len__(self):
+        return len(self.contracts)
+
+    def _delivery_key(self, contract):
+        month = delivery_month(contract)
+        return (month.value if month is not None else NO_DATE, contract)
+
+    def _last_day(self, contract):
+        sid = (self.root, contract)
+        last_day = self.contract_specs.first_notice(sid)
+        if last_day is None:
+            last_day = self.contract_specs.expiration(sid)
+        if last_day is None:
+            return NO_DATE
+        return pd.Timestamp(last_day).value
+
+    def add(self, contract):
+        """
+        Insert @contract in delivery order. Contracts are listed rarely, so
+        the arrays are simply rebuilt.
+        """
+        old_index = self.index
+        self.contracts = sorted(self.contracts + [contract],
+                                key=self._delivery_key)
+        self.index = dict((c, i) for i, c in enumerate(self.contracts))
+
+        order = [old_index.get(c, -1) for c in self.contracts]
+        for field in self.fields:
+            old = np.append(self.values[field], np.nan)
+            self.values[field] = old[order]
+        self.last_days = np.array([self._last_day(c) for c in self.contracts],
+                                  dtype=np.int64)
+        self.dirty = True
+
+    def update(self, contract, sid_data):
+        """
+        Read the fields of the bar @sid_data of @contract. Returns whether
+        the bar was new.
+        """
+        if self._seen.get(contract) is sid_data:
+            return False
+        self._seen[contract] = sid_data
+
+        if contract not in self.index:
+            self.add(contract)
+        i = self.index[contract]
+        for field in self.fields:
+            value = sid_data.__dict__.get(field)
+            self.values[field][i] = np.nan if value is None else value
+        self.dirty = True
+        return True
+
+    def live(self, dt):
+        """
+        Mask of the contracts before their first notice day at @dt.
+        """
+        if dt is None:
+            return np.ones(len(self.contracts), dtype=bool)
+        return self.last_days > pd.Timestamp(dt).value
+
+    def live_matrix(self, dts):
+        """
+        live for each of the int64 @dts, as a dts x contracts mask.
+        """
+        return self.last_days[np.newaxis, :] > np.asarray(dts)[:, np.newaxis]
+
+
+class RollRule(object):
+    """
+    Picks the front month of a ContractChain.
+
+    @fields are the bar fields the rule needs the chain to keep.
+    """
+
+    fields = ()
+
+    def front_month(self, chain, dt):
+        """
+        The front month contract of @chain at @dt.
+        """
+        dts = np.array([MIN_DATE if dt is None else pd.Timestamp(dt).value])
+        values = [chain.values[field][np.newaxis, :] for field in self.fields]
+        return chain.contracts[self.schedule(chain, dts, *values)[0]]
+
+    def schedule(self, chain, dts, *values):
+        """
+        The index in @chain of the front month at each of the int64 @dts,
+        given the dts x contracts arrays of @fields at those dts.
+        """
+        raise NotImplementedError
+
+    def valid_until(self, chain, dt):
+        """
+        The int64 dt until which the front month of @chain stays the same,
+        absent new data.
+        """
+        live = chain.last_days[chain.live(dt)]
+        return live.min() if len(live) else NO_DATE
+
+
+class FieldRoll(RollRule):
+    """
+    Front month is the live contract with the largest @field. When all
+    contracts are past first notice, all are considered.
+    """
+
+    def __init__(self, field):
+        self.field = field
+        self.fields = (field,)
+
+    def __repr__(self):
+        return "{0}({1!r})".format(self.__class__.__name__, self.field)
 
+    def schedule(self, chain, dts, values):
+        live = chain.live_matrix(dts)
+        live[~live.any(axis=1)] = True
+
+        known = live & ~np.isnan(values)
+        front = np.where(known, values, -np.inf).argmax(axis=1)
+        missing = ~known.any(axis=1)
+        front[missing] = live[missing].argmax(axis=1)
+        return front
+
+
+class VolumeRoll(FieldRoll):
+
+    def __init__(self):
+        super(VolumeRoll, self).__init__('volume')
+
+    def __repr__(self):
+        return "VolumeRoll()"
+
+
+class OpenInterestRoll(FieldRoll):
+
+    def __init__(self):
+        super(OpenInterestRoll, self).__init__('open_interest')
+
+    def __repr__(self):
+        return "OpenInterestRoll()"
+
+
+class CalendarRoll(RollRule):
+    """
+    Front month is the nearest contract until @days_before_expiry days
+    before its last day.
+    """
+
+    def __init__(self, days_before_expiry=5):
+        self.days_before_expiry = days_before_expiry
+        self.offset = timedelta(days=days_before_expiry)
+        self._offset_ns = days_before_expiry * 24 * 60 * 60 * 10 ** 9
+
+    def __repr__(self):
+        return "CalendarRoll({0})".format(self.days_before_expiry)
+
+    def _cutoff(self, dt):
+        return None if dt is None else dt + self.offset
+
+    def schedule(self, chain, dts):
+        live = chain.live_matrix(np.asarray(dts) + self._offset_ns)
+        front = live.argmax(axis=1)
+        front[~live.any(axis=1)] = len(chain) - 1
+        return front
+
+    def valid_until(self, chain, dt):
+        until = super(CalendarRoll, self).valid_until(chain,
+                                                      self._cutoff(dt))
+        if until == NO_DATE:
+            return until
+        return until - self._offset_ns
+
+
+ROLL_RULES = {
+    'volume': VolumeRoll,
+    'open_interest': OpenInterestRoll,
+    'calendar': CalendarRoll,
+}
+
+
+def get_roll_rule(rule):
+    """
+    The RollRule for @rule, a RollRule or one of the names in ROLL_RULES.
+    """
+    if isinstance(rule, basestring):
+        try:
+            rule = ROLL_RULES[rule]()
+        except KeyError:
+            raise ValueError(
+                "Unknown roll rule {0!r}, expected one of {1}".format(
+                    rule, sorted(ROLL_RULES)))
+    if not isinstance(rule, RollRule):
+        raise TypeError(
+            "Roll rule must be a RollRule or one of {0}, not {1!r}".format(
+                sorted(ROLL_RULES), rule))
+    return rule
+
+
+class Roller(object):
+    """
+    Tracks the front month of each root, and rolls positions into it.
+    """
+
+    def __init__(self, rule, contract_specs=None):
+        self.rule = get_roll_rule(rule)
+        self.contract_specs = contract_specs
+        self.chains = {}
+        self.front_months = {}
+        # root => int64 dt the front month is good until
+        self._valid_until = {}
+
+    def chain(self, root):
+        try:
+            return self.chains[root]
+        except KeyError:
+            chain = self.chains[root] = ContractChain(
+                root, self.rule.fields, self.contract_specs)
+            return chain
+
+    def update(self, data, dt):
+        """
+        Read the futures bars in @data, a BarData of root => {contract:
+        SIDData}, and return the front month of each root.
+        """
+        now = NO_DATE if dt is None else pd.Timestamp(dt).value
+        for root in data.keys():
+            contracts = data[root]
+            if not isinstance(contracts, dict):
+                continue
+            chain = self.chain(root)
+            for contract, sid_data in contracts.iteritems():
+                chain.update(contract, sid_data)
+
+            if chain.dirty or now >= self._valid_until.get(root, NO_DATE):
+                self.front_months[root] = self.rule.front_month(chain, dt)
+                self._valid_until[root] = self.rule.valid_until(chain, dt)
+                chain.dirty = False
+
+        return self.front_months
+
+    def front_month_data(self, data):
+        """
+        BarData with the SIDData of the front month of each root in @data.
+        """
+        bar_data = BarData()
+        for root in data.keys():
+            contracts = data[root]
+            if not isinstance(contracts, dict):
+                bar_data[root] = contracts
+                continue
+            front_month = self.front_months.get(root)
+            if front_month in contracts:
+                bar_data[root] = contracts[front_month]
+        return bar_data
+
+    def roll(self, algo):
+        """
+        Order @algo's positions, net of open orders, out of contracts that
+        aren't the front month of their root and into the front month.
+        """
+        open_orders = algo.blotter.open_orders
+        for sid, position in algo.portfolio.positions.iteritems():
+            if type(sid) is not tuple:
+                continue
+            root, contract = sid
+            front_month = self.front_months.get(root)
+            if front_month is None or contract == front_month:
+                continue
+
+            stack = position.amount
+            if sid in open_orders:
+                stack += sum(order.amount - order.filled
+                             for order in open_orders[sid])
+            if stack != 0:
+                algo.order(sid, -stack)
+                algo.order((root, front_month), stack)
+
+
+def roll(rule):
+    """
+    Decorate handle_data to trade the front months picked by @rule, a
+    RollRule or one of the names in ROLL_RULES.
+    """
+    rule = get_roll_rule(rule)
 
-def roll(logic):
     def wrap(func):
+        roller_attr = '_roller_' + func.__name__
+
         def modified_func(self, data):
-            positions = self.portfolio.positions
-            frames = {}
-            for sym in data.keys():
-                frames[sym] = DataFrame({k: Series(v.__dict__) for
-                                         k, v in data[sym].iteritems()})
-
-            all_ = pd.concat(frames, axis=1).T
-            try:
-                all_ = all_.groupby(axis=0, level=0).apply(logic).reset_index(
-                    level=(0, 2), drop=True)
-            except:
-                all_ = all_.groupby(axis=0, level=0).apply(logic)
-
-
-            #Todo: handle multiple contract returns
-            all_ = all_.groupby(axis=0, level=0).agg(lambda x: x.max())
-
-            #Todo: Data should be reconstructed into BarData object
-            data = all_.T.to_dict()
-
-            front_months = [(sym, all_.ix[sym]['contract']) for sym in all_.index]
-            back_months = [sym for sym in self.perf_tracker.get_portfolio().positions
-                           if sym not in front_months]
-
-            offsets = {}
-            for sym in back_months:
-                offsets[sym] = 0
-                for order_id in self.get_orders(sym):
-                    order = self.blotter.orders[order_id]
-                    if order.status != 3:
-                        offsets[sym] += (order.amount - order.filled)
-                stack = self.perf_tracker.get_portfolio().positions[sym].amount + offsets[sym]
-                if stack != 0:
-                    self.order(sym, -stack)
-                    [self.order(exp, stack) for exp in front_months if exp[0] == sym[0]]
-
-            bar_data = BarData()
-            bar_data.__dict__['_data'].update({k: SIDData(v) for k, v in data.iteritems()})
-
-            return func(self, bar_data)
+            roller = getattr(self, roller_attr, None)
+            if roller is None:
+                roller = Roller(rule)
+                setattr(self, roller_attr, roller)
+
+            roller.update(data, self.datetime)
+            roller.roll(self)
+            return func(self, roller.front_month_data(data))
 
         return modified_func
 
     return wrap
-
-
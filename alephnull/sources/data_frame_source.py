@@ -17,6 +17,7 @@
 """
 Tools to generate data sources.
 """
+import numpy as np
 import pandas as pd
 
 from alephnull.gens.utils import hash_args
@@ -65,6 +66,12 @@ class DataFrameSource(DataSource):
     def instance_hash(self):
         return self.arg_string
 
+    @property
+    def event_dts(self):
+        # one event per selected sid on every row
+        per_row = len([sid for sid in self.data.columns if sid in self.sids])
+        return np.repeat(self.data.index.asi8, per_row)
+
     def raw_data_gen(self):
         for dt, series in self.data.iterrows():
             for sid, price in series.iterkv():
@@ -133,6 +140,12 @@ class DataPanelSource(DataSource):
     def instance_hash(self):
         return self.arg_string
 
+    @property
+    def event_dts(self):
+        # one event per selected sid on every bar
+        per_bar = len([sid for sid in self.data.items if sid in self.sids])
+        return np.repeat(self.data.major_axis.asi8, per_bar)
+
     def raw_data_gen(self):
         for dt in self.data.major_axis:
             df = self.data.major_xs(dt)
@@ -31,6 +31,15 @@ class DataSource(object):
         """
         NotImplemented
 
+    @property
+    def event_dts(self):
+        """
+        An int64 array holding the nanosecond timestamp of each event
+        raw_data will yield, in the same order. Sources that can't
+        know this without generating their events return None.
+        """
+        return None
+
     @abstractproperty
     def instance_hash(self):
         """
@@ -1,9 +1,17 @@
+import numpy as np
 import pandas as pd
 
 from alephnull.gens.utils import hash_args
 
 from alephnull.sources.data_source import DataSource
 
+# metric => conversion applied to its column, once
+METRICS = {
+    'price': float,
+    'volume': int,
+    'open_interest': int,
+}
+
 
 class FuturesDataFrameSource(DataSource):
     """
@@ -32,49 +40,138 @@ class FuturesDataFrameSource(DataSource):
         # etc...                                                                                        #
         #################################################################################################
 
+        sids : optional list of the contracts to emit, as (root, contract)
+        tuples or 'root.contract' strings. Defaults to all contracts.
+
+        continuous : optional DataFrame of one column per root, indexed like
+        data, e.g. from alephnull.data.continuous.load_continuous. Its value
+        is added to the events of the root as the 'continuous' field.
+
+        The frame is split into one column of values per (root, contract)
+        slot and metric up front, so generating events does no per-cell
+        work beyond building the event.
         """
         assert isinstance(data.index, pd.tseries.index.DatetimeIndex)
 
         self.data = data
-        # Unpack config dictionary with default values.
-        self.sids = kwargs.get('sids', list(set(['.'.join(tup[:2]) for tup in data.columns])))
         self.start = kwargs.get('start', data.index[0])
         self.end = kwargs.get('end', data.index[-1])
 
         # Hash_value for downstream sorting.
         self.arg_string = hash_args(data, **kwargs)
 
+        self.continuous = kwargs.get('continuous')
+
+        # (root, contract) of each slot, in column order
+        self.slots = []
+        for column in data.columns:
+            if column[:2] not in self.slots:
+                self.slots.append(column[:2])
+
+        sids = kwargs.get('sids')
+        if sids is not None:
+            wanted = set(sid if type(sid) is tuple
+                         else tuple(sid.split('.', 1)) for sid in sids)
+            self.slots = [slot for slot in self.slots if slot in wanted]
+        self.sids = ['.'.join(slot) for slot in self.slots]
+
+        # metric => rows x slots array, and which slots have the metric
+        index = dict((slot, j) for j, slot in enumerate(self.slots))
+        self.metric_values = {}
+        self.has_metric = {}
+        for (root, contract, metric), column in data.iteritems():
+            j = index.get((root, contract))
+            if j is None:
+                continue
+            if metric not in self.metric_values:
+                self.metric_values[metric] = np.empty(
+                    (len(data.index), len(self.slots)))
+                self.metric_values[metric].fill(np.nan)
+                self.has_metric[metric] = np.zeros(len(self.slots),
+                                                   dtype=bool)
+            self.metric_values[metric][:, j] = column.values
+            self.has_metric[metric][j] = True
+
         self._raw_data = None
 
     @property
     def mapping(self):
-        return {
+        mapping = {
             'dt': (lambda x: x, 'dt'),
-            'sid': (lambda x: x[:x.find(".")], 'sid'),
-            'contract': (lambda x: x[x.find(".") + 1:], 'sid'),
-            'price': (float, 'price'),
-            'volume': (int, 'volume'),
-            'open_interest': (int, 'open_interest'),
+            'sid': (lambda x: x, 'sid'),
+            'contract': (lambda x: x, 'contract'),
         }
+        for metric, convert in METRICS.iteritems():
+            mapping[metric] = (convert, metric)
+        if self.continuous is not None:
+            mapping['continuous'] = (float, 'continuous')
+        return mapping
+
+    def apply_mapping(self, raw_row):
+        # raw rows are converted column by column in raw_data_gen
+        raw_row.update({'source_id': self.get_hash(),
+                        'type': self.event_type})
+        return raw_row
 
     @property
     def instance_hash(self):
         return self.arg_string
 
+    @property
+    def event_dts(self):
+        # one event per selected (underlying, expiry) on every row
+        return np.repeat(self.data.index.asi8, len(self.slots))
+
+    def _columns(self):
+        """
+        For each slot, the (field, values) pairs of its events, with values
+        converted to python scalars.
+        """
+        continuous = None
+        if self.continuous is not None:
+            continuous = self.continuous.reindex(self.data.index)
+
+        columns = []
+        for j, (root, contract) in enumerate(self.slots):
+            fields = []
+            for metric, convert in METRICS.iteritems():
+                if metric not in self.metric_values or \
+                        not self.has_metric[metric][j]:
+                    continue
+                values = self.metric_values[metric][:, j]
+                if convert is int and not np.isnan(values).any():
+                    values = values.astype(np.int64)
+                fields.append((metric, values.tolist()))
+            if continuous is not None:
+                fields.append(('continuous',
+                               continuous[root].values.astype(float).tolist()))
+            columns.append((root, contract, fields))
+        return columns
+
     def raw_data_gen(self):
-        for dt, series in self.data.iterrows():
-            events = {}
-            for (underlying, exp, metric), value in series.iterkv():
-                sid = '.'.join([underlying, exp])
-                if sid in self.sids:
-                    if sid not in events:
-                        events[sid] = {'dt': dt, 'sid': sid}
-                    events[sid][metric] = value
-            for event in events.itervalues():
+        columns = self._columns()
+        for i, dt in enumerate(self.data.index):
+            for root, contract, fields in columns:
+                event = {'dt': dt, 'sid': root, 'contract': contract}
+                for field, values in fields:
+                    event[field] = values[i]
                 yield event
 
+    def snapshot(self, dt):
+        """
+        The values of every metric at the last row at or before @dt, as
+        metric => array over slots, all NaN before the first row.
+        """
+        i = np.searchsorted(self.data.index.asi8, pd.Timestamp(dt).value,
+                            side='right') - 1
+        if i < 0:
+            return dict((metric, np.repeat(np.nan, values.shape[1]))
+                        for metric, values in self.metric_values.iteritems())
+        return dict((metric, values[i])
+                    for metric, values in self.metric_values.iteritems())
+
     @property
     def raw_data(self):
         if not self._raw_data:
             self._raw_data = self.raw_data_gen()
-        return self._raw_data
\ No newline at end of file
+        return self._raw_data
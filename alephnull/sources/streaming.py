@@ -0,0 +1,294 @@
+"""
+Push-based source of bars for live trading.
+
+Feed handlers, running in their own threads, push each bar, i.e. the
+fields of every sid at one dt, into a StreamingBarSource as it arrives.
+The source queues at most @maxsize bars and yields their events as the
+algorithm consumes them, each stamped with the time its bar arrived.
+
+The last event of each bar is flagged end_of_bar, so the algorithm can
+call handle_data as soon as the bar is in, without waiting to see an
+event of the next one.
+
+When the algorithm falls behind, bars pile up in the queue. When it is
+full, or when the bar at its head has waited more than @max_age seconds
+and newer bars are queued, the oldest bar is:
+
+    * 'coalesce': merged into the next one, keeping the latest fields of
+      each sid and summing their volumes,
+    * 'drop': dropped,
+
+or, for overflow='block', the feed waits for room.
+
+The source records, for every bar, the seconds from its arrival to the
+point where the algorithm asked for the next event, i.e. once the
+handle_data call for that bar has returned.
+"""
+
+import json
+import numbers
+import socket
+import threading
+import time
+from collections import deque
+
+import numpy as np
+import pandas as pd
+from logbook import Logger
+
+from alephnull.gens.utils import hash_args
+from alephnull.sources.data_source import DataSource
+
+log = Logger('Streaming')
+
+OVERFLOW_POLICIES = ('coalesce', 'drop', 'block')
+
+
+class Bar(object):
+
+    def __init__(self, dt, fields, arrival):
+        self.dt = dt
+        # sid => dict of fields
+        self.fields = fields
+        self.arrival = arrival
+
+    def merge(self, newer):
+        """
+        This bar and the @newer one, as one bar at the dt of @newer.
+        """
+        fields = dict((sid, dict(values))
+                      for sid, values in self.fields.iteritems())
+        for sid, values in newer.fields.iteritems():
+            if sid in fields:
+                volume = fields[sid].get('volume')
+                fields[sid].update(values)
+                if volume is not None and 'volume' in values:
+                    fields[sid]['volume'] = volume + values['volume']
+            else:
+                fields[sid] = dict(values)
+        return Bar(newer.dt, fields, self.arrival)
+
+
+def to_timestamp(dt):
+    """
+    UTC Timestamp of @dt, given as a datetime, epoch seconds or an ISO
+    string in UTC.
+    """
+    if isinstance(dt, numbers.Number):
+        return pd.Timestamp(int(dt * 10 ** 9), tz='UTC')
+    if isinstance(dt, basestring):
+        return pd.Timestamp(dt.rstrip('Z'), tz='UTC')
+    return pd.Timestamp(dt)
+
+
+class StreamingBarSource(DataSource):
+    """
+    DataSource of the bars pushed by feed handlers.
+    """
+
+    # lets the algorithm hand over a bar at its end_of_bar event
+    streaming = True
+
+    def __init__(self, maxsize=1000, overflow='coalesce', max_age=None,
+                 clock=time.time):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError("overflow must be one of {0}, not {1!r}".format(
+                OVERFLOW_POLICIES, overflow))
+        self.maxsize = maxsize
+        self.overflow = overflow
+        self.max_age = max_age
+        self.clock = clock
+
+        self.arg_string = hash_args(id(self), maxsize, overflow, max_age)
+
+        self._bars = deque()
+        self._closed = False
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+
+        self.dropped = 0
+        self.coalesced = 0
+        self._latencies = []
+        self._raw_data = None
+
+    def push(self, dt, fields):
+        """
+        Queue the bar of @fields, a dict of sid => dict of fields, at @dt.
+        """
+        bar = Bar(to_timestamp(dt), fields, self.clock())
+        with self._lock:
+            if self._closed:
+                return
+            while len(self._bars) >= self.maxsize:
+                if self.overflow == 'block':
+                    self._changed.wait()
+                    if self._closed:
+                        return
+                else:
+                    self._shed()
+            self._bars.append(bar)
+            self._changed.notify_all()
+
+    def close(self):
+        """
+        End the stream once the queued bars are consumed.
+        """
+        with self._lock:
+            self._closed = True
+            self._changed.notify_all()
+
+    def __len__(self):
+        return len(self._bars)
+
+    def _shed(self):
+        # make room by dropping the oldest bar, or merging it into the next
+        oldest = self._bars.popleft()
+        if self.overflow == 'drop' or not self._bars:
+            self.dropped += 1
+        else:
+            self._bars[0] = oldest.merge(self._bars[0])
+            self.coalesced += 1
+
+    def _next_bar(self):
+        with self._lock:
+            while not self._bars:
+                if self._closed:
+                    return None
+                self._changed.wait()
+
+            if self.max_age is not None:
+                now = self.clock()
+                while len(self._bars) > 1 and \
+                        now - self._bars[0].arrival > self.max_age:
+                    self._shed()
+
+            bar = self._bars.popleft()
+            self._changed.notify_all()
+            return bar
+
+    @property
+    def latencies(self):
+        """
+        Seconds from the arrival of each bar to the end of its processing.
+        """
+        return np.array(self._latencies)
+
+    @property
+    def instance_hash(self):
+        return self.arg_string
+
+    def apply_mapping(self, raw_row):
+        raw_row.update({'source_id': self.get_hash(),
+                        'type': self.event_type})
+        return raw_row
+
+    def raw_data_gen(self):
+        while True:
+            bar = self._next_bar()
+            if bar is None:
+                return
+
+            sids = sorted(bar.fields)
+            for i, sid in enumerate(sids):
+                event = dict(bar.fields[sid])
+                event.update({'dt': bar.dt,
+                              'sid': sid,
+                              'arrival': bar.arrival})
+                if i == len(sids) - 1:
+                    event['end_of_bar'] = True
+                yield event
+
+            # resumed once the algorithm is done with the bar
+            self._latencies.append(self.clock() - bar.arrival)
+
+    @property
+    def raw_data(self):
+        if not self._raw_data:
+            self._raw_data = self.raw_data_gen()
+        return self._raw_data
+
+
+def parse_bar(line):
+    """
+    (dt, fields) of a line of JSON like
+    {"dt": 1387549860, "bars": {"AAPL": {"price": 550.0, "volume": 100}}}
+    """
+    message = json.loads(line)
+    fields = dict((str(sid), values)
+                  for sid, values in message['bars'].iteritems())
+    return message['dt'], fields
+
+
+class FeedHandler(threading.Thread):
+    """
+    Pushes the bars read from a stream of JSON lines into @source, and
+    closes it at the end of the stream.
+    """
+
+    def __init__(self, source):
+        super(FeedHandler, self).__init__()
+        self.daemon = True
+        self.source = source
+
+    def lines(self):
+        raise NotImplementedError
+
+    def run(self):
+        try:
+            for line in self.lines():
+                if not line.strip():
+                    continue
+                try:
+                    self.source.push(*parse_bar(line))
+                except (ValueError, KeyError):
+                    log.warn("Skipping malformed bar {0!r}".format(line))
+        finally:
+            self.source.close()
+
+
+class SocketFeed(FeedHandler):
+    """
+    Reads bars from a TCP connection to @address, a (host, port) pair.
+    """
+
+    def __init__(self, source, address):
+        super(SocketFeed, self).__init__(source)
+        self.address = address
+
+    def lines(self):
+        connection = socket.create_connection(self.address)
+        stream = connection.makefile('r')
+        try:
+            for line in stream:
+                yield line
+        finally:
+            stream.close()
+            connection.close()
+
+
+class FileTailFeed(FeedHandler):
+    """
+    Reads the bars appended to the file at @path, checking for new lines
+    every @poll_interval seconds, until @stop is set.
+    """
+
+    def __init__(self, source, path, poll_interval=0.1):
+        super(FileTailFeed, self).__init__(source)
+        self.path = path
+        self.poll_interval = poll_interval
+        self.stop = threading.Event()
+
+    def lines(self):
+        with open(self.path, 'r') as stream:
+            partial = ''
+            while True:
+                line = stream.readline()
+                if line:
+                    partial += line
+                    if partial.endswith('\n'):
+                        yield partial
+                        partial = ''
+                elif self.stop.is_set():
+                    return
+                else:
+                    time.sleep(self.poll_interval)
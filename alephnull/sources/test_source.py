@@ -28,7 +28,7 @@ from alephnull.protocol import (
     DATASOURCE_TYPE
 )
 from alephnull.gens.utils import hash_args
-from alephnull.utils.tradingcalendar import trading_days
+from alephnull.utils import calendars
 
 
 def create_trade(sid, price, amount, datetime, source_id="test_factory"):
@@ -57,6 +57,7 @@ def date_gen(start=datetime(2006, 6, 6, 12, tzinfo=pytz.utc),
     Utility to generate a stream of dates.
     """
     one_day = timedelta(days=1)
+    trading_days = calendars.get_calendar('NYSE').trading_days
     cur = start
     if delta == one_day:
         # if we are producing daily timestamps, we
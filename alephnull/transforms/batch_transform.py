@@ -26,6 +26,7 @@ from numbers import Integral
 
 import pandas as pd
 
+from alephnull.data.continuous import ContinuousHistory
 from alephnull.utils.data import RollingPanel
 from alephnull.protocol import Event
 
@@ -134,7 +135,8 @@ class BatchTransform(object):
                  fields=None,
                  compute_only_full=True,
                  bars='daily',
-                 downsample=False):
+                 downsample=False,
+                 continuous=None):
 
         """Instantiate new batch_transform object.
 
@@ -162,6 +164,11 @@ class BatchTransform(object):
                 full. Returns None if window is not full yet.
             downsample : bool <default=False>
                 If true, downsample bars to daily bars. Otherwise, do nothing.
+            continuous : DataFrame or ContinuousHistory <optional>
+                Continuous series of one column per root, e.g. from
+                alephnull.data.continuous.load_continuous. If supplied,
+                the 'continuous' field of the window is read from it
+                rather than from the bars.
         """
         if func is not None:
             self.compute_transform_value = func
@@ -222,6 +229,11 @@ class BatchTransform(object):
         # set of stocks per quarter
         self.supplemental_data = None
 
+        if continuous is not None and \
+                not isinstance(continuous, ContinuousHistory):
+            continuous = ContinuousHistory(continuous)
+        self.continuous = continuous
+
         self.rolling_panel = None
         self.daily_rolling_panel = None
 
@@ -394,6 +406,9 @@ class BatchTransform(object):
 
         # screen out sids no longer in the multiverse
         data = data.ix[:, :, self.latest_sids]
+        if self.continuous is not None:
+            data['continuous'] = self.continuous.asof(
+                data.major_axis).reindex(columns=data.minor_axis)
         if self.clean_nans:
             # Fills in gaps of missing data during transform
             # of multiple stocks. E.g. we may be missing
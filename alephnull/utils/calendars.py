@@ -0,0 +1,312 @@
+#
+# Copyright 2013 Quantopian, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Registry of exchange calendars, by exchange code.
+
+The holiday rules of an exchange live in its tradingcalendar module, which
+provides:
+
+    start                                  first date the rules hold for
+    get_non_trading_days(start, end)
+    get_trading_days(start, end, trading_day)
+    get_early_closes(start, end)
+    get_open_and_closes(trading_days, early_closes)
+
+A rules module may also serve its calendar's tables, e.g. trading_days, as
+module attributes, with serve_tables.
+
+A calendar is only built from its rules when it is first asked for, and
+for whole years around the dates asked for. Built calendars are kept in
+memory and saved to the cache directory, along with a hash of the rules
+module, so later processes load them instead of applying the rules again.
+"""
+
+import hashlib
+import importlib
+import os
+import sys
+import threading
+import zipfile
+from datetime import timedelta
+from os.path import expanduser
+from types import ModuleType
+
+import numpy as np
+import pandas as pd
+from logbook import Logger
+
+log = Logger('Calendars')
+
+CACHE_PATH = os.path.join(
+    expanduser("~"),
+    '.zipline',
+    'cache'
+)
+
+# exchange code => module of its rules
+CALENDAR_MODULES = {
+    'NYSE': 'alephnull.utils.tradingcalendar',
+    'TSE': 'alephnull.utils.tradingcalendar_tse',
+    'LSE': 'alephnull.utils.tradingcalendar_lse',
+}
+
+DEFAULT_EXCHANGE = 'NYSE'
+
+# exchange code => widest TradingCalendar built
+_calendars = {}
+_lock = threading.RLock()
+
+
+def _index(nanos):
+    return pd.DatetimeIndex(np.asarray(nanos, dtype=np.int64), tz='UTC')
+
+
+def _utc(timestamps):
+    index = pd.DatetimeIndex(list(timestamps))
+    if index.tz is None:
+        return index.tz_localize('UTC')
+    return index.tz_convert('UTC')
+
+
+class TradingCalendar(object):
+    """
+    Trading days, early closes and market hours of the exchange @code,
+    from @start to @end.
+    """
+
+    def __init__(self, code, start, end, non_trading_days, trading_days,
+                 early_closes, opens, closes):
+        self.code = code
+        self.start = start
+        self.end = end
+
+        self.non_trading_days = non_trading_days
+        self.trading_days = trading_days
+        self.early_closes = early_closes
+        self.opens = opens
+        self.closes = closes
+        self.open_and_closes = pd.DataFrame(
+            {'market_open': opens.asobject,
+             'market_close': closes.asobject},
+            index=trading_days,
+            columns=['market_open', 'market_close'])
+        self._trading_day = None
+
+    @property
+    def trading_day(self):
+        """
+        CustomBusinessDay offset that skips the non trading days.
+        """
+        if self._trading_day is None:
+            self._trading_day = pd.tseries.offsets.CDay(
+                holidays=self.non_trading_days)
+        return self._trading_day
+
+    def covers(self, start, end):
+        return self.start <= start and end <= self.end
+
+    def between(self, start, end):
+        """
+        This calendar from @start to @end.
+        """
+        def span(index):
+            return index[index.searchsorted(start):
+                         index.searchsorted(end, side='right')]
+
+        days = self.trading_days
+        lo = days.searchsorted(start)
+        hi = days.searchsorted(end, side='right')
+        calendar = TradingCalendar(
+            self.code, start, end, span(self.non_trading_days), days[lo:hi],
+            span(self.early_closes), self.opens[lo:hi], self.closes[lo:hi])
+        # skips the non trading days past the span too
+        calendar._trading_day = self.trading_day
+        return calendar
+
+
+def _canonical(dt):
+    dt = pd.Timestamp(dt)
+    if dt.tzinfo is None:
+        dt = dt.tz_localize('UTC')
+    return pd.Timestamp(dt.date(), tz='UTC')
+
+
+def _rules_hash(module):
+    source = os.path.splitext(module.__file__)[0] + '.py'
+    with open(source, 'rb') as f:
+        return hashlib.md5(f.read()).hexdigest()
+
+
+def get_cache_filepath(code):
+    return os.path.join(CACHE_PATH, 'calendar-{0}.npz'.format(code))
+
+
+def _read_cache(code, rules_hash):
+    path = get_cache_filepath(code)
+    if not os.path.exists(path):
+        return None
+    try:
+        stored = np.load(path)
+        try:
+            if str(stored['rules_hash']) != rules_hash:
+                return None
+            span = stored['span']
+            return TradingCalendar(
+                code,
+                pd.Timestamp(int(span[0]), tz='UTC'),
+                pd.Timestamp(int(span[1]), tz='UTC'),
+                _index(stored['non_trading_days']),
+                _index(stored['trading_days']),
+                _index(stored['early_closes']),
+                _index(stored['opens']),
+                _index(stored['closes']))
+        finally:
+            stored.close()
+    except (IOError, KeyError, ValueError, zipfile.BadZipfile) as exc:
+        log.warn("Ignoring unreadable calendar cache {0}: {1!r}".format(
+            path, exc))
+        return None
+
+
+def _write_cache(calendar, rules_hash):
+    path = get_cache_filepath(calendar.code)
+    try:
+        if not os.path.exists(CACHE_PATH):
+            os.makedirs(CACHE_PATH)
+        tmp_path = '{0}.{1}.tmp'.format(path, os.getpid())
+        with open(tmp_path, 'wb') as f:
+            np.savez_compressed(
+                f,
+                rules_hash=np.array(rules_hash),
+                span=np.array([calendar.start.value, calendar.end.value],
+                              dtype=np.int64),
+                non_trading_days=calendar.non_trading_days.asi8,
+                trading_days=calendar.trading_days.asi8,
+                early_closes=calendar.early_closes.asi8,
+                opens=calendar.opens.asi8,
+                closes=calendar.closes.asi8)
+        os.rename(tmp_path, path)
+    except (IOError, OSError) as exc:
+        log.warn("Could not cache calendar {0}: {1!r}".format(
+            calendar.code, exc))
+
+
+def _build(code, module, start, end):
+    # whole years, so that a calendar is rebuilt at most once a year
+    start = max(_canonical(pd.datetime(start.year, 1, 1)),
+                _canonical(module.start))
+    end = _canonical(pd.datetime(end.year, 12, 31))
+
+    non_trading_days = module.get_non_trading_days(start, end)
+    trading_day = pd.tseries.offsets.CDay(holidays=non_trading_days)
+    trading_days = module.get_trading_days(start, end, trading_day)
+    early_closes = module.get_early_closes(start, end)
+    open_and_closes = module.get_open_and_closes(trading_days, early_closes)
+
+    calendar = TradingCalendar(
+        code, start, end, non_trading_days, trading_days, early_closes,
+        _utc(open_and_closes['market_open']),
+        _utc(open_and_closes['market_close']))
+    calendar._trading_day = trading_day
+    return calendar
+
+
+def register_calendar(code, module):
+    """
+    Register the exchange @code, with its rules in the module named
+    @module.
+    """
+    with _lock:
+        CALENDAR_MODULES[code] = module
+        _calendars.pop(code, None)
+
+
+def get_calendar(code=DEFAULT_EXCHANGE, start=None, end=None):
+    """
+    The TradingCalendar of the exchange @code from @start, by default the
+    first date of its rules, to @end, by default a year from today.
+    """
+    try:
+        module_name = CALENDAR_MODULES[code]
+    except KeyError:
+        raise ValueError("Unknown exchange {0!r}, expected one of {1}".format(
+            code, sorted(CALENDAR_MODULES)))
+
+    with _lock:
+        module = importlib.import_module(module_name)
+
+        if start is None:
+            start = module.start
+        if end is None:
+            end = pd.Timestamp('today', tz='UTC') + timedelta(days=365)
+        start = max(_canonical(start), _canonical(module.start))
+        end = _canonical(end)
+
+        calendar = _calendars.get(code)
+        if calendar is None or not calendar.covers(start, end):
+            rules_hash = _rules_hash(module)
+            cached = _read_cache(code, rules_hash)
+            if cached is not None and cached.covers(start, end):
+                calendar = cached
+            else:
+                # keep the dates built so far
+                known = calendar if calendar is not None else cached
+                start_all, end_all = start, end
+                if known is not None:
+                    start_all = min(start, known.start)
+                    end_all = max(end, known.end)
+                calendar = _build(code, module, start_all, end_all)
+                _write_cache(calendar, rules_hash)
+            _calendars[code] = calendar
+
+        return calendar.between(start, end)
+
+
+# the tables a rules module serves, see serve_tables
+CALENDAR_TABLES = ('non_trading_days', 'trading_day', 'trading_days',
+                   'early_closes', 'open_and_closes')
+
+
+class RulesModule(ModuleType):
+    """
+    Rules module whose CALENDAR_TABLES attributes are those of the calendar
+    of its exchange, read from the registry when first used and kept as
+    module attributes from then on.
+    """
+
+    def __getattr__(self, name):
+        if name not in CALENDAR_TABLES:
+            raise AttributeError(
+                "'module' object has no attribute '{0}'".format(name))
+        calendar = get_calendar(self._exchange)
+        for table in CALENDAR_TABLES:
+            setattr(self, table, getattr(calendar, table))
+        return getattr(self, name)
+
+
+def serve_tables(name, code):
+    """
+    Replace the rules module @name, at the end of its import, with a
+    RulesModule serving the tables of the @code calendar, so importing the
+    rules doesn't build the calendar.
+    """
+    rules = sys.modules[name]
+    module = RulesModule(name, rules.__doc__)
+    module.__dict__.update(rules.__dict__)
+    module._exchange = code
+    # the functions of the rules still look up their globals in @rules
+    module._rules = rules
+    sys.modules[name] = module
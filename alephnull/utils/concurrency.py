@@ -0,0 +1,65 @@
+#
+# Copyright 2013 Quantopian, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import time
+from multiprocessing.pool import ThreadPool
+
+from logbook import Logger
+
+log = Logger('Concurrency')
+
+
+def retry(func, retries=3, backoff=0.5, exceptions=(Exception,),
+          sleep=time.sleep):
+    """
+    Call @func until it returns, at most @retries more times after the
+    first failure, sleeping @backoff seconds before the first retry and
+    twice as long before each further one. The last exception is raised.
+    """
+    delay = backoff
+    for attempt in range(retries + 1):
+        try:
+            return func()
+        except exceptions as exc:
+            if attempt == retries:
+                raise
+            log.warn("Attempt {0} of {1} failed: {2!r}, retrying in {3}s"
+                     .format(attempt + 1, retries + 1, exc, delay))
+            sleep(delay)
+            delay *= 2
+
+
+def concurrent_map(func, items, max_workers=8, retries=0, backoff=0.5,
+                   exceptions=(Exception,)):
+    """
+    [func(item) for item in @items], with at most @max_workers calls in
+    flight at once, each retried as by retry.
+    """
+    items = list(items)
+    if not items:
+        return []
+
+    def call(item):
+        return retry(lambda: func(item), retries, backoff, exceptions)
+
+    if max_workers <= 1 or len(items) == 1:
+        return [call(item) for item in items]
+
+    pool = ThreadPool(min(max_workers, len(items)))
+    try:
+        return pool.map(call, items)
+    finally:
+        pool.close()
+        pool.join()
@@ -0,0 +1,28 @@
+#
+# Copyright 2013 Quantopian, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Date helpers shared by the exchange calendar rules.
+"""
+
+from datetime import datetime
+
+import pytz
+
+
+def canonicalize_datetime(dt):
+    # Strip out any HHMMSS or timezone info in the user's datetime, so that
+    # all the datetimes we return will be 00:00:00 UTC.
+    return datetime(dt.year, dt.month, dt.day, tzinfo=pytz.utc)
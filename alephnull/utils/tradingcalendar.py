@@ -19,6 +19,9 @@ from datetime import datetime, timedelta
 from dateutil import rrule
 from functools import partial
 
+from alephnull.utils import calendars
+from alephnull.utils.date_utils import canonicalize_datetime
+
 start = pd.Timestamp('1990-01-01', tz='UTC')
 end_base = pd.Timestamp('today', tz='UTC')
 # Give an aggressive buffer for logic that needs to use the next trading
@@ -26,12 +29,6 @@ end_base = pd.Timestamp('today', tz='UTC')
 end = end_base + timedelta(days=365)
 
 
-def canonicalize_datetime(dt):
-    # Strip out any HHMMSS or timezone info in the user's datetime, so that
-    # all the datetimes we return will be 00:00:00 UTC.
-    return datetime(dt.year, dt.month, dt.day, tzinfo=pytz.utc)
-
-
 def get_non_trading_days(start, end):
     non_trading_rules = []
 
@@ -247,17 +244,15 @@ def get_non_trading_days(start, end):
     non_trading_days.sort()
     return pd.DatetimeIndex(non_trading_days)
 
-non_trading_days = get_non_trading_days(start, end)
-trading_day = pd.tseries.offsets.CDay(holidays=non_trading_days)
-
 
-def get_trading_days(start, end, trading_day=trading_day):
+def get_trading_days(start, end, trading_day=None):
+    if trading_day is None:
+        trading_day = pd.tseries.offsets.CDay(
+            holidays=get_non_trading_days(start, end))
     return pd.date_range(start=start.date(),
                          end=end.date(),
                          freq=trading_day).tz_localize('UTC')
 
-trading_days = get_trading_days(start, end)
-
 
 def get_early_closes(start, end):
     # 1:00 PM close rules based on
@@ -365,8 +360,6 @@ def get_early_closes(start, end):
     early_closes.sort()
     return pd.DatetimeIndex(early_closes)
 
-early_closes = get_early_closes(start, end)
-
 
 def get_open_and_close(day, early_closes):
     market_open = pd.Timestamp(
@@ -401,4 +394,7 @@ def get_open_and_closes(trading_days, early_closes):
 
     return open_and_closes
 
-open_and_closes = get_open_and_closes(trading_days, early_closes)
+
+# The NYSE tables, for the modules that import them from here, are read
+# from the calendar registry when first used.
+calendars.serve_tables(__name__, 'NYSE')
@@ -19,7 +19,8 @@ import pytz
 
 from datetime import datetime
 from dateutil import rrule
-from alephnull.utils.tradingcalendar import end, canonicalize_datetime
+from alephnull.utils import calendars
+from alephnull.utils.date_utils import canonicalize_datetime
 
 start = pd.Timestamp('1994-01-01', tz='UTC')
 
@@ -260,17 +261,15 @@ def get_non_trading_days(start, end):
     non_trading_days.sort()
     return pd.DatetimeIndex(non_trading_days)
 
-non_trading_days = get_non_trading_days(start, end)
-trading_day = pd.tseries.offsets.CDay(holidays=non_trading_days)
 
-
-def get_trading_days(start, end, trading_day=trading_day):
+def get_trading_days(start, end, trading_day=None):
+    if trading_day is None:
+        trading_day = pd.tseries.offsets.CDay(
+            holidays=get_non_trading_days(start, end))
     return pd.date_range(start=start.date(),
                          end=end.date(),
                          freq=trading_day).tz_localize('UTC')
 
-trading_days = get_trading_days(start, end)
-
 #Days in Environment but not in Calendar (using ^GSPTSE as bm_symbol):
 #--------------------------------------------------------------------
 #Used http://web.tmxmoney.com/pricehistory.php?qm_page=61468&qm_symbol=^TSX
@@ -335,8 +334,6 @@ def get_early_closes(start, end):
     early_closes.sort()
     return pd.DatetimeIndex(early_closes)
 
-early_closes = get_early_closes(start, end)
-
 
 def get_open_and_closes(trading_days, early_closes, tz='US/Eastern'):
     open_and_closes = pd.DataFrame(index=trading_days,
@@ -366,4 +363,5 @@ def get_open_and_closes(trading_days, early_closes, tz='US/Eastern'):
     return open_and_closes
 
 
-open_and_closes = get_open_and_closes(trading_days, early_closes)
+# The TSE tables, as tradingcalendar serves the NYSE ones.
+calendars.serve_tables(__name__, 'TSE')
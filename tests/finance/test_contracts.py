@@ -0,0 +1,138 @@
+#
+# Copyright 2013 Quantopian, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Unit tests for finance.contracts
+"""
+import json
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+import pandas as pd
+
+from alephnull.errors import InvalidContractSpec
+from alephnull.finance.contracts import ContractSpecs, parse_multiplier
+
+SPECS = {
+    'GS': {'multiplier': 25, 'tick_size': 0.05,
+           'contracts': {'N10': {'first_notice': '2010-06-28',
+                                 'expiration': '2010-07-15'}}},
+    'CL': {'contract_size': '1,000 BBL', 'quoted_unit': '$/BBL'},
+}
+
+CSV = """\
+root,contract,multiplier,contract_size,quoted_unit,tick_size,currency,\
+first_notice,expiration
+GS,,25,,,0.05,$,,
+GS,N10,,,,,,2010-06-28,2010-07-15
+CL,,,"1,000 BBL",$/BBL,,,,
+"""
+
+
+class ContractSpecsTestCase(TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def write(self, name, contents):
+        path = os.path.join(self.tempdir, name)
+        with open(path, 'w') as f:
+            f.write(contents)
+        return path
+
+    def check_specs(self, specs):
+        self.assertEqual(specs.multiplier(('GS', 'N10')), 25.0)
+        self.assertEqual(specs.tick_size('GS'), 0.05)
+        self.assertEqual(specs.multiplier(('CL', 'Q10')), 1000.0)
+        self.assertEqual(specs.first_notice(('GS', 'N10')),
+                         pd.Timestamp('2010-06-28', tz='UTC'))
+        self.assertEqual(specs.expiration(('GS', 'N10')),
+                         pd.Timestamp('2010-07-15', tz='UTC'))
+        # unlisted contracts have no dates
+        self.assertIsNone(specs.first_notice(('CL', 'Q10')))
+        self.assertIsNone(specs.expiration(('CL', 'Q10')))
+        self.assertNotIn(('CL', 'Q10'), specs.dates)
+
+    def test_load_json(self):
+        path = self.write('specs.json', json.dumps(SPECS))
+        self.check_specs(ContractSpecs.load(path))
+
+    def test_load_csv(self):
+        path = self.write('specs.csv', CSV)
+        self.check_specs(ContractSpecs.load(path))
+
+    def test_load_csv_non_usd(self):
+        # units other than dollars are UTF-8 encoded in the file
+        path = self.write('specs.csv', (
+            u'root,contract,contract_size,quoted_unit\n'
+            u'Z,,10 TONNES,\xa3\n'
+            u'FDAX,,25 EUR,\u20ac\n').encode('utf-8'))
+        specs = ContractSpecs.load(path)
+        self.assertEqual(specs.multiplier('Z'), 10 / 0.61)
+        self.assertEqual(specs.multiplier('FDAX'), 25 / 0.73)
+        self.assertEqual(parse_multiplier('10 TONNES', '\xc2\xa3'),
+                         10 / 0.61)
+
+    def test_load_csv_currency(self):
+        # contract rows without a currency keep the root's
+        path = self.write('specs.csv', (
+            'root,contract,multiplier,tick_size,currency,first_notice,'
+            'expiration\n'
+            'FGBL,,1000,0.01,EUR,,\n'
+            'FGBL,H11,,,,2011-03-08,2011-03-08\n'
+            'GS,N10,25,,,2010-06-28,2010-07-15\n'))
+        specs = ContractSpecs.load(path)
+        self.assertEqual(specs.currency('FGBL'), 'EUR')
+        self.assertEqual(specs.currency(('FGBL', 'H11')), 'EUR')
+        self.assertEqual(specs.currency('GS'), '$')
+
+    def test_fallback_multiplier(self):
+        asked = []
+        specs = ContractSpecs(lambda sid: asked.append(sid) or 50)
+        self.assertEqual(specs.multiplier(('ES', 'H11')), 50.0)
+        self.assertEqual(specs.multiplier(('ES', 'H11')), 50.0)
+        self.assertEqual(specs.multiplier(('ES', 'M11')), 50.0)
+        # asked once for each contract, and not stored as the root's spec
+        self.assertEqual(asked, [('ES', 'H11'), ('ES', 'M11')])
+        self.assertNotIn('ES', specs)
+
+    def test_fallback_multiplier_per_contract(self):
+        multipliers = {('ES', 'H11'): 50, ('ES', 'M11'): 25}
+        specs = ContractSpecs(multipliers.get)
+        self.assertEqual(specs.multiplier(('ES', 'H11')), 50.0)
+        self.assertEqual(specs.multiplier(('ES', 'M11')), 25.0)
+
+    def test_parse_multiplier(self):
+        self.assertEqual(parse_multiplier('42,000 GAL', '$'), 42000.0)
+        self.assertEqual(parse_multiplier('$50 X INDEX', 'PTS.'), 50.0)
+        self.assertEqual(parse_multiplier('12,500,000 YEN', u'\xa5'),
+                         12500000 / 104.49)
+        self.assertIsNone(parse_multiplier('SEE EXCHANGE', '$'))
+
+    def test_validation(self):
+        specs = ContractSpecs()
+        self.assertRaises(InvalidContractSpec, specs.add, 'GS',
+                          multiplier=-1)
+        self.assertRaises(InvalidContractSpec, specs.add, 'GS',
+                          contract_size='SEE EXCHANGE')
+        self.assertRaises(
+            InvalidContractSpec, specs.add, 'GS', multiplier=25,
+            contracts={'N10': {'first_notice': '2010-07-16',
+                               'expiration': '2010-07-15'}})
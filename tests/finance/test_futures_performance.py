@@ -0,0 +1,178 @@
+#
+# Copyright 2013 Quantopian, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import datetime
+from unittest import TestCase
+
+import pytz
+
+from alephnull.finance.contracts import ContractSpecs
+from alephnull.finance.performance.futures_period import (
+    FuturesPerformancePeriod,
+)
+from alephnull.finance.performance.margin import MarginEngine
+from alephnull.finance.performance.tracker import FuturesPerformanceTracker
+from alephnull.protocol import DATASOURCE_TYPE, Event, Positions
+from alephnull.utils import factory
+
+
+def create_futures_txn(root, contract, price, amount, dt):
+    return Event({
+        'sid': root,
+        'contract': contract,
+        'amount': amount,
+        'dt': dt,
+        'price': price,
+        'type': DATASOURCE_TYPE.TRANSACTION
+    })
+
+
+def create_futures_trade(root, contract, price, dt):
+    return Event({
+        'sid': root,
+        'contract': contract,
+        'price': price,
+        'volume': 100,
+        'dt': dt,
+        'type': DATASOURCE_TYPE.TRADE
+    })
+
+
+class TestFuturesPerformancePeriod(TestCase):
+
+    def setUp(self):
+        self.dt = datetime.datetime(2010, 6, 1, 14, tzinfo=pytz.utc)
+        multipliers = {('GS', 'N10'): 25.0, ('CL', 'N10'): 1000.0}
+        self.resolved = []
+
+        def resolve(sid):
+            self.resolved.append(sid)
+            return multipliers[sid]
+
+        self.period = FuturesPerformancePeriod(1000000.0)
+        self.period.contract_specs = ContractSpecs(resolve)
+
+    def test_positions_value_uses_multipliers(self):
+        period = self.period
+        period.execute_transaction(
+            create_futures_txn('GS', 'N10', 100.0, 2, self.dt))
+        period.execute_transaction(
+            create_futures_txn('CL', 'N10', 70.0, -1, self.dt))
+        period.update_last_sale(
+            create_futures_trade('GS', 'N10', 101.0, self.dt))
+        period.update_last_sale(
+            create_futures_trade('CL', 'N10', 69.0, self.dt))
+        period.calculate_performance()
+
+        self.assertEqual(period.ending_total_value,
+                         2 * 101.0 * 25.0 - 69.0 * 1000.0)
+        self.assertEqual(period.pnl, 2 * 1.0 * 25.0 + 1.0 * 1000.0)
+
+    def test_multiplier_resolved_once_per_contract(self):
+        for amount in (1, 1, -2):
+            self.period.execute_transaction(
+                create_futures_txn('GS', 'N10', 100.0, amount, self.dt))
+            self.period.calculate_performance()
+        self.assertEqual(self.resolved, [('GS', 'N10')])
+        self.assertEqual(self.period.ending_total_value, 0.0)
+
+    def test_update_positions(self):
+        positions = Positions()
+        positions[('GS', 'N10')].amount = 2
+        positions[('GS', 'N10')].last_sale_price = 101.0
+        positions[('CL', 'N10')].amount = -1
+        positions[('CL', 'N10')].last_sale_price = 69.0
+
+        self.period.update_positions(positions)
+        self.period.calculate_performance()
+
+        self.assertEqual(self.period.ending_total_value,
+                         2 * 101.0 * 25.0 - 69.0 * 1000.0)
+        self.assertEqual(self.period.positions[('CL', 'N10')].contract,
+                         'N10')
+
+
+class TestMarginEngine(TestCase):
+
+    def setUp(self):
+        self.dt = datetime.datetime(2010, 6, 1, 14, tzinfo=pytz.utc)
+        specs = ContractSpecs()
+        specs.add('GS', multiplier=25, initial_margin_rate=0.1,
+                  maintenance_margin_rate=0.05)
+        specs.add('CL', multiplier=1000)
+        self.engine = MarginEngine(100000.0, contract_specs=specs)
+
+    def test_margin_follows_prices_and_fills(self):
+        engine = self.engine
+        engine.update_amount(('GS', 'N10'), 10, 100.0)
+        engine.update_amount(('CL', 'N10'), -1, 70.0)
+        engine.update_price(('GS', 'N10'), 110.0)
+        # no position, no effect
+        engine.update_price(('GS', 'U10'), 50.0)
+
+        gs = 10 * 110.0 * 25
+        cl = 70.0 * 1000
+        self.assertAlmostEqual(engine.initial_margin, gs * 0.1 + cl * 0.25)
+        self.assertAlmostEqual(engine.maintenance_margin,
+                               gs * 0.05 + cl * 0.2)
+        self.assertAlmostEqual(engine.equity, 100000.0 + 10 * 10.0 * 25)
+
+        engine.update_amount(('GS', 'N10'), -10, 90.0)
+        self.assertAlmostEqual(engine.initial_margin, cl * 0.25)
+        self.assertAlmostEqual(engine.equity, 100000.0 - 10 * 10.0 * 25)
+        self.assertEqual(engine.position_margins()[('GS', 'N10')], 0.0)
+
+    def test_margin_call_and_history(self):
+        calls = []
+        self.engine.register_margin_call(
+            lambda engine, dt: calls.append((dt, engine.equity)))
+
+        dt = self.dt
+        self.engine.update_amount(('CL', 'N10'), 5, 70.0)
+        self.engine.check(dt)
+        self.assertEqual(calls, [])
+
+        next_dt = dt + datetime.timedelta(minutes=1)
+        for price in (62.0, 61.0):
+            self.engine.update_price(('CL', 'N10'), price)
+            self.engine.check(next_dt)
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(calls[0][0], next_dt)
+
+        history = self.engine.history
+        self.assertEqual(list(history.index), [dt, next_dt])
+        self.assertAlmostEqual(history['equity'][next_dt],
+                               100000.0 - 5 * 9.0 * 1000)
+        self.assertAlmostEqual(history['maintenance_margin'][next_dt],
+                               5 * 61.0 * 1000 * 0.2)
+
+
+class TestFuturesPerformanceTracker(TestCase):
+
+    def test_tracker_updates_margin(self):
+        sim_params = factory.create_simulation_parameters(num_days=4)
+        tracker = FuturesPerformanceTracker(sim_params)
+        tracker.margin.contract_specs = ContractSpecs(lambda sid: 25.0)
+        dt = sim_params.first_open
+
+        tracker.process_event(create_futures_txn('GS', 'N10', 100.0, 2, dt))
+        tracker.process_event(create_futures_trade('GS', 'N10', 101.0, dt))
+
+        self.assertAlmostEqual(tracker.margin.equity,
+                               sim_params.capital_base + 2 * 1.0 * 25)
+        self.assertAlmostEqual(tracker.margin.maintenance_margin,
+                               2 * 101.0 * 25 * 0.2)
+        self.assertEqual(len(tracker.margin.history), 1)
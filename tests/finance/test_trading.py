@@ -0,0 +1,77 @@
+#
+# Copyright 2013 Quantopian, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import datetime
+from unittest import TestCase
+
+import numpy as np
+import pandas as pd
+import pytz
+
+from alephnull.finance.trading import TradingEnvironment
+from alephnull.protocol import DATASOURCE_TYPE
+
+
+class TestBenchmarkSource(TestCase):
+
+    def setUp(self):
+        self.days = pd.date_range('2013-01-02', periods=20, freq='B',
+                                  tz='UTC')
+        returns = pd.Series(np.arange(20) / 1000.0, index=self.days)
+        curves = pd.DataFrame(0.01, index=self.days,
+                              columns=['1month', '30year'])
+        self.env = TradingEnvironment(load=lambda symbol: (returns, curves))
+
+    def dts(self, events):
+        return [event.dt for event in events]
+
+    def test_slice_is_inclusive(self):
+        # times within the first and last days still include them
+        start = datetime.datetime(2013, 1, 4, 14, 31, tzinfo=pytz.utc)
+        end = datetime.datetime(2013, 1, 10, 21, tzinfo=pytz.utc)
+        events = self.env.benchmark_source(start, end)
+
+        self.assertEqual(self.dts(events), list(self.days[2:7]))
+        self.assertEqual([e.returns for e in events],
+                         [i / 1000.0 for i in range(2, 7)])
+        self.assertTrue(all(e.type == DATASOURCE_TYPE.BENCHMARK
+                            for e in events))
+
+    def test_bounds_in_other_timezones(self):
+        # bounds are compared as UTC days
+        start = pd.Timestamp('2013-01-03 20:00', tz='US/Eastern')
+        end = pd.Timestamp('2013-01-10 16:00', tz='US/Eastern')
+        self.assertEqual(self.dts(self.env.benchmark_source(start, end)),
+                         list(self.days[2:7]))
+
+    def test_range_outside_history(self):
+        start = pd.Timestamp('2012-12-01', tz='UTC')
+        end = pd.Timestamp('2013-01-03', tz='UTC')
+        self.assertEqual(self.dts(self.env.benchmark_source(start, end)),
+                         list(self.days[:2]))
+
+        start = pd.Timestamp('2014-01-01', tz='UTC')
+        end = pd.Timestamp('2014-02-01', tz='UTC')
+        self.assertEqual(self.env.benchmark_source(start, end), [])
+
+    def test_runs_share_events(self):
+        first = self.env.benchmark_source(self.days[0], self.days[9])
+        cached = self.env._benchmark_events
+
+        second = self.env.benchmark_source(self.days[5], self.days[14])
+        self.assertIs(self.env._benchmark_events, cached)
+        self.assertEqual(self.dts(second), list(self.days[5:15]))
+        # the overlapping days are the same Event objects
+        self.assertIs(second[0], first[5])
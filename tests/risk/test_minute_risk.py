@@ -17,8 +17,9 @@ import unittest
 import datetime
 import pytz
 
-from zipline.finance.trading import SimulationParameters
-from zipline.finance import risk
+from alephnull.finance.trading import SimulationParameters
+from alephnull.finance import risk
+from alephnull.finance import trading
 
 
 class TestMinuteRisk(unittest.TestCase):
@@ -55,3 +56,23 @@ class TestMinuteRisk(unittest.TestCase):
         risk_metrics.update(second_dt, 3.0, 4.0)
 
         self.assertEquals(2, len(risk_metrics.metrics.alpha.valid()))
+
+    def test_minute_index(self):
+        start_date = datetime.datetime(2006, 11, 20, tzinfo=pytz.utc)
+        end_date = datetime.datetime(2006, 11, 28, tzinfo=pytz.utc)
+        sim_params = SimulationParameters(
+            period_start=start_date,
+            period_end=end_date
+        )
+        sim_params.emission_rate = 'minute'
+
+        risk_metrics = risk.RiskMetricsCumulative(sim_params)
+
+        # one index per day, including the early close after Thanksgiving
+        expected = []
+        for day in risk_metrics.trading_days:
+            expected.extend(
+                trading.environment.market_minutes_for_day(day))
+
+        self.assertEquals(expected, list(risk_metrics.cont_index))
+        self.assertEquals(5 * 390 + 210, len(risk_metrics.cont_index))
@@ -0,0 +1,193 @@
+#
+# Copyright 2013 Quantopian, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+import datetime
+
+import logbook
+import numpy as np
+import pandas as pd
+import pytz
+
+import alephnull.finance.risk as risk
+from alephnull.finance.risk.period import RiskMetricsPeriod
+from alephnull.finance.risk.risk import (
+    compounded_log_returns,
+    DrawdownTracker,
+    max_drawdown,
+    max_drawdown_duration,
+    select_treasury_duration,
+    TREASURY_DURATIONS,
+    TreasuryRates,
+    underwater_curve,
+)
+from alephnull.finance.trading import SimulationParameters
+from alephnull.utils import factory
+
+
+class TestRiskReport(unittest.TestCase):
+
+    def setUp(self):
+        start = datetime.datetime(2004, 1, 1, tzinfo=pytz.utc)
+        end = datetime.datetime(2006, 6, 20, tzinfo=pytz.utc)
+        self.sim_params = SimulationParameters(
+            period_start=start,
+            period_end=end
+        )
+        np.random.seed(1)
+        returns = factory.create_returns_from_range(self.sim_params)
+        self.returns = returns * 0.04 - 0.02
+
+    def assert_matches_period_metrics(self, returns):
+        metrics = risk.RiskReport(returns, self.sim_params)
+        for windows in (metrics.month_periods,
+                        metrics.three_month_periods,
+                        metrics.six_month_periods,
+                        metrics.year_periods):
+            for window in windows:
+                expected = RiskMetricsPeriod(
+                    start_date=window.start_date,
+                    end_date=window.end_date,
+                    returns=returns
+                ).to_dict()
+                actual = window.to_dict()
+                self.assertEqual(sorted(expected), sorted(actual))
+                for key, value in expected.iteritems():
+                    if key == 'period_label' or value is None:
+                        self.assertEqual(value, actual[key])
+                    else:
+                        np.testing.assert_allclose(
+                            actual[key], value, rtol=1e-9, atol=1e-12,
+                            err_msg=key)
+
+    def test_windows_match_period_metrics(self):
+        self.assert_matches_period_metrics(self.returns)
+
+    def test_total_loss_day(self):
+        self.returns[100] = -1.0
+        self.assert_matches_period_metrics(self.returns)
+
+    def test_cumulative_underwater(self):
+        self.returns[100] = -1.0
+        metrics = risk.RiskMetricsCumulative(self.sim_params,
+                                             record_underwater=True)
+        for dt, returns in self.returns.iterkv():
+            metrics.update(dt, returns, returns)
+
+        underwater = underwater_curve(
+            compounded_log_returns(self.returns.values))
+        np.testing.assert_allclose(metrics.underwater, underwater)
+        self.assertAlmostEqual(metrics.max_drawdown, underwater.max())
+        self.assertEqual(metrics.max_drawdown_duration,
+                         max_drawdown_duration(underwater))
+
+
+class TestDrawdown(unittest.TestCase):
+
+    def setUp(self):
+        # 200, 100, 180, 210.6, 421.2, 379.8, 208.494
+        self.returns = np.array([1.0, -0.5, 0.8, .17, 1.0, -0.1, -0.45])
+
+    def test_max_drawdown(self):
+        self.assertAlmostEqual(max_drawdown(self.returns), 0.505)
+        self.assertEqual(max_drawdown([]), 0.0)
+
+    def test_total_loss_restarts_compounding(self):
+        compounded = compounded_log_returns([0.1, -1.0, 0.1])
+        np.testing.assert_allclose(compounded, [np.log(1.1), 0.0,
+                                                np.log(1.1)])
+
+    def test_underwater_and_duration(self):
+        underwater = underwater_curve(
+            compounded_log_returns(self.returns))
+        self.assertEqual(underwater[0], 0.0)
+        self.assertAlmostEqual(underwater[1], 0.5)
+        self.assertEqual(max_drawdown_duration(underwater), 2)
+
+    def test_tracker_matches_kernel(self):
+        tracker = DrawdownTracker(record_underwater=True)
+        for compounded in compounded_log_returns(self.returns):
+            tracker.update(compounded)
+        self.assertAlmostEqual(tracker.max_drawdown,
+                               max_drawdown(self.returns))
+        np.testing.assert_allclose(
+            tracker.underwater,
+            underwater_curve(compounded_log_returns(self.returns)))
+        self.assertEqual(tracker.max_duration, 2)
+
+    def test_tracker_underwater_is_opt_in(self):
+        tracker = DrawdownTracker()
+        for compounded in compounded_log_returns(self.returns):
+            tracker.update(compounded)
+        self.assertIsNone(tracker.underwater)
+        self.assertEqual(tracker.max_duration, 2)
+
+
+class TestTreasuryRates(unittest.TestCase):
+
+    def setUp(self):
+        days = pd.date_range('2006-01-02', periods=4, tz='UTC')
+        curves = pd.DataFrame(
+            np.arange(40.0).reshape(4, 10) / 1000.0,
+            index=days, columns=TREASURY_DURATIONS)
+        curves['1month'][1] = np.nan
+        curves['10year'][2] = np.nan
+        curves['30year'][2] = np.nan
+        self.days = days
+        self.curves = curves
+        self.rates = TreasuryRates(curves)
+
+    def test_missing_duration_uses_longer_duration(self):
+        self.assertEqual(self.rates.rate('1month', self.days[1]),
+                         self.curves['3month'][1])
+
+    def test_missing_day_is_forward_filled(self):
+        self.assertEqual(self.rates.rate('10year', self.days[2]),
+                         self.curves['10year'][1])
+        # weekends and days past the history use the last curve
+        self.assertEqual(
+            self.rates.rate('1year', self.days[3] + pd.DateOffset(days=3)),
+            self.curves['1year'][3])
+
+    def test_end_date_before_history(self):
+        before = self.days[0] - pd.DateOffset(days=1)
+        with logbook.TestHandler() as handler:
+            self.assertIsNone(self.rates.rate('1year', before))
+        self.assertTrue(handler.has_warnings)
+        with self.assertRaises(Exception):
+            self.rates.period_return(before, before, '1month')
+
+    def test_duration_without_data(self):
+        curves = self.curves.copy()
+        curves['30year'][:2] = np.nan
+        rates = TreasuryRates(curves)
+        with logbook.TestHandler() as handler:
+            self.assertIsNone(rates.rate('30year', self.days[1]))
+        self.assertTrue(handler.has_warnings)
+        self.assertEqual(rates.rate('30year', self.days[3]),
+                         curves['30year'][3])
+        with self.assertRaises(Exception):
+            rates.period_return(self.days[0], self.days[1], '30year')
+
+    def test_period_return_is_memoized(self):
+        start, end = self.days[0], self.days[3]
+        duration = select_treasury_duration(start, end)
+        first = self.rates.period_return(start, end, duration)
+        self.assertEqual(first, self.curves[duration][3] * 4 / 365)
+        self.assertEqual(list(self.rates._cache),
+                         [(start, end, duration, True)])
+        self.assertEqual(self.rates.period_return(start, end, duration),
+                         first)
+        self.assertEqual(len(self.rates._cache), 1)
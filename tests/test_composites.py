@@ -0,0 +1,139 @@
+#
+# Copyright 2013 Quantopian, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from datetime import datetime, timedelta
+from unittest import TestCase
+
+import numpy as np
+import pandas as pd
+import pytz
+
+from alephnull.gens.composites import (
+    date_sorted_sources,
+    group_by_dt,
+    inject_benchmarks,
+)
+from alephnull.protocol import DATASOURCE_TYPE, Event
+from alephnull.sources import DataFrameSource
+from alephnull.sources.test_source import create_trade
+
+
+def benchmark_events(dts):
+    return [Event({'dt': dt,
+                   'returns': 0.01,
+                   'type': DATASOURCE_TYPE.BENCHMARK,
+                   'source_id': 'benchmarks'})
+            for dt in dts]
+
+
+class MiscountedSource(object):
+    """
+    Source whose event_dts don't match its events.
+    """
+
+    def __init__(self, events, dts):
+        self.events = events
+        self.event_dts = np.array([pd.Timestamp(dt).value for dt in dts],
+                                  dtype=np.int64)
+
+    def get_hash(self):
+        return 'miscounted'
+
+    def __iter__(self):
+        return iter(self.events)
+
+
+class TestDateSortedSources(TestCase):
+
+    def setUp(self):
+        self.start = datetime(2006, 1, 3, tzinfo=pytz.utc)
+        self.days = [self.start + timedelta(days=i) for i in range(5)]
+
+    def test_columnar_and_generator_sources(self):
+        df = pd.DataFrame({0: np.arange(5.0), 1: np.arange(5.0)},
+                          index=pd.DatetimeIndex(self.days))
+        df_source = DataFrameSource(df)
+        self.assertEqual(len(df_source.event_dts), 10)
+
+        trades = [create_trade(2, 10.0, 100, dt + timedelta(hours=12))
+                  for dt in self.days]
+        generated = (trade for trade in
+                     [create_trade(3, 10.0, 100, dt) for dt in self.days])
+
+        merged = list(date_sorted_sources(df_source, trades, generated))
+
+        self.assertEqual(len(merged), 20)
+        dts = [event.dt for event in merged]
+        self.assertEqual(dts, sorted(dts))
+        # ordering within a source is preserved
+        self.assertEqual([e.sid for e in merged if e.sid in (0, 1)],
+                         [0, 1] * 5)
+
+    def test_event_dts_count_mismatch(self):
+        trades = [create_trade(1, 10.0, 100, dt) for dt in self.days]
+
+        short = MiscountedSource(trades[:3], self.days)
+        with self.assertRaises(ValueError):
+            list(date_sorted_sources(short))
+
+        extra = MiscountedSource(trades, self.days[:3])
+        with self.assertRaises(ValueError):
+            list(date_sorted_sources(extra))
+
+    def test_inject_benchmarks(self):
+        trades = [create_trade(1, 10.0, 100, dt) for dt in self.days[:3]]
+        benchmarks = benchmark_events(self.days)
+
+        merged = list(inject_benchmarks(benchmarks, iter(trades)))
+
+        self.assertEqual(len(merged), 8)
+        self.assertEqual([e.type for e in merged[:2]],
+                         [DATASOURCE_TYPE.TRADE, DATASOURCE_TYPE.BENCHMARK])
+        # benchmarks past the end of the stream are flushed
+        self.assertEqual([e.type for e in merged[-2:]],
+                         [DATASOURCE_TYPE.BENCHMARK] * 2)
+
+    def test_group_by_dt(self):
+        trades = [create_trade(sid, 10.0, 100, dt)
+                  for dt in self.days[:2] for sid in (1, 2)]
+        groups = [(dt, [e.sid for e in group])
+                  for dt, group in group_by_dt(iter(trades))]
+        self.assertEqual(groups, [(self.days[0], [1, 2]),
+                                  (self.days[1], [1, 2])])
+
+        # a flagged message ends its group before the next one is read
+        trades[1]['end_of_bar'] = True
+
+        def stream():
+            for trade in trades[:2]:
+                yield trade
+            raise AssertionError("read past the end of the bar")
+
+        dt, group = next(group_by_dt(stream()))
+        self.assertEqual([e.sid for e in group], [1, 2])
+
+    def test_benchmark_joins_flagged_bar(self):
+        trades = [create_trade(sid, 10.0, 100, dt)
+                  for dt in self.days[:2] for sid in (1, 2)]
+        trades[1]['end_of_bar'] = True
+        trades[3]['end_of_bar'] = True
+        with_benchmarks = inject_benchmarks(
+            benchmark_events(self.days[:2]), iter(trades))
+
+        groups = [(dt, [e.type for e in group])
+                  for dt, group in group_by_dt(with_benchmarks)]
+        bar = [DATASOURCE_TYPE.TRADE, DATASOURCE_TYPE.BENCHMARK,
+               DATASOURCE_TYPE.TRADE]
+        self.assertEqual(groups, [(self.days[0], bar),
+                                  (self.days[1], bar)])
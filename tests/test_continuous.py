@@ -0,0 +1,154 @@
+#
+# Copyright 2013 Quantopian, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import shutil
+import tempfile
+from unittest import TestCase
+
+import numpy as np
+import pandas as pd
+
+from alephnull.data import loader
+from alephnull.data.continuous import (
+    adjust,
+    build_continuous,
+    ContinuousHistory,
+    load_continuous,
+    roll_schedule,
+)
+from alephnull.finance.contracts import ContractSpecs
+from alephnull.finance.trading import TradingEnvironment
+from alephnull.protocol import BarData, SIDData
+from alephnull.sources.futures_data_frame_source import (
+    FuturesDataFrameSource,
+)
+from alephnull.transforms.batch_transform import BatchTransform
+
+
+def futures_frame():
+    index = pd.date_range('2010-06-01', periods=4, freq='D', tz='UTC')
+    columns = pd.MultiIndex.from_tuples([
+        ('GS', 'N10', 'price'), ('GS', 'N10', 'volume'),
+        ('GS', 'N10', 'open_interest'),
+        ('GS', 'U10', 'price'), ('GS', 'U10', 'volume'),
+        ('GS', 'U10', 'open_interest'),
+    ])
+    values = np.array([
+        [100.0, 10, 500, 102.0, 10, 100],
+        [101.0, 10, 400, 103.0, 10, 300],
+        [102.0, 10, 200, 105.0, 10, 600],
+        [103.0, 10, 100, 106.0, 10, 700],
+    ])
+    return pd.DataFrame(values, index=index, columns=columns)
+
+
+class TestContinuous(TestCase):
+
+    def setUp(self):
+        self.data = futures_frame()
+        self.specs = ContractSpecs(lambda sid: 25.0)
+
+    def test_roll_schedule(self):
+        chain, front = roll_schedule(self.data, 'GS', 'open_interest',
+                                     self.specs)
+        self.assertEqual(chain.contracts, ['N10', 'U10'])
+        self.assertEqual(list(front), [0, 0, 1, 1])
+
+    def test_adjustments(self):
+        prices = np.array([[100.0, 102.0],
+                           [101.0, 103.0],
+                           [102.0, 105.0],
+                           [103.0, 106.0]])
+        front = np.array([0, 0, 1, 1])
+
+        np.testing.assert_array_equal(adjust(prices, front, None),
+                                      [100.0, 101.0, 105.0, 106.0])
+        # rolled at a gap of 3.0 on the third row
+        np.testing.assert_array_equal(adjust(prices, front, 'back'),
+                                      [103.0, 104.0, 105.0, 106.0])
+        np.testing.assert_allclose(adjust(prices, front, 'ratio'),
+                                   [100.0 * 105 / 102, 101.0 * 105 / 102,
+                                    105.0, 106.0])
+        self.assertRaises(ValueError, adjust, prices, front, 'forward')
+
+    def test_continuous_field_and_history(self):
+        continuous = build_continuous(self.data, 'open_interest', 'back',
+                                      contract_specs=self.specs)
+        self.assertEqual(list(continuous['GS']),
+                         [103.0, 104.0, 105.0, 106.0])
+
+        source = FuturesDataFrameSource(self.data, continuous=continuous)
+        events = list(source)
+        self.assertEqual(len(events), 8)
+        for event in events:
+            self.assertEqual(event.continuous, continuous['GS'][event.dt])
+
+        history = ContinuousHistory(continuous)
+        window = history.window(self.data.index[2], 2)
+        self.assertEqual(list(window['GS']), [104.0, 105.0])
+
+        before = self.data.index[0] - pd.DateOffset(days=1)
+        rows = history.asof([before, self.data.index[1],
+                             self.data.index[1] + pd.DateOffset(hours=6)])
+        self.assertTrue(np.isnan(rows['GS'][0]))
+        self.assertEqual(list(rows['GS'][1:]), [104.0, 104.0])
+
+    def test_batch_transform_input(self):
+        continuous = build_continuous(self.data, 'open_interest', 'back',
+                                      contract_specs=self.specs)
+        transform = BatchTransform(func=lambda data: data['continuous'],
+                                   window_length=2, sids=['GS'],
+                                   continuous=continuous)
+        with TradingEnvironment():
+            for dt in self.data.index:
+                # the bars carry the unadjusted front month price
+                price = self.data['GS', 'N10', 'price'][dt]
+                bar_data = BarData()
+                bar_data['GS'] = SIDData({'dt': dt, 'datetime': dt,
+                                          'price': price,
+                                          'continuous': price})
+                window = transform.handle_data(bar_data)
+
+        self.assertEqual(list(window['GS']), [105.0, 106.0])
+        self.assertEqual(list(window.index), list(self.data.index[2:]))
+
+
+class TestLoadContinuous(TestCase):
+
+    def setUp(self):
+        self.data = futures_frame()
+        self.cache_path = loader.CACHE_PATH
+        loader.CACHE_PATH = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(loader.CACHE_PATH)
+        loader.CACHE_PATH = self.cache_path
+
+    def test_cached_per_contract_specs(self):
+        specs = ContractSpecs(lambda sid: 25.0)
+        continuous = load_continuous(self.data, contract_specs=specs)
+        self.assertEqual(list(continuous['GS']),
+                         [103.0, 104.0, 105.0, 106.0])
+        cached = load_continuous(self.data, contract_specs=specs)
+        self.assertTrue(cached.index.equals(self.data.index))
+        self.assertEqual(list(cached['GS']), [103.0, 104.0, 105.0, 106.0])
+
+        # an earlier first notice rolls sooner, so the series is built again
+        specs.add('GS', multiplier=25,
+                  contracts={'N10': {'first_notice': '2010-06-02',
+                                     'expiration': '2010-06-10'}})
+        continuous = load_continuous(self.data, contract_specs=specs)
+        self.assertEqual(list(continuous['GS']),
+                         [102.0, 103.0, 105.0, 106.0])
@@ -13,6 +13,9 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import os
+import shutil
+import tempfile
 import unittest
 
 from collections import deque
@@ -22,7 +25,9 @@ import numpy as np
 import pandas as pd
 import pandas.util.testing as tm
 
-from zipline.utils.data import RollingPanel
+from alephnull.utils.data import RollingPanel
+from alephnull.data import cache, loader, store, treasuries
+from alephnull.data.benchmarks import DailyReturn
 
 
 class TestRollingPanel(unittest.TestCase):
@@ -60,6 +65,241 @@ class TestRollingPanel(unittest.TestCase):
             tm.assert_panel_equal(result, expected.swapaxes(0, 1))
 
 
+def day(month, day, year=2013):
+    return pd.Timestamp(pd.datetime(year, month, day))
+
+
+class TestCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tempdir, 'yahoo-TEST.npz')
+        self.bars = pd.DataFrame(
+            {'Close': np.arange(60, dtype=float),
+             'Volume': np.arange(60, dtype=float) * 100},
+            index=pd.bdate_range(day(1, 1), periods=60),
+            columns=['Close', 'Volume'])
+        self.fetched = []
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def fetch(self, start, end):
+        self.fetched.append((start, end))
+        return self.bars.ix[start:end]
+
+    def load(self, start, end):
+        return cache.load_range(self.path, start, end, self.fetch)
+
+    def test_load_range(self):
+        start = day(1, 10).tz_localize('UTC')
+        end = day(2, 1).tz_localize('UTC')
+        tm.assert_frame_equal(self.load(start, end),
+                              self.bars.ix[day(1, 10):day(2, 1)])
+        self.assertEqual(len(self.fetched), 1)
+
+        # sub ranges are sliced from the cache
+        tm.assert_frame_equal(self.load(day(1, 15), day(1, 20)),
+                              self.bars.ix[day(1, 15):day(1, 20)])
+        self.assertEqual(len(self.fetched), 1)
+
+        # wider ranges only fetch the dates on either side
+        tm.assert_frame_equal(self.load(day(1, 1), day(2, 15)),
+                              self.bars.ix[day(1, 1):day(2, 15)])
+        self.assertEqual(self.fetched[1:], [(day(1, 1), day(1, 9)),
+                                            (day(2, 2), day(2, 15))])
+
+        tm.assert_frame_equal(cache.read_frame(self.path).frame,
+                              self.bars.ix[day(1, 1):day(2, 15)])
+
+    def test_today_is_fetched_again(self):
+        # 2013-03-15 is a Friday
+        now = day(3, 15) + pd.datetools.Hour(12)
+        for _ in range(3):
+            bars = cache.load_range(self.path, day(3, 11), day(3, 15),
+                                    self.fetch, now=now)
+            tm.assert_frame_equal(bars, self.bars.ix[day(3, 11):day(3, 15)])
+
+        self.assertEqual(self.fetched[1:], [(day(3, 15), day(3, 15))] * 2)
+        cached = cache.read_frame(self.path)
+        self.assertEqual(cached.frame.index[-1], day(3, 14))
+
+    def test_empty_dates_are_cached(self):
+        # no bars before the first one, e.g. before a stock was listed
+        self.load(day(6, 1, 2012), day(1, 31))
+        self.load(day(6, 1, 2012), day(1, 31))
+        self.assertEqual(len(self.fetched), 1)
+
+    def test_unreadable_cache(self):
+        with open(self.path, 'w') as f:
+            f.write('not an npz file')
+        tm.assert_frame_equal(self.load(day(1, 10), day(2, 1)),
+                              self.bars.ix[day(1, 10):day(2, 1)])
+
+
+class TestDailyStore(unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tempdir, 'curves.dat')
+        self.curves = pd.DataFrame(
+            np.random.rand(10, 3), columns=['1month', '1year', '30year'],
+            index=pd.date_range(pd.datetime(2013, 1, 1), periods=10,
+                                tz='UTC'))
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def test_write_and_append(self):
+        store.write(self.path, self.curves[:6])
+        self.assertEqual(store.last_date(self.path), self.curves.index[5])
+        size = os.path.getsize(self.path)
+
+        # rows up to the last date are skipped
+        self.assertEqual(store.append(self.path, self.curves[4:]), 4)
+        self.assertEqual(store.append(self.path, self.curves[4:]), 0)
+        self.assertEqual(os.path.getsize(self.path), size + 4 * 32)
+
+        self.assertEqual(store.last_date(self.path), self.curves.index[-1])
+        tm.assert_frame_equal(store.read_frame(self.path), self.curves)
+
+    def test_empty(self):
+        store.write(self.path, self.curves[:0])
+        self.assertIsNone(store.last_date(self.path))
+        store.append(self.path, self.curves)
+        tm.assert_frame_equal(store.read_frame(self.path), self.curves)
+
+
+class TestLoadMarketData(unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.data_path = loader.DATA_PATH
+        self.get_benchmark_returns = loader.get_benchmark_returns
+        self.get_treasury_source = treasuries.get_treasury_source
+        loader.DATA_PATH = self.tempdir
+
+        today = pd.Timestamp(pd.datetime.utcnow().date(), tz='UTC')
+        self.dates = pd.date_range(today - pd.datetools.Day(60), today)
+        self.fetched = []
+
+        def get_benchmark_returns(symbol, start_date=None):
+            self.fetched.append(start_date)
+            return [DailyReturn(date=dt, returns=0.01)
+                    for dt in self.dates
+                    if start_date is None or dt >= start_date]
+
+        def get_treasury_source(start_date=None):
+            self.fetched.append(start_date)
+            for dt in self.dates:
+                if start_date is None or dt >= start_date:
+                    yield {'Id': '1',
+                           'NEW_DATE': dt.strftime('%Y-%m-%dT00:00:00'),
+                           'BC_1MONTH': '0.05',
+                           'BC_10YEAR': '2.00'}
+
+        loader.get_benchmark_returns = get_benchmark_returns
+        treasuries.get_treasury_source = get_treasury_source
+
+    def tearDown(self):
+        loader.DATA_PATH = self.data_path
+        loader.get_benchmark_returns = self.get_benchmark_returns
+        treasuries.get_treasury_source = self.get_treasury_source
+        shutil.rmtree(self.tempdir)
+
+    def test_update(self):
+        # files of an earlier version, a month out of date
+        old = self.dates[:30]
+        pd.Series(0.01, index=old).to_csv(
+            os.path.join(self.tempdir, '^GSPC_benchmark.csv'))
+        pd.DataFrame(0.02, index=old, columns=treasuries.DURATIONS).to_csv(
+            os.path.join(self.tempdir, 'treasury_curves.csv'))
+
+        benchmark_returns, treasury_curves = loader.load_market_data()
+
+        start = old[-1] + pd.datetools.Day()
+        self.assertEqual(self.fetched, [start, start])
+        self.assertEqual(list(benchmark_returns.index), list(self.dates))
+        self.assertEqual(list(treasury_curves.index), list(self.dates))
+        self.assertEqual(list(treasury_curves.columns), treasuries.DURATIONS)
+
+        new = treasury_curves.ix[start:]
+        self.assertTrue((new['1month'] == 0.0005).all())
+        self.assertTrue((new['10year'] == 0.02).all())
+        self.assertTrue(new['30year'].isnull().all())
+
+    def test_empty_files_are_refetched(self):
+        # e.g. left by a dump that found no data
+        store.write(os.path.join(self.tempdir, '^GSPC_benchmark.dat'),
+                    pd.DataFrame({'returns': 0.01}, index=self.dates[:0]))
+        store.write(os.path.join(self.tempdir, 'treasury_curves.dat'),
+                    pd.DataFrame(0.02, index=self.dates[:0],
+                                 columns=treasuries.DURATIONS))
+
+        benchmark_returns, treasury_curves = loader.load_market_data()
+
+        # fetched in full rather than from a last date
+        self.assertEqual(self.fetched, [None, None])
+        self.assertEqual(list(benchmark_returns.index), list(self.dates))
+        self.assertEqual(list(treasury_curves.index), list(self.dates))
+
+    def test_curves_frame(self):
+        rows = [{'NEW_DATE': '2013-01-02T00:00:00', 'BC_1MONTH': '0.05',
+                 'BC_30YEAR': ''},
+                {'NEW_DATE': '2013-01-03T00:00:00', 'BC_30YEAR': '3.10'}]
+        curves = treasuries.curves_frame(
+            iter(rows), treasuries._CURVE_MAPPINGS, ['1month', '30year'])
+
+        self.assertEqual(list(curves.index),
+                         list(pd.date_range('2013-01-02', periods=2,
+                                            tz='UTC')))
+        self.assertEqual(curves['1month'][0], 0.0005)
+        self.assertEqual(curves['30year'][1], 0.031)
+        self.assertTrue(np.isnan(curves['1month'][1]))
+        self.assertTrue(np.isnan(curves['30year'][0]))
+
+        empty = treasuries.curves_frame(
+            iter([]), treasuries._CURVE_MAPPINGS, treasuries.DURATIONS)
+        self.assertEqual(list(empty.columns), treasuries.DURATIONS)
+        self.assertEqual(len(empty), 0)
+
+    def test_is_stale(self):
+        path = os.path.join(self.tempdir, 'returns.dat')
+        frame = pd.DataFrame({'returns': 0.01}, index=self.dates)
+
+        store.write(path, frame[:0])
+        self.assertEqual(loader._is_stale(path, self.dates), (True, None))
+
+        store.write(path, frame)
+        self.assertEqual(loader._is_stale(path, self.dates),
+                         (False, self.dates[-1]))
+
+        store.write(path, frame[:-1])
+        self.assertEqual(loader._is_stale(path, self.dates),
+                         (True, self.dates[-2]))
+
+    def test_update_benchmarks_appends(self):
+        path = os.path.join(self.tempdir,
+                            loader.get_benchmark_filename('^GSPC'))
+        old = self.dates[:30]
+        store.write(path, pd.DataFrame({'returns': 0.02}, index=old))
+        size = os.path.getsize(path)
+
+        # the source repeats the days already stored
+        loader.get_benchmark_returns = \
+            lambda symbol, start_date=None: [
+                DailyReturn(date=dt, returns=0.01) for dt in self.dates]
+
+        benchmark_returns = loader.update_benchmarks('^GSPC', old[-1])
+
+        self.assertEqual(os.path.getsize(path),
+                         size + 16 * (len(self.dates) - len(old)))
+        self.assertEqual(store.last_date(path), self.dates[-1])
+        self.assertEqual(list(benchmark_returns.index), list(self.dates))
+        self.assertTrue((benchmark_returns[old] == 0.02).all())
+        self.assertTrue((benchmark_returns[self.dates[30:]] == 0.01).all())
+
+
 def f(option='clever', n=500, copy=False):
     items = range(5)
     minor = range(20)
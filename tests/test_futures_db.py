@@ -0,0 +1,97 @@
+#
+# Copyright 2013 Quantopian, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from collections import OrderedDict
+from unittest import TestCase
+
+import numpy as np
+import pandas as pd
+
+from alephnull.experiment.dummy_futures_data_generator import (
+    create_dummy_frame,
+)
+from alephnull.experiment.sqlite_interface import FuturesDB, FuturesDBSource
+
+
+class TestFuturesDB(TestCase):
+
+    def setUp(self):
+        self.dts = pd.date_range('2013-05-13 13:30', periods=3, freq='30Min',
+                                 tz='UTC')
+        universe = OrderedDict()
+        for i, dt in enumerate(self.dts):
+            universe[dt] = {
+                'GC': {'G14': {'Price': 100.0 + i, 'Open Interest': 10 + i,
+                               'Margin Requirements': 100.0},
+                       'V14': {'Price': 200.0 + i, 'Open Interest': 20 + i,
+                               'Margin Requirements': 100.0}},
+                'HG': {'U14': {'Price': 300.0 + i, 'Open Interest': 30 + i,
+                               'Margin Requirements': 100.0}},
+            }
+        self.db = FuturesDB(':memory:')
+        self.db.initialize_tables()
+        self.db.insert_dict(universe)
+
+    def tearDown(self):
+        self.db.close()
+
+    def test_get(self):
+        dt = self.dts[1]
+        self.assertEqual(self.db.get_price(dt, 'GC', 'V14'), 201.0)
+        self.assertEqual(self.db.get('Open Interest', dt, 'GC'),
+                         {'G14': 11, 'V14': 21})
+        self.assertEqual(self.db.get('price', dt),
+                         {'GC': {'G14': 101.0, 'V14': 201.0},
+                          'HG': {'U14': 301.0}})
+        self.assertEqual(self.db.get_all_timestamps(), list(self.dts))
+        self.assertRaises(ValueError, self.db.get, 'bid', dt)
+
+    def test_get_range(self):
+        bars = self.db.get_range(self.dts[1], self.dts[2], symbol='GC')
+        self.assertEqual(len(bars), 4)
+        np.testing.assert_array_equal(
+            bars.dt, np.repeat(self.dts[1:].asi8, 2))
+        np.testing.assert_array_equal(bars.price,
+                                      [101.0, 201.0, 102.0, 202.0])
+        self.assertTrue(np.isnan(bars.volume).all())
+
+    def test_source(self):
+        source = FuturesDBSource(self.db, self.dts[0], self.dts[1],
+                                 sids=['HG'])
+        events = list(source)
+        self.assertEqual([(e.sid, e.contract, e.price) for e in events],
+                         [('HG', 'U14', 300.0), ('HG', 'U14', 301.0)])
+        self.assertEqual(list(source.event_dts),
+                         [e.dt.value for e in events])
+        self.assertFalse('volume' in events[0])
+
+    def test_insert_dummy_frame(self):
+        dts = pd.date_range('2013-05-13 13:30', periods=50, freq='30Min',
+                            tz='UTC')
+        frame = create_dummy_frame(seed=0, symbols={'CT': 'HK'},
+                                   contract_out_limit=2014, timestamps=dts)
+        self.assertEqual(frame.shape, (50, 4 * 4))
+        np.testing.assert_array_equal(
+            frame.values, create_dummy_frame(
+                seed=0, symbols={'CT': 'HK'}, contract_out_limit=2014,
+                timestamps=dts).values)
+
+        self.db.insert_frame(frame)
+        bars = self.db.get_range(dts[0], dts[-1], symbol='CT', month='K14')
+        np.testing.assert_array_equal(bars.dt, dts.asi8)
+        np.testing.assert_array_almost_equal(
+            bars.price, frame[('CT', 'K14', 'price')].values)
+        np.testing.assert_array_equal(
+            bars.volume, frame[('CT', 'K14', 'volume')].values)
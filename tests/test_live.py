@@ -0,0 +1,563 @@
+#
+# Copyright 2013 Quantopian, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import datetime
+import threading
+import time
+from unittest import TestCase
+
+import numpy as np
+import pytz
+
+from alephnull.finance.blotter import ORDER_STATUS, Order
+from alephnull.finance.performance import PerformancePeriod
+from alephnull.live import reconcile
+from alephnull.live.executions import ExecutionQueue, execution_dt
+from alephnull.live.simulator import (
+    Account,
+    AccountValue,
+    Execution,
+    PortfolioPosition,
+    SimulatedBroker,
+)
+from alephnull.live.throttle import OrderThrottle
+
+
+def execution(exec_id, order_ref, order_id, side, shares, price):
+    return Execution(exec_id, order_id, order_ref, side, shares, price,
+                     '20131220  14:31:00', 'A1')
+
+
+class ReplayBroker(threading.Thread):
+    """
+    Replays scripted execDetails and orderStatus messages into an
+    ExecutionQueue from its own thread, as the broker connection does.
+    """
+
+    def __init__(self, queue, script):
+        super(ReplayBroker, self).__init__()
+        self.queue = queue
+        self.script = script
+
+    def run(self):
+        for kind, message in self.script:
+            if kind == 'execution':
+                self.queue.put_execution(message)
+            else:
+                self.queue.put_status(*message)
+
+
+class ExecutionQueueTestCase(TestCase):
+
+    def setUp(self):
+        self.queue = ExecutionQueue()
+        self.order = Order(dt=None, sid='AAPL', amount=100, id='ref1')
+
+    def test_execution_dt(self):
+        expected = datetime.datetime(2013, 12, 20, 14, 31, tzinfo=pytz.utc)
+        self.assertEqual(expected, execution_dt('20131220  14:31:00'))
+        self.assertEqual(expected, execution_dt('20131220 14:31:00'))
+
+    def test_fills_are_drained_once(self):
+        self.queue.put_execution(execution('e1', 'ref1', 7, 'BOT', 60, 10.0))
+        self.queue.put_execution(execution('e2', 'ref1', 7, 'BOT', 40, 10.5))
+        # replayed on reconnect
+        self.queue.put_execution(execution('e1', 'ref1', 7, 'BOT', 60, 10.0))
+
+        txns = self.queue.transactions(self.order)
+        self.assertEqual([60, 40], [txn.amount for txn in txns])
+        self.assertEqual([10.0, 10.5], [txn.price for txn in txns])
+        self.assertEqual(['ref1', 'ref1'], [txn.order_id for txn in txns])
+
+        self.assertEqual([], self.queue.transactions(self.order))
+        self.assertFalse(self.queue.has_fills('ref1'))
+
+    def test_sells_are_negative(self):
+        self.queue.put_execution(execution('e1', 'ref2', 8, 'SLD', 25, 9.0))
+        self.assertEqual([-25], [fill.amount
+                                 for fill in self.queue.drain('ref2')])
+
+    def test_futures_transactions_keep_contract(self):
+        order = Order(dt=None, sid='CL', amount=1, id='ref3')
+        order.contract = 'F14'
+        self.queue.put_execution(execution('e1', 'ref3', 9, 'BOT', 1, 95.0))
+        txn, = self.queue.transactions(order)
+        self.assertEqual(('CL', 'F14'), (txn.sid, txn.contract))
+
+    def test_status_before_register(self):
+        self.queue.put_status(7, 'Cancelled', 0, 100)
+        self.assertIsNone(self.queue.status('ref1'))
+
+        self.queue.register('ref1', 7)
+        self.assertEqual('Cancelled', self.queue.status('ref1').status)
+
+        self.queue.put_status(7, 'Inactive', 0, 100)
+        self.assertEqual('Inactive', self.queue.status('ref1').status)
+
+    def test_replayed_fills_while_draining(self):
+        script = []
+        for i in range(500):
+            script.append(('execution',
+                           execution('e%d' % i, 'ref1', 7, 'BOT', 1, 10.0)))
+            script.append(('status', (7, 'Submitted', i + 1, 499 - i)))
+        # the whole session again, as after a reconnect
+        script.extend(script)
+        broker = ReplayBroker(self.queue, script)
+
+        filled = 0
+        broker.start()
+        while broker.is_alive():
+            filled += sum(txn.amount
+                          for txn in self.queue.transactions(self.order))
+        broker.join()
+        filled += sum(txn.amount
+                      for txn in self.queue.transactions(self.order))
+
+        self.assertEqual(500, filled)
+        self.queue.register('ref1', 7)
+        self.assertEqual((500, 0), self.queue.status('ref1')[1:])
+
+
+class Contract(object):
+    # stand-in for ib.ext.Contract
+
+    def __init__(self, symbol, expiry=None):
+        self.m_symbol = symbol
+        self.m_secType = 'STK' if expiry is None else 'FUT'
+        self.m_expiry = expiry
+
+
+class IBOrder(object):
+    # stand-in for ib.ext.Order
+
+    def __init__(self, order_ref, amount, limit=None):
+        self.m_orderRef = order_ref
+        self.m_totalQuantity = amount
+        self.m_action = 'BUY' if amount > 0 else 'SELL'
+        self.m_orderType = 'MKT' if limit is None else 'LMT'
+        self.m_lmtPrice = limit
+
+
+class Clock(object):
+
+    def __init__(self):
+        self.now = 1387549860.0
+
+    def __call__(self):
+        return self.now
+
+
+class SimulatedBrokerTestCase(TestCase):
+
+    def setUp(self):
+        self.clock = Clock()
+        self.broker = SimulatedBroker(prices={'AAPL': 500.0, 'CL': 95.0},
+                                      latency=0.5,
+                                      fill_size=40,
+                                      reject=lambda c, o: c.m_symbol == 'XX',
+                                      clock=self.clock)
+        self.queue = self.broker.execution_queue
+
+    def place(self, order_ref, amount, symbol='AAPL', expiry=None,
+              limit=None):
+        order_id = self.broker.place_order(Contract(symbol, expiry),
+                                           IBOrder(order_ref, amount, limit))
+        self.queue.register(order_ref, order_id)
+        return order_id
+
+    def test_partial_fills_after_latency(self):
+        order_id = self.place('ref1', 100)
+        self.assertEqual(0, self.broker.process())
+
+        self.clock.now += 0.5
+        self.assertEqual(1, self.broker.process())
+        self.clock.now += 0.5
+        self.broker.process()
+        self.clock.now += 0.5
+        self.broker.process()
+        self.assertTrue(self.broker.idle())
+
+        fills = self.queue.drain('ref1')
+        self.assertEqual([40, 40, 20], [fill.amount for fill in fills])
+        self.assertEqual([0.5, 1.0, 1.5], list(self.broker.fill_latencies()))
+        self.assertEqual(('Filled', 100, 0), self.queue.status('ref1'))
+        self.assertEqual(['Submitted', 'Submitted', 'Submitted', 'Filled'],
+                         [status['status'] for status
+                          in self.broker.order_status(order_id)])
+        self.assertEqual(3, len(self.broker.executions()))
+
+    def test_rejection_and_cancel(self):
+        self.place('ref1', 10, symbol='XX')
+        self.assertEqual('Inactive', self.queue.status('ref1').status)
+
+        order_id = self.place('ref2', 100)
+        self.clock.now += 0.5
+        self.broker.process()
+        self.broker.cancel_order(order_id)
+        self.clock.now += 5
+        self.broker.process()
+
+        self.assertEqual([40], [fill.amount
+                                for fill in self.queue.drain('ref2')])
+        self.assertEqual(('Cancelled', 40, 60), self.queue.status('ref2'))
+
+    def test_limit_orders_wait_for_price(self):
+        self.place('ref1', -10, limit=510.0)
+        self.clock.now += 1
+        self.assertEqual(0, self.broker.process())
+
+        self.broker.set_price('AAPL', 512.0)
+        self.assertEqual(1, self.broker.process())
+        fill, = self.queue.drain('ref1')
+        self.assertEqual((-10, 512.0), (fill.amount, fill.price))
+
+    def test_portfolio_and_account(self):
+        self.place('ref1', 40)
+        self.place('ref2', -2, symbol='CL', expiry='F14')
+        self.clock.now += 0.5
+        self.broker.process()
+        self.broker.set_price('AAPL', 510.0)
+
+        account = self.broker.account.child_accounts[0]
+        positions = dict((pos.contract.m_localSymbol, pos)
+                         for pos in self.broker.portfolio(account))
+        self.assertEqual(40, positions['AAPL'].position_size)
+        self.assertEqual(400.0, positions['AAPL'].unrealized_pnl)
+        self.assertEqual(-2, positions['CLF4'].position_size)
+
+        cash, = self.broker.account_details(account)
+        self.assertEqual('TotalCashValue', cash.key)
+        self.assertEqual(1000000.0 - 40 * 500.0 + 2 * 95.0,
+                         float(cash.value))
+
+    def test_burst(self):
+        broker = SimulatedBroker(prices={'AAPL': 500.0}, latency=0.5,
+                                 fill_size=2, clock=self.clock)
+        start = self.clock.now
+        for i in range(200):
+            order_id = broker.place_order(Contract('AAPL'),
+                                          IBOrder('ref%d' % i, 3))
+            broker.execution_queue.register('ref%d' % i, order_id)
+
+        self.assertEqual(0, broker.process(start + 0.4))
+        self.assertEqual(200, broker.process(start + 0.5))
+        self.assertFalse(broker.idle())
+        self.assertEqual(200, broker.process(start + 1.0))
+        self.assertTrue(broker.idle())
+
+        self.assertEqual([0.5] * 200 + [1.0] * 200,
+                         list(broker.fill_latencies()))
+        self.assertEqual([2, 1], [fill.amount for fill
+                                  in broker.execution_queue.drain('ref199')])
+
+    def test_background_fills(self):
+        broker = SimulatedBroker(prices={'AAPL': 500.0})
+        broker.start()
+        try:
+            order_id = broker.place_order(Contract('AAPL'),
+                                          IBOrder('ref1', 1))
+            for _ in range(100):
+                if broker.idle():
+                    break
+                time.sleep(0.01)
+        finally:
+            broker.stop()
+
+        self.assertTrue(broker.idle())
+        self.assertEqual('Filled', broker.orders[order_id].status)
+
+    def test_fill_size_must_be_positive(self):
+        self.assertRaises(ValueError, SimulatedBroker, fill_size=0)
+
+
+def position(symbol, size, price, avg_cost, expiry=None):
+    contract = Contract(symbol, expiry)
+    contract.m_localSymbol = symbol if expiry is None \
+        else symbol + expiry[0] + expiry[-1]
+    return PortfolioPosition(contract, size, price, avg_cost, 0.0)
+
+
+class Accounts(object):
+    """
+    Broker with several child accounts, whose first request for each
+    account fails.
+    """
+
+    def __init__(self, positions, cash):
+        self.account = Account(sorted(positions))
+        self._positions = positions
+        self._cash = cash
+        self.failed = set()
+
+    def _flake(self, key):
+        if key not in self.failed:
+            self.failed.add(key)
+            raise IOError("connection reset")
+
+    def portfolio(self, acct):
+        self._flake(('portfolio', acct))
+        return self._positions[acct]
+
+    def account_details(self, acct):
+        self._flake(('details', acct))
+        return [AccountValue('NetLiquidation', '0'),
+                AccountValue('TotalCashValue', str(self._cash[acct]))]
+
+
+class ReconcileTestCase(TestCase):
+
+    def setUp(self):
+        self.backoff = reconcile.ACCOUNT_BACKOFF
+        reconcile.ACCOUNT_BACKOFF = 0.0
+
+    def tearDown(self):
+        reconcile.ACCOUNT_BACKOFF = self.backoff
+
+    def test_merge_accounts(self):
+        broker = Accounts({
+            'A1': [position('AAPL', 100, 510.0, 500.0),
+                   position('CL', -2, 95.0, 96.0, expiry='F14'),
+                   object()],
+            'A2': [position('AAPL', 300, 510.0, 504.0)],
+        }, cash={'A1': 1000.0, 'A2': 2500.5})
+
+        self.assertEqual(3500.5, reconcile.total_cash(broker))
+
+        portfolio = reconcile.portfolio(broker)
+        aapl = portfolio.positions['AAPL']
+        self.assertEqual(400, aapl.amount)
+        self.assertEqual(503.0, aapl.cost_basis)
+        self.assertEqual(510.0, aapl.last_sale_price)
+
+        futures = [sid for sid in portfolio.positions if type(sid) is tuple]
+        self.assertEqual(1, len(futures))
+        root, contract = futures[0]
+        self.assertEqual(('CL', 'F', '4'),
+                         (root, contract[0], contract[-1]))
+        self.assertEqual(400 * 510.0 - 2 * 95.0, portfolio.positions_value)
+        self.assertEqual(100 * 10.0 + 300 * 6.0 + 2 * 1.0, portfolio.pnl)
+
+    def test_gives_up_after_retries(self):
+        class Down(object):
+            account = Account(['A1'])
+
+            def account_details(self, acct):
+                raise IOError("down")
+
+        self.assertRaises(IOError, reconcile.total_cash, Down())
+
+    def test_large_book(self):
+        positions = dict(
+            ('A%d' % i, [position('S%d' % j, 10, 2.0, 1.0)
+                         for j in range(i, 2000, 4)])
+            for i in range(4))
+        portfolio = reconcile.portfolio(Accounts(positions, {}))
+
+        self.assertEqual(2000, len(portfolio.positions))
+        self.assertEqual(2000 * 10, portfolio.pnl)
+
+        period = PerformancePeriod(0.0)
+        period.update_positions(portfolio.positions)
+        self.assertEqual(2000 * 20.0, period.calculate_positions_value())
+
+
+class OrderThrottleTestCase(TestCase):
+
+    def setUp(self):
+        self.clock = Clock()
+        self.sent = []
+        self.cancelled = []
+        self.on_sent = []
+        self.throttle = OrderThrottle(
+            send=self.send,
+            cancel=self.cancelled.append,
+            on_sent=lambda ref, ib_id: self.on_sent.append((ref, ib_id)),
+            max_per_second=10,
+            clock=self.clock)
+
+    def send(self, contract, ib_order):
+        self.sent.append((contract.m_symbol, ib_order.m_orderRef,
+                          ib_order.m_totalQuantity))
+        return len(self.sent)
+
+    def submit(self, ref, amount, symbol='AAPL', dt=1, on_queued=None):
+        key = (symbol, dt, amount > 0)
+        return self.throttle.submit(key, ref, Contract(symbol),
+                                    IBOrder(ref, abs(amount)), amount,
+                                    on_queued=on_queued)
+
+    def test_coalesces_queued_orders(self):
+        self.assertEqual('a', self.submit('a', 100))
+        self.assertEqual('a', self.submit('b', 50))
+        self.assertEqual('c', self.submit('c', 10, symbol='IBM'))
+        self.assertEqual('d', self.submit('d', 10, dt=2))
+        self.assertEqual('e', self.submit('e', -10))
+
+        while self.throttle.dispatch() is not None:
+            self.clock.now += 0.1
+
+        self.assertEqual([('AAPL', 'a', 150), ('IBM', 'c', 10),
+                          ('AAPL', 'd', 10), ('AAPL', 'e', 10)], self.sent)
+        self.assertEqual([('a', 1), ('c', 2), ('d', 3), ('e', 4)],
+                         self.on_sent)
+        self.assertEqual(1, self.throttle.sent['b'])
+
+    def test_on_queued_holds_the_lock(self):
+        queued = []
+
+        def on_queued(ref):
+            queued.append((ref, self.throttle._lock.locked()))
+
+        self.submit('a', 100, on_queued=on_queued)
+        self.submit('b', 50, on_queued=on_queued)
+        self.submit('c', 10, symbol='IBM', on_queued=on_queued)
+        self.assertEqual([('a', True), ('a', True), ('c', True)], queued)
+
+    def test_rate_cap(self):
+        for i in range(3):
+            self.submit(str(i), 1, symbol=str(i))
+
+        self.assertEqual(0.0, self.throttle.dispatch())
+        self.assertAlmostEqual(0.1, self.throttle.dispatch(), places=6)
+        self.clock.now += 0.05
+        self.assertAlmostEqual(0.05, self.throttle.dispatch(), places=6)
+        self.clock.now += 0.05
+        self.assertEqual(0.0, self.throttle.dispatch())
+        self.assertEqual(2, len(self.sent))
+        self.assertEqual(1, self.throttle.pending())
+
+    def test_cancel(self):
+        self.submit('a', 100)
+        self.submit('b', 50)
+        self.assertTrue(self.throttle.cancel('a'))
+        self.throttle.dispatch()
+        self.assertEqual([('AAPL', 'a', 50)], self.sent)
+
+        # sent orders are cancelled at the broker
+        self.assertFalse(self.throttle.cancel('b'))
+        self.clock.now += 1
+        self.throttle.dispatch()
+        self.assertEqual([1], self.cancelled)
+
+    def test_burst_is_paced(self):
+        for i in range(20):
+            self.submit(str(i), 1, symbol=str(i))
+        # placing orders doesn't wait on the rate cap
+        self.assertEqual([], self.sent)
+
+        self.clock.now = 0.0
+        sent_at = []
+        while True:
+            wait = self.throttle.dispatch()
+            if wait is None:
+                break
+            if wait == 0.0:
+                sent_at.append(self.clock.now)
+            self.clock.now += wait
+
+        self.assertEqual([str(i) for i in range(20)],
+                         [ref for _, ref, _ in self.sent])
+        np.testing.assert_allclose(sent_at, np.arange(20) * 0.1)
+
+    def test_background_dispatch(self):
+        broker = SimulatedBroker(prices={'AAPL': 500.0})
+        queue = broker.execution_queue
+        throttle = OrderThrottle(broker.place_order, broker.cancel_order,
+                                 on_sent=queue.register,
+                                 max_per_second=1000)
+        orders = [Order(dt=None, sid='S%d' % i, amount=10, id='ref%d' % i)
+                  for i in range(20)]
+
+        throttle.start()
+        try:
+            for order in orders:
+                throttle.submit(order.sid, order.id, Contract('AAPL'),
+                                IBOrder(order.id, 10), 10)
+            self.assertTrue(throttle.flush(timeout=10))
+        finally:
+            throttle.stop()
+
+        # sent in the order they were placed
+        self.assertEqual([order.id for order in orders],
+                         [broker.orders[order_id].ib_order.m_orderRef
+                          for order_id in sorted(broker.orders)])
+        broker.process()
+        self.assertEqual([10] * 20,
+                         [sum(txn.amount for txn in queue.transactions(order))
+                          for order in orders])
+
+
+class AllocateTestCase(TestCase):
+
+    def test_fills_shared_in_order(self):
+        queue = ExecutionQueue()
+        orders = [Order(dt=None, sid='AAPL', amount=60, id='a'),
+                  Order(dt=None, sid='AAPL', amount=40, id='b')]
+        queue.put_execution(execution('e1', 'a', 7, 'BOT', 70, 10.0))
+        queue.put_execution(execution('e2', 'a', 7, 'BOT', 30, 10.5))
+
+        allocated = [(order.id, txn.amount, txn.price, txn.order_id)
+                     for order, txn in queue.allocate('a', orders)]
+        self.assertEqual([('a', 60, 10.0, 'a'),
+                          ('b', 10, 10.0, 'b'),
+                          ('b', 30, 10.5, 'b')], allocated)
+
+
+class FillOrdersTestCase(TestCase):
+    """
+    The fill and cancel handling of LiveBlotter.process_trade.
+    """
+
+    def setUp(self):
+        self.queue = ExecutionQueue()
+        # 'a' and 'b' were coalesced into the broker order 'a'
+        self.orders = dict((order.id, order) for order in [
+            Order(dt=None, sid='AAPL', amount=60, id='a'),
+            Order(dt=None, sid='AAPL', amount=40, id='b'),
+            Order(dt=None, sid='AAPL', amount=10, id='c')])
+        self.groups = {'a': [self.orders['a'], self.orders['b']]}
+        self.group_of = {'b': 'a'}
+        self.queue.register('a', 7)
+        self.queue.register('c', 8)
+
+    def fill(self):
+        return [(order.id, txn.amount) for txn, order in
+                self.queue.fill_orders(
+                    sorted(self.orders.values(), key=lambda o: o.id),
+                    ref_of=lambda order: self.group_of.get(order.id,
+                                                           order.id),
+                    orders_of=lambda ref: self.groups.get(
+                        ref, [self.orders[ref]]))]
+
+    def test_fills_drained_once(self):
+        self.queue.put_execution(execution('e1', 'a', 7, 'BOT', 70, 10.0))
+        self.queue.put_execution(execution('e2', 'c', 8, 'BOT', 10, 10.0))
+
+        self.assertEqual([('a', 60), ('b', 10), ('c', 10)], self.fill())
+        self.assertEqual([], self.fill())
+        self.assertEqual(ORDER_STATUS.FILLED, self.orders['a'].status)
+        self.assertEqual(ORDER_STATUS.OPEN, self.orders['b'].status)
+        self.assertEqual(ORDER_STATUS.FILLED, self.orders['c'].status)
+        self.assertEqual(10, self.orders['b'].filled)
+
+    def test_cancelled_after_fills(self):
+        self.queue.put_execution(execution('e1', 'a', 7, 'BOT', 70, 10.0))
+        self.queue.put_status(7, 'Cancelled', 70, 30)
+
+        # the fills before the cancel are still taken
+        self.assertEqual([('a', 60), ('b', 10)], self.fill())
+        self.assertEqual(ORDER_STATUS.FILLED, self.orders['a'].status)
+        self.assertEqual(ORDER_STATUS.CANCELLED, self.orders['b'].status)
+        self.assertEqual(ORDER_STATUS.OPEN, self.orders['c'].status)
+        self.assertFalse(self.orders['b'].open)
@@ -24,19 +24,19 @@ import datetime
 import pytz
 import itertools
 
-import zipline.utils.factory as factory
-import zipline.finance.performance as perf
-from zipline.finance.slippage import Transaction, create_transaction
-import zipline.utils.math_utils as zp_math
-
-from zipline.gens.composites import date_sorted_sources
-from zipline.finance.trading import SimulationParameters
-from zipline.finance.blotter import Order
-from zipline.finance import trading
-from zipline.protocol import DATASOURCE_TYPE
-from zipline.utils.factory import create_random_simulation_parameters
-import zipline.protocol
-from zipline.protocol import Event
+import alephnull.utils.factory as factory
+import alephnull.finance.performance as perf
+from alephnull.finance.slippage import Transaction, create_transaction
+import alephnull.utils.math_utils as zp_math
+
+from alephnull.gens.composites import date_sorted_sources
+from alephnull.finance.trading import SimulationParameters
+from alephnull.finance.blotter import Order
+from alephnull.finance import trading
+from alephnull.protocol import DATASOURCE_TYPE
+from alephnull.utils.factory import create_random_simulation_parameters
+import alephnull.protocol
+from alephnull.protocol import Event
 
 logger = logging.getLogger('Test Perf Tracking')
 
@@ -55,7 +55,7 @@ def benchmark_events_in_range(sim_params):
         Event({'dt': dt,
                'returns': ret,
                'type':
-               zipline.protocol.DATASOURCE_TYPE.BENCHMARK,
+               alephnull.protocol.DATASOURCE_TYPE.BENCHMARK,
                'source_id': 'benchmarks'})
         for dt, ret in trading.environment.benchmark_returns.iterkv()
         if dt.date() >= sim_params.period_start.date()
@@ -629,6 +629,64 @@ class TestPositionPerformance(unittest.TestCase):
 
         self.assertEqual(pp.pnl, 100, "gain of 1 on 100 shares should be 100")
 
+    def test_position_serialization(self):
+        trades_1 = factory.create_trade_history(
+            1, [10, 11], [100, 100], onesec, self.sim_params)
+        trades_2 = factory.create_trade_history(
+            2, [20, 21], [100, 100], onesec, self.sim_params)
+        pp = perf.PerformancePeriod(1000.0)
+
+        pp.execute_transaction(create_txn(trades_1[0], 10.0, 100))
+        pp.execute_transaction(create_txn(trades_2[0], 20.0, 50))
+        first = dict((pos['sid'], pos) for pos in pp.get_positions_list())
+        self.assertEqual(first[2]['amount'], 50)
+
+        # only the position with a new trade is serialized again
+        pp.update_last_sale(trades_1[1])
+        second = dict((pos['sid'], pos) for pos in pp.get_positions_list())
+        self.assertIs(second[2], first[2])
+        self.assertIsNot(second[1], first[1])
+        self.assertEqual(second[1]['last_sale_price'], 11)
+
+        # closed positions are dropped
+        pp.execute_transaction(create_txn(trades_2[1], 21.0, -50))
+        self.assertEqual([pos['sid'] for pos in pp.get_positions_list()],
+                         [1])
+        self.assertEqual(pp.get_positions()[2].amount, 0)
+
+        pp.serialize_positions = 'compact'
+        positions = pp.to_dict()['positions']
+        self.assertEqual(positions['sid'], [1])
+        self.assertEqual(list(positions['amount']), [100])
+        self.assertEqual(list(positions['last_sale_price']), [11])
+
+    def test_update_positions(self):
+        portfolio = alephnull.protocol.Portfolio()
+        for sid, amount, price in [(1, 100, 10.0), (2, -40, 20.0),
+                                   (3, 0, 30.0)]:
+            portfolio.positions[sid].amount = amount
+            portfolio.positions[sid].last_sale_price = price
+            portfolio.positions[sid].cost_basis = price - 1
+
+        one_by_one = perf.PerformancePeriod(1000.0)
+        pp = perf.PerformancePeriod(1000.0)
+        one_by_one.update_position(1, amount=10, last_sale_price=5.0)
+        pp.update_position(1, amount=10, last_sale_price=5.0)
+
+        for sid, pos in portfolio.positions.iteritems():
+            one_by_one.update_position(sid,
+                                       amount=pos.amount,
+                                       last_sale_price=pos.last_sale_price,
+                                       cost_basis=pos.cost_basis)
+        pp.update_positions(portfolio.positions)
+
+        self.assertEqual(one_by_one.calculate_positions_value(),
+                         pp.calculate_positions_value())
+        self.assertEqual(200.0, pp.calculate_positions_value())
+        self.assertEqual(one_by_one.get_positions_list(),
+                         pp.get_positions_list())
+        self.assertEqual(19.0, pp.positions[2].cost_basis)
+
     def test_short_position(self):
         """verify that the performance period calculates properly for a \
 single short-sale transaction"""
@@ -1280,3 +1338,33 @@ class TestPerformanceTracker(unittest.TestCase):
             # created.
             self.assertIsNotNone(msg_1['cumulative_risk_metrics']['sharpe'])
             self.assertIsNotNone(msg_2['cumulative_risk_metrics']['sharpe'])
+
+    def test_minute_tracker_off_market_benchmark(self):
+        with trading.TradingEnvironment():
+            start_dt = trading.environment.exchange_dt_in_utc(
+                datetime.datetime(2013, 3, 1, 9, 31))
+            end_dt = trading.environment.exchange_dt_in_utc(
+                datetime.datetime(2013, 3, 1, 16, 0))
+
+            sim_params = SimulationParameters(
+                period_start=start_dt,
+                period_end=end_dt,
+                emission_rate='minute'
+            )
+            tracker = perf.PerformanceTracker(sim_params)
+
+            # a benchmark stamped after the close has no risk to update
+            after_close = end_dt + datetime.timedelta(minutes=30)
+            for dt in (start_dt, after_close):
+                tracker.set_date(dt)
+                tracker.process_event(Event({
+                    'dt': dt,
+                    'returns': 0.01,
+                    'type': DATASOURCE_TYPE.BENCHMARK
+                }))
+                tracker.handle_minute_close(dt)
+
+            self.assertNotIn(after_close, tracker.all_benchmark_returns.index)
+            msg = tracker.to_dict()
+            self.assertEquals(after_close,
+                              msg['minute_perf']['period_close'])
@@ -0,0 +1,111 @@
+#
+# Copyright 2013 Quantopian, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import datetime
+from collections import defaultdict
+from unittest import TestCase
+
+import pytz
+
+from alephnull.finance.contracts import ContractSpecs
+from alephnull.protocol import BarData, SIDData
+from alephnull.roll_method import CalendarRoll, Roller, roll
+
+
+def futures_bar(root, contract, **fields):
+    fields.update({'sid': root, 'contract': contract})
+    return SIDData(fields)
+
+
+class Struct(object):
+
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+
+class FakeAlgo(object):
+
+    def __init__(self, positions):
+        self.portfolio = Struct(positions=positions)
+        self.blotter = Struct(open_orders=defaultdict(list))
+        self.orders = []
+
+    def order(self, sid, amount):
+        self.orders.append((sid, amount))
+
+
+class TestRoller(TestCase):
+
+    def setUp(self):
+        self.specs = ContractSpecs(lambda sid: 25.0)
+        self.specs.add('GS', contracts={
+            'N10': {'first_notice': '2010-06-28'},
+            'U10': {'first_notice': '2010-08-30'},
+        })
+        self.dt = datetime.datetime(2010, 6, 1, 14, tzinfo=pytz.utc)
+
+    def bar_data(self, *bars):
+        data = BarData()
+        for bar in bars:
+            if bar.sid not in data:
+                data[bar.sid] = {}
+            data[bar.sid][bar.contract] = bar
+        return data
+
+    def test_open_interest_roll(self):
+        roller = Roller('open_interest', contract_specs=self.specs)
+        n10 = futures_bar('GS', 'N10', price=100.0, open_interest=500)
+        u10 = futures_bar('GS', 'U10', price=101.0, open_interest=400)
+        data = self.bar_data(n10, u10)
+
+        self.assertEqual(roller.update(data, self.dt), {'GS': 'N10'})
+        front = roller.front_month_data(data)
+        self.assertIs(front['GS'], n10)
+
+        data['GS']['U10'] = futures_bar('GS', 'U10', open_interest=600)
+        self.assertEqual(roller.update(data, self.dt), {'GS': 'U10'})
+
+        # past first notice, N10 is out whatever its open interest
+        data['GS']['N10'] = futures_bar('GS', 'N10', open_interest=900)
+        late = datetime.datetime(2010, 6, 28, 14, tzinfo=pytz.utc)
+        self.assertEqual(roller.update(data, late), {'GS': 'U10'})
+
+    def test_calendar_roll_and_orders(self):
+        roller = Roller(CalendarRoll(days_before_expiry=5),
+                        contract_specs=self.specs)
+        data = self.bar_data(futures_bar('GS', 'U10'),
+                             futures_bar('GS', 'N10'))
+
+        self.assertEqual(roller.update(data, self.dt), {'GS': 'N10'})
+        self.assertEqual(roller.chains['GS'].contracts, ['N10', 'U10'])
+
+        # nothing new, but the roll date has passed
+        roll_dt = datetime.datetime(2010, 6, 23, 14, tzinfo=pytz.utc)
+        self.assertEqual(roller.update(data, roll_dt), {'GS': 'U10'})
+
+        algo = FakeAlgo({('GS', 'N10'): Struct(amount=3),
+                         ('GS', 'U10'): Struct(amount=1)})
+        algo.blotter.open_orders[('GS', 'N10')].append(
+            Struct(amount=-1, filled=0))
+        roller.roll(algo)
+        self.assertEqual(algo.orders, [(('GS', 'N10'), -2),
+                                       (('GS', 'U10'), 2)])
+
+    def test_invalid_rules(self):
+        with self.assertRaises(ValueError):
+            Roller('openinterest')
+        # the old API took the handle_data callable
+        with self.assertRaises(TypeError):
+            roll(lambda algo, data: None)
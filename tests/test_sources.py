@@ -12,14 +12,29 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+import json
+import multiprocessing
+import os
+import socket
+import tempfile
+import time
+
+import numpy as np
 import pandas as pd
 import pytz
 from itertools import cycle
 
 from unittest import TestCase
 
-import zipline.utils.factory as factory
-from zipline.sources import DataFrameSource, DataPanelSource
+import alephnull.utils.factory as factory
+from alephnull.sources import DataFrameSource, DataPanelSource
+from alephnull.sources.futures_data_frame_source import FuturesDataFrameSource
+from alephnull.sources.streaming import (
+    FileTailFeed,
+    SocketFeed,
+    StreamingBarSource,
+    parse_bar,
+)
 
 
 class TestDataFrameSource(TestCase):
@@ -73,3 +88,149 @@ class TestDataFrameSource(TestCase):
                 self.assertIn(check_field, event)
             self.assertTrue(isinstance(event['volume'], (int, long)))
             self.assertEqual(stocks_iter.next(), event['sid'])
+
+
+class TestFuturesDataFrameSource(TestCase):
+
+    def setUp(self):
+        index = pd.date_range('2013-12-20', periods=3, freq='Min', tz='UTC')
+        columns = pd.MultiIndex.from_tuples([
+            ('GS', 'N10', 'price'), ('GS', 'N10', 'volume'),
+            ('TW', 'H14', 'price'), ('TW', 'H14', 'volume'),
+        ])
+        self.df = pd.DataFrame(np.array([[101.0, 1000, 400.0, 10],
+                                         [102.0, 2000, 401.0, 20],
+                                         [103.0, 3000, 402.0, 30]]),
+                               index=index, columns=columns)
+
+    def test_futures_events(self):
+        source = FuturesDataFrameSource(self.df)
+        events = list(source)
+
+        self.assertEqual(len(events), 6)
+        self.assertEqual(list(source.event_dts),
+                         [event.dt.value for event in events])
+        first = events[0]
+        self.assertEqual((first.sid, first.contract), ('GS', 'N10'))
+        self.assertEqual(first.price, 101.0)
+        self.assertEqual(first.volume, 1000)
+        self.assertTrue(isinstance(first.volume, int))
+
+    def test_futures_sid_filtering_and_snapshot(self):
+        source = FuturesDataFrameSource(self.df, sids=['TW.H14'])
+        self.assertEqual(set((e.sid, e.contract) for e in source),
+                         set([('TW', 'H14')]))
+
+        snapshot = source.snapshot(self.df.index[1])
+        self.assertEqual(list(snapshot['price']), [401.0])
+
+        # nothing is known before the first row
+        snapshot = source.snapshot(self.df.index[0] - pd.datetools.Minute())
+        self.assertTrue(np.isnan(snapshot['price']).all())
+        self.assertTrue(np.isnan(snapshot['volume']).all())
+
+
+def replay(listener, lines, interval):
+    # serves @lines to the first connection, as a feed would
+    connection, _ = listener.accept()
+    for line in lines:
+        connection.sendall(line + '\n')
+        time.sleep(interval)
+    connection.close()
+    listener.close()
+
+
+class TestStreamingBarSource(TestCase):
+
+    def bars(self, count):
+        start = 1387549860
+        return [json.dumps({'dt': start + 60 * i,
+                            'bars': {'AAPL': {'price': 550.0 + i,
+                                              'volume': 100},
+                                     'IBM': {'price': 180.0 + i,
+                                             'volume': 10}}})
+                for i in range(count)]
+
+    def test_socket_replay(self):
+        listener = socket.socket()
+        listener.bind(('127.0.0.1', 0))
+        listener.listen(1)
+        address = listener.getsockname()
+        replayer = multiprocessing.Process(
+            target=replay, args=(listener, self.bars(5), 0.01))
+        replayer.daemon = True
+        replayer.start()
+        listener.close()
+
+        source = StreamingBarSource()
+        SocketFeed(source, address).start()
+        events = list(source)
+        replayer.join()
+
+        self.assertEqual(10, len(events))
+        self.assertEqual(['AAPL', 'IBM'] * 5, [e.sid for e in events])
+        self.assertEqual([e.dt for e in events], sorted(e.dt for e in events))
+        self.assertEqual(pd.Timestamp('2013-12-20 14:31', tz='UTC'),
+                         events[0].dt)
+        self.assertEqual([False, True] * 5,
+                         ['end_of_bar' in e for e in events])
+        self.assertEqual(5, len(source.latencies))
+        self.assertTrue((source.latencies >= 0).all())
+        self.assertTrue(all(e.arrival <= time.time() for e in events))
+
+    def test_overflow(self):
+        coalesce = StreamingBarSource(maxsize=2)
+        drop = StreamingBarSource(maxsize=2, overflow='drop')
+        for source in (coalesce, drop):
+            for line in self.bars(4):
+                source.push(*parse_bar(line))
+            source.close()
+
+        events = list(drop)
+        self.assertEqual(2, drop.dropped)
+        self.assertEqual([552.0, 182.0, 553.0, 183.0],
+                         [e.price for e in events])
+
+        events = list(coalesce)
+        self.assertEqual(2, coalesce.coalesced)
+        # the first three bars end up in one, at the dt of the third
+        self.assertEqual([552.0, 182.0, 553.0, 183.0],
+                         [e.price for e in events])
+        self.assertEqual([300, 30, 100, 10], [e.volume for e in events])
+        self.assertEqual(events[0].dt,
+                         pd.Timestamp('2013-12-20 14:33', tz='UTC'))
+
+    def test_stale_bars(self):
+        now = [0.0]
+        source = StreamingBarSource(max_age=1.0, overflow='drop',
+                                    clock=lambda: now[0])
+        for line in self.bars(3):
+            source.push(*parse_bar(line))
+            now[0] += 1.0
+        source.close()
+
+        # only the last bar is fresh, but a lone bar is never dropped
+        self.assertEqual([552.0, 182.0], [e.price for e in source])
+        self.assertEqual(2, source.dropped)
+
+    def test_file_tail(self):
+        path = os.path.join(tempfile.mkdtemp(), 'bars.json')
+        lines = self.bars(3)
+        with open(path, 'w') as stream:
+            stream.write(lines[0] + '\n')
+
+        source = StreamingBarSource()
+        feed = FileTailFeed(source, path, poll_interval=0.01)
+        feed.start()
+        with open(path, 'a') as stream:
+            stream.write(lines[1] + '\n' + lines[2][:10])
+            stream.flush()
+            time.sleep(0.05)
+            stream.write(lines[2][10:] + '\nnot a bar\n')
+        feed.stop.set()
+
+        self.assertEqual([550.0, 180.0, 551.0, 181.0, 552.0, 182.0],
+                         [e.price for e in source])
+
+    def test_invalid_overflow(self):
+        self.assertRaises(ValueError, StreamingBarSource, overflow='wait')
@@ -14,12 +14,16 @@
 # limitations under the License.
 
 from unittest import TestCase
-from zipline.utils import tradingcalendar
-from zipline.utils import tradingcalendar_lse
-from zipline.utils import tradingcalendar_tse
+from alephnull.utils import tradingcalendar
+from alephnull.utils import tradingcalendar_lse
+from alephnull.utils import tradingcalendar_tse
+from alephnull.utils import calendars
+import os
+import shutil
+import tempfile
 import pytz
 import datetime
-from zipline.finance.trading import TradingEnvironment
+from alephnull.finance.trading import TradingEnvironment
 import pandas as pd
 from pandas import DatetimeIndex
 from nose.tools import nottest
@@ -51,7 +55,8 @@ class TestTradingCalendar(TestCase):
     def test_lse_calendar_vs_environment(self):
         env = TradingEnvironment(
             bm_symbol='^FTSE',
-            exchange_tz='Europe/London'
+            exchange_tz='Europe/London',
+            exchange='LSE'
         )
 
         env_start_index = \
@@ -64,7 +69,8 @@ class TestTradingCalendar(TestCase):
     def test_tse_calendar_vs_environment(self):
         env = TradingEnvironment(
             bm_symbol='^GSPTSE',
-            exchange_tz='US/Eastern'
+            exchange_tz='US/Eastern',
+            exchange='TSE'
         )
 
         env_start_index = \
@@ -256,3 +262,82 @@ If NYE falls on a weekend, {0} the Tuesday after is the first trading day.
         friday_after = datetime.datetime(2013, 7, 5, tzinfo=pytz.utc)
         self.assertIn(wednesday_before, early_closes)
         self.assertNotIn(friday_after, early_closes)
+
+
+class TestCalendarRegistry(TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.cache_path = calendars.CACHE_PATH
+        calendars.CACHE_PATH = self.tempdir
+        self.built = calendars._calendars.copy()
+        calendars._calendars.clear()
+
+    def tearDown(self):
+        calendars.CACHE_PATH = self.cache_path
+        calendars._calendars.clear()
+        calendars._calendars.update(self.built)
+        shutil.rmtree(self.tempdir)
+
+    def test_span(self):
+        start = pd.Timestamp('2012-03-01', tz='UTC')
+        end = pd.Timestamp('2012-06-30', tz='UTC')
+        calendar = calendars.get_calendar('LSE', start, end)
+
+        self.assertEqual(calendar.trading_days[0], start)
+        self.assertEqual(calendar.trading_days[-1],
+                         pd.Timestamp('2012-06-29', tz='UTC'))
+        # the Diamond Jubilee
+        self.assertNotIn(pd.Timestamp('2012-06-05', tz='UTC'),
+                         calendar.trading_days)
+        self.assertEqual(calendar.open_and_closes['market_open'][0],
+                         pd.Timestamp('2012-03-01 08:01', tz='UTC'))
+
+        # only the years asked for are built
+        built = calendars._calendars['LSE']
+        self.assertEqual(built.start, pd.Timestamp('2012-01-01', tz='UTC'))
+        self.assertEqual(built.end, pd.Timestamp('2012-12-31', tz='UTC'))
+
+    def test_disk_cache(self):
+        start = pd.Timestamp('2012-01-01', tz='UTC')
+        end = pd.Timestamp('2013-12-31', tz='UTC')
+        built = calendars.get_calendar('NYSE', start, end)
+        self.assertTrue(os.path.exists(calendars.get_cache_filepath('NYSE')))
+
+        calendars._calendars.clear()
+        loaded = calendars.get_calendar('NYSE', start, end)
+        self.assertTrue(loaded.trading_days.equals(built.trading_days))
+        self.assertTrue(loaded.early_closes.equals(built.early_closes))
+        self.assertEqual(list(loaded.open_and_closes['market_close']),
+                         list(built.open_and_closes['market_close']))
+        next_day = loaded.trading_days[0] + loaded.trading_day
+        self.assertEqual(next_day.date(), loaded.trading_days[1].date())
+
+    def test_module_tables(self):
+        # the tables of the rules modules are only built when read
+        for table in calendars.CALENDAR_TABLES:
+            tradingcalendar_tse.__dict__.pop(table, None)
+        self.assertNotIn('TSE', calendars._calendars)
+        from alephnull.utils.tradingcalendar_tse import trading_days
+        self.assertIn('TSE', calendars._calendars)
+        self.assertTrue(trading_days.equals(
+            calendars.get_calendar('TSE').trading_days))
+        self.assertEqual(tradingcalendar.trading_days[0],
+                         pd.Timestamp('1990-01-02', tz='UTC'))
+        self.assertRaises(AttributeError, getattr, tradingcalendar, 'nope')
+
+        # and then served from the module
+        self.assertIs(tradingcalendar_tse.trading_days, trading_days)
+        self.assertIs(tradingcalendar.trading_days,
+                      tradingcalendar.trading_days)
+        self.assertIs(tradingcalendar.trading_day,
+                      tradingcalendar.trading_day)
+
+    def test_unknown_exchange(self):
+        self.assertRaises(ValueError, calendars.get_calendar, 'XXXX')
+
+    def test_environment_exchange(self):
+        env = TradingEnvironment(exchange='LSE')
+        self.assertEqual(env.calendar.code, 'LSE')
+        day = env.calendar.trading_days[-1]
+        self.assertEqual(env.get_open_and_close(day)[1].hour, 15)
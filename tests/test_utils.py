@@ -13,9 +13,14 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import os
+import shutil
+import tempfile
 from unittest import TestCase
-from zipline.utils.factory import (load_from_yahoo,
-                                   load_bars_from_yahoo)
+from alephnull.utils.factory import (load_from_yahoo,
+                                     load_bars_from_yahoo)
+from alephnull.data.providers import LocalDirectoryProvider, YAHOO_COLUMNS
+from alephnull.utils.concurrency import retry, concurrent_map
 import pandas as pd
 import pytz
 import numpy as np
@@ -56,3 +61,60 @@ class TestFactory(TestCase):
             AssertionError, load_bars_from_yahoo, stocks=stocks,
             start=end, end=start
         )
+
+    def test_load_bars_from_local_directory(self):
+        tempdir = tempfile.mkdtemp()
+        try:
+            dates = pd.bdate_range(pd.datetime(2013, 1, 1), periods=30)
+            stocks = ['AAPL', 'GE', 'IBM', 'MSFT']
+            for i, stock in enumerate(stocks + ['^GSPC']):
+                bars = pd.DataFrame(i + 1.0, index=dates,
+                                    columns=YAHOO_COLUMNS)
+                bars.index.name = 'Date'
+                # vendor files are often newest first
+                bars[::-1].to_csv(os.path.join(tempdir, stock + '.csv'))
+
+            start = pd.datetime(2013, 1, 10, 0, 0, 0, 0, pytz.utc)
+            end = pd.datetime(2013, 1, 31, 0, 0, 0, 0, pytz.utc)
+            data = load_bars_from_yahoo(
+                stocks=stocks, indexes={'SPX': '^GSPC'}, start=start,
+                end=end, provider=LocalDirectoryProvider(tempdir))
+
+            self.assertEqual(list(data.items), sorted(stocks + ['SPX']))
+            assert data.major_axis[0] == pd.Timestamp(start)
+            assert data.major_axis[-1] == pd.Timestamp(end)
+            for i, stock in enumerate(stocks + ['SPX']):
+                assert (data[stock]['price'] == i + 1.0).all()
+
+            np.testing.assert_raises(
+                IOError, load_bars_from_yahoo, stocks=['XOM'], start=start,
+                end=end, provider=LocalDirectoryProvider(tempdir))
+        finally:
+            shutil.rmtree(tempdir)
+
+
+class TestConcurrency(TestCase):
+    def test_retry(self):
+        calls = []
+        sleeps = []
+
+        def flaky():
+            calls.append(1)
+            if len(calls) < 3:
+                raise IOError("try again")
+            return len(calls)
+
+        self.assertEqual(3, retry(flaky, retries=2, backoff=0.5,
+                                  sleep=sleeps.append))
+        self.assertEqual([0.5, 1.0], sleeps)
+
+        del calls[:]
+        self.assertRaises(IOError, retry, flaky, retries=1,
+                          sleep=sleeps.append)
+        self.assertEqual(2, len(calls))
+
+    def test_concurrent_map(self):
+        self.assertEqual([x * x for x in range(50)],
+                         concurrent_map(lambda x: x * x, range(50),
+                                        max_workers=4))
+        self.assertEqual([], concurrent_map(lambda x: x, []))